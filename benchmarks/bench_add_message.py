@@ -0,0 +1,81 @@
+"""Per-append latency of MongoDBMemory.add_message against thread length.
+
+Compares the atomic ``$push`` append with the previous read-modify-write
+implementation (read the whole conversation, append in Python, ``$set`` the
+full array back).
+
+Usage:
+    python -m benchmarks.bench_add_message --uri mongodb://localhost:27017/
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from memories.mongodb_memories import MongoDBMemory, Message
+
+
+def legacy_add_message(memory: MongoDBMemory, user_id: str, thread_id: str, role: str, content: str) -> str:
+    """The read-modify-write append used before the $push path."""
+    conversation = memory.get_or_create_conversation(user_id, thread_id)
+    conversation.messages.append(Message(role=role, content=content, timestamp=datetime.now()))
+    conversation.updated_at = datetime.now()
+    memory.collection.update_one(
+        {"conversation_id": conversation.conversation_id},
+        {
+            "$set": {
+                "messages": [msg.to_dict() for msg in conversation.messages],
+                "updated_at": conversation.updated_at
+            }
+        }
+    )
+    return conversation.conversation_id
+
+
+def measure(append: Callable[[str], str], samples: int) -> List[float]:
+    """Return per-append latencies in milliseconds."""
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        append(f"benchmark message {i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--database", default="memories_benchmark")
+    parser.add_argument("--lengths", default="0,100,500,1000,2000",
+                        help="comma separated thread lengths to measure at")
+    parser.add_argument("--samples", type=int, default=50, help="appends measured per thread length")
+    parser.add_argument("--message-size", type=int, default=2000, help="characters per pre-filled message")
+    args = parser.parse_args()
+
+    memory = MongoDBMemory(args.uri, database_name=args.database)
+    lengths = [int(x) for x in args.lengths.split(",")]
+    filler = "x" * args.message_size
+
+    print(f"{'length':>8} {'impl':>8} {'p50 ms':>10} {'mean ms':>10} {'max ms':>10}")
+    for length in lengths:
+        for impl in ("push", "legacy"):
+            memory.clear_all_conversations()
+            user_id, thread_id = "bench_user", f"bench_{impl}_{length}"
+            for _ in range(length):
+                memory.add_message(user_id, thread_id, "assistant", filler)
+
+            if impl == "push":
+                append = lambda content: memory.add_message(user_id, thread_id, "user", content)
+            else:
+                append = lambda content: legacy_add_message(memory, user_id, thread_id, "user", content)
+
+            latencies = measure(append, args.samples)
+            print(f"{length:>8} {impl:>8} {statistics.median(latencies):>10.3f} "
+                  f"{statistics.mean(latencies):>10.3f} {max(latencies):>10.3f}")
+
+    memory.clear_all_conversations()
+
+
+if __name__ == "__main__":
+    main()
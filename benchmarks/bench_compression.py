@@ -0,0 +1,63 @@
+"""Compression ratio and cost of the message ContentCodec on itinerary-like answers.
+
+Generates markdown itineraries of several sizes (seeded, so runs are
+comparable), then reports stored size, ratio and per-message encode/decode
+time for each available algorithm. No database is needed.
+
+Usage:
+    python -m benchmarks.bench_compression --days 1,5,14
+"""
+import argparse
+import random
+import timeit
+
+from memories.mongodb_memories import ContentCodec, decode_content, zstandard
+
+PLACES = ["Senso-ji Temple", "Tsukiji Outer Market", "Meiji Shrine", "Shibuya Crossing", "teamLab Planets",
+          "Ueno Park", "Akihabara", "Odaiba", "Shinjuku Gyoen", "Nakameguro", "Yanaka Ginza", "Roppongi Hills"]
+MEALS = ["ramen", "sushi omakase", "tempura", "okonomiyaki", "yakitori", "kaiseki dinner", "soba", "izakaya"]
+TIPS = ["Buy a Suica card at the airport.", "Arrive before 9am to avoid crowds.", "Most shrines are free to enter.",
+        "Reserve a table a week ahead.", "Trains stop around midnight.", "Carry some cash for small shops."]
+
+
+def itinerary(days: int, rng: random.Random) -> str:
+    """A markdown itinerary in the shape Perplexity returns for trip questions."""
+    lines = [f"Here is a {days}-day itinerary for Tokyo in April, built around cherry blossom season."]
+    for day in range(1, days + 1):
+        lines.append(f"\n## Day {day}: {rng.choice(PLACES)} and {rng.choice(PLACES)}")
+        for slot in ("Morning", "Afternoon", "Evening"):
+            lines.append(f"- **{slot}:** Visit {rng.choice(PLACES)} ({rng.randint(1, 4)} hours), "
+                         f"then try {rng.choice(MEALS)} nearby for about {rng.randint(8, 60) * 100} yen.")
+        lines.append(f"- *Tip:* {rng.choice(TIPS)} [{rng.randint(1, 12)}]")
+    lines.append("\nSources: " + ", ".join(f"[{n}] https://example.com/guide/{rng.randint(1000, 9999)}"
+                                            for n in range(1, 9)))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", default="1,5,14", help="comma separated itinerary lengths in days")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    algorithms = ["zlib"] + (["zstd"] if zstandard is not None else [])
+    rng = random.Random(7)
+    print(f"{'days':>5} {'algo':>5} {'raw B':>8} {'stored B':>9} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+    for days in [int(x) for x in args.days.split(",")]:
+        content = itinerary(days, rng)
+        for algorithm in algorithms:
+            codec = ContentCodec(threshold=0, algorithm=algorithm)
+            stored = codec.encode(content)
+            assert decode_content(stored) == content
+            encode_us = min(timeit.repeat(lambda: codec.encode(content), number=args.repeat, repeat=3)) / args.repeat * 1e6
+            decode_us = min(timeit.repeat(lambda: decode_content(stored), number=args.repeat, repeat=3)) / args.repeat * 1e6
+            raw_bytes = len(content.encode("utf-8"))
+            stored_bytes = len(stored) if isinstance(stored, bytes) else raw_bytes
+            print(f"{days:>5} {algorithm:>5} {raw_bytes:>8} {stored_bytes:>9} {raw_bytes / stored_bytes:>6.2f} "
+                  f"{encode_us:>10.1f} {decode_us:>10.1f}")
+    if "zstd" not in algorithms:
+        print("zstd skipped: install the zstandard package to compare it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Per-call latency of the search HTTP path against the local stub server.
+
+Compares a bare ``requests.post`` per call (new connection every time) with
+the pooled keep-alive HTTPClient used by the search tool, and exercises the
+retry path by failing the first requests with 503.
+
+Usage:
+    python -m benchmarks.bench_search_http --calls 200
+"""
+import argparse
+import statistics
+import time
+import requests
+from benchmarks.stub_perplexity import StubPerplexityServer
+from tools.http_client import HTTPClient
+
+PAYLOAD = {"model": "sonar", "messages": [{"role": "user", "content": "5 day Tokyo itinerary in April"}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with StubPerplexityServer() as server:
+        bare = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            requests.post(f"{server.url}/chat/completions", json=PAYLOAD).json()
+            bare.append((time.perf_counter() - start) * 1000)
+
+        client = HTTPClient(server.url)
+        for _ in range(args.calls):
+            client.post_json("/chat/completions", PAYLOAD).json()
+        pooled = client.metrics.snapshot()
+
+    print(f"{'client':>10} {'p50 ms':>8} {'mean ms':>8}")
+    print(f"{'bare':>10} {statistics.median(bare):>8.3f} {statistics.mean(bare):>8.3f}")
+    print(f"{'pooled':>10} {pooled['p50_ms']:>8.3f} {pooled['mean_ms']:>8.3f}")
+
+    with StubPerplexityServer(fail_first=2) as server:
+        client = HTTPClient(server.url, backoff_base=0.01)
+        status = client.post_json("/chat/completions", PAYLOAD).status_code
+        print(f"retry check: status={status} after {client.metrics.retries} retries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Cost of converting conversations between MongoDB documents and Python objects.
+
+Compares the current ``__slots__`` Message/Conversation types (lazy message
+decoding, hand-written ``to_dict``) with the previous plain dataclasses that
+went through ``dataclasses.asdict`` and decoded every message eagerly. No
+database is needed: documents are built the way PyMongo returns them, with
+native datetimes.
+
+Usage:
+    python -m benchmarks.bench_serialization --sizes 10,100,1000
+"""
+import argparse
+import timeit
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import bson
+
+from memories.mongodb_memories import Conversation, Message
+
+
+@dataclass
+class LegacyMessage:
+    """Message as implemented before the slots/lazy decoding change."""
+    role: str
+    content: str
+    timestamp: datetime
+    metadata: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LegacyMessage":
+        timestamp = data.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        return cls(role=data['role'], content=data['content'], timestamp=timestamp, metadata=data.get('metadata'))
+
+
+@dataclass
+class LegacyConversation:
+    """Conversation as implemented before the slots/lazy decoding change."""
+    conversation_id: str
+    user_id: str
+    thread_id: str
+    messages: List[LegacyMessage]
+    created_at: datetime
+    updated_at: datetime
+    metadata: Optional[Dict[str, Any]] = None
+    summary: Optional[str] = None
+    summarized_count: int = 0
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data['messages'] = [msg.to_dict() for msg in self.messages]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LegacyConversation":
+        messages = [LegacyMessage.from_dict(msg_data) for msg_data in data.get('messages', [])]
+        if 'created_at' in data and isinstance(data['created_at'], str):
+            data['created_at'] = datetime.fromisoformat(data['created_at'])
+        if 'updated_at' in data and isinstance(data['updated_at'], str):
+            data['updated_at'] = datetime.fromisoformat(data['updated_at'])
+        return cls(
+            conversation_id=data['conversation_id'],
+            user_id=data['user_id'],
+            thread_id=data['thread_id'],
+            messages=messages,
+            created_at=data['created_at'],
+            updated_at=data['updated_at'],
+            metadata=data.get('metadata'),
+            summary=data.get('summary'),
+            summarized_count=data.get('summarized_count', 0)
+        )
+
+
+def conversation_doc(size: int) -> Dict[str, Any]:
+    """A stored conversation document with ``size`` messages of realistic length."""
+    start = datetime(2025, 1, 1)
+    messages = [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"message {i} " + "lorem ipsum dolor sit amet " * 20,
+            "timestamp": start + timedelta(seconds=i),
+            "metadata": {"agent_type": "general_agent", "token_count": 140}
+        }
+        for i in range(size)
+    ]
+    return {
+        "conversation_id": f"bench_user_bench_thread_{size}",
+        "user_id": "bench_user",
+        "thread_id": f"bench_thread_{size}",
+        "messages": messages,
+        "created_at": start,
+        "updated_at": start + timedelta(seconds=size),
+        "summary": None,
+        "summarized_count": 0
+    }
+
+
+def per_call_us(func: Callable[[], Any], repeat: int) -> float:
+    number = max(1, repeat)
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def retained_bytes(build: Callable[[], Any]) -> int:
+    """Bytes still allocated by the object ``build`` returns."""
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="comma separated messages per conversation")
+    parser.add_argument("--repeat", type=int, default=2000, help="calls per timing at size 10 (scaled down for larger)")
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'impl':>7} {'load us':>10} {'load+last10':>12} {'to_dict us':>11} "
+          f"{'bson us':>10} {'msg bytes':>10}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        repeat = max(1, args.repeat * 10 // size)
+        for name, cls, message_cls in (("legacy", LegacyConversation, LegacyMessage), ("slots", Conversation, Message)):
+            # Legacy from_dict mutates its input, so every call gets a fresh shallow copy
+            doc = conversation_doc(size)
+            load = lambda: cls.from_dict(dict(doc))
+            load_recent = lambda: [m.content for m in cls.from_dict(dict(doc)).messages[-10:]]
+            loaded = cls.from_dict(dict(doc))
+            list(loaded.messages)
+            messages = doc["messages"]
+            bytes_per_message = retained_bytes(lambda: [message_cls.from_dict(m) for m in messages]) / size
+
+            print(f"{size:>8} {name:>7} {per_call_us(load, repeat):>10.1f} {per_call_us(load_recent, repeat):>12.1f} "
+                  f"{per_call_us(loaded.to_dict, repeat):>11.1f} "
+                  f"{per_call_us(lambda: bson.encode(loaded.to_dict()), repeat):>10.1f} {bytes_per_message:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
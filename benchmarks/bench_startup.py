@@ -0,0 +1,78 @@
+"""Process startup cost: importing the workflow, getting it ready, and the first turn.
+
+Each run is a fresh interpreter (``--child``) that reports three phases:
+importing ``workflow.langgraph_workflow``, building a LangGraphWorkflow plus
+the shared OpenAI client (ready to serve), and one offline turn against the
+fake model and stub Perplexity server, which pays for any imports deferred to
+first use. The parent prints the median and best of each phase over
+``--runs`` processes; ``--output`` saves them as JSON to track over time.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ["import", "ready", "first_turn"]
+
+
+def child() -> None:
+    start = time.perf_counter()
+    from workflow.langgraph_workflow import LangGraphWorkflow
+    imported = time.perf_counter()
+
+    from utils.llm import LLMConfig, get_llm
+    get_llm(LLMConfig.create_fast_config())
+    from benchmarks.offline import InMemoryMemoryManager
+    LangGraphWorkflow("startup_user", "startup_thread", memory_manager=InMemoryMemoryManager(0.0))
+    ready = time.perf_counter()
+
+    from benchmarks.offline import offline_backends
+    with offline_backends(llm_latency=0.0, search_latency=0.0, mongo_latency=0.0) as backends:
+        workflow = LangGraphWorkflow("startup_user", "startup_thread", memory_manager=backends.memory,
+                                     router=backends.router, summarizer=backends.summarizer)
+        turn_start = time.perf_counter()
+        workflow.run({"user_question": "Write a short poem about Lisbon"})
+        first_turn = time.perf_counter() - turn_start
+
+    print(json.dumps({"import": imported - start, "ready": ready - imported, "first_turn": first_turn}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="write the per-phase results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "stub"),
+           "PERPLEXITY_API_KEY": os.getenv("PERPLEXITY_API_KEY", "stub")}
+    samples = {phase: [] for phase in PHASES + ["process"]}
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples["process"].append(time.perf_counter() - start)
+        result = json.loads(output.strip().splitlines()[-1])
+        for phase in PHASES:
+            samples[phase].append(result[phase])
+
+    print(f"{'phase':>12} {'median ms':>10} {'best ms':>10}")
+    for phase, values in samples.items():
+        print(f"{phase:>12} {statistics.median(values) * 1000:>10.1f} {min(values) * 1000:>10.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({phase: {"median": statistics.median(values), "best": min(values)}
+                       for phase, values in samples.items()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time-to-first-token versus time-to-full-answer for streamed workflow turns.
+
+Runs LangGraphWorkflow.stream against the stub Perplexity server in SSE mode
+and a fake streaming chat model, both emitting one word per token with a
+fixed delay. Without streaming the user sees nothing until the full answer
+is ready; with it, the first token is the latency that matters.
+
+Usage:
+    python -m benchmarks.bench_ttft --turns 10 --token-delay 0.01
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.offline import offline_backends
+
+# A plan of roughly 400 words, like a long Perplexity itinerary
+LONG_PLAN = " ".join(f"Day {n // 40 + 1} step {n}." for n in range(200))
+
+# One question per agent, both routed by the local rules so only the answer is timed
+QUESTIONS = [
+    "5 day itinerary for Tokyo in April #{n}",
+    "Write a short poem about Lisbon #{n}",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with offline_backends(args.llm_latency, args.search_latency, mongo_latency=0.0,
+                          token_delay=args.token_delay, answer_words=200, search_content=LONG_PLAN) as backends:
+        from tools.search_cache import get_search_cache
+        from workflow.langgraph_workflow import LangGraphWorkflow
+
+        router, memory = backends.router, backends.memory
+
+        timings = {}
+        for n in range(args.turns):
+            question = QUESTIONS[n % len(QUESTIONS)].format(n=n)
+            workflow = LangGraphWorkflow(f"user-{n}", f"thread-{n}", memory_manager=memory, router=router)
+            get_search_cache().clear()
+            start = time.perf_counter()
+            first = None
+            for kind, _ in workflow.stream({"user_question": question}):
+                if kind == "token" and first is None:
+                    first = time.perf_counter() - start
+            total = time.perf_counter() - start
+            agent = "search" if "itinerary" in question else "general"
+            timings.setdefault(agent, []).append((first or total, total))
+
+    print(f"{'agent':>8} {'ttft p50 ms':>12} {'full p50 ms':>12}")
+    for agent, samples in sorted(timings.items()):
+        ttft = statistics.median(t for t, _ in samples) * 1000
+        full = statistics.median(t for _, t in samples) * 1000
+        print(f"{agent:>8} {ttft:>12.1f} {full:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
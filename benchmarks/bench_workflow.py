@@ -0,0 +1,198 @@
+"""Per-stage latency and throughput of full workflow turns, fully offline.
+
+Runs LangGraphWorkflow.run (or arun) end to end with local stand-ins: a fake
+chat model with fixed latency for the router, the general agent and the
+summarizer, the stub Perplexity server for search, and an in-memory store
+for MongoDB. Each configuration prefills its threads with ``length``
+messages, then plays ``turns`` turns on ``concurrency`` threads at once and
+reports p50/p95/p99 for every stage plus turns per second.
+
+``--speculation likely`` (or ``both``) starts agents while the LLM router
+is still deciding; the speculator's hits, misses and latency saved are
+printed after the table.
+
+Save a run with ``--output`` and compare a later one against it with
+``--baseline``; the exit status is 1 if any stage's p95 or the throughput
+got worse by more than ``--tolerance``.
+
+Usage:
+    python -m benchmarks.bench_workflow --lengths 0,50,200 --concurrency 1,8,32 --output before.json
+    python -m benchmarks.bench_workflow --lengths 0,50,200 --concurrency 1,8,32 --baseline before.json
+    python -m benchmarks.bench_workflow --lengths 0 --concurrency 1,8 --speculation likely
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.offline import OfflineBackends, StageTimer, offline_backends
+
+QUESTIONS = [
+    "5 day itinerary for Tokyo in April #{n}",
+    "Explain the difference between a visa and a passport stamp #{n}",
+    "Where should I go next? #{n}",
+]
+
+MEMORY_STAGES = {
+    "save_message": "memory.save",
+    "asave_message": "memory.save",
+    "get_conversation_messages": "memory.history",
+    "aget_conversation_messages": "memory.history",
+    "get_unsummarized_messages": "memory.unsummarized",
+    "aget_unsummarized_messages": "memory.unsummarized",
+    "update_summary": "memory.update_summary",
+    "aupdate_summary": "memory.update_summary",
+}
+NODE_STAGES = {
+    "general_talk_node": "general_agent",
+    "ageneral_talk_node": "general_agent",
+    "internet_search_node": "internet_search",
+    "ainternet_search_node": "internet_search",
+}
+
+
+class WorkflowBench:
+    """Plays timed turns against one set of offline backends."""
+
+    def __init__(self, backends: OfflineBackends, mode: str, speculation: Any = None):
+        from workflow.langgraph_workflow import LangGraphWorkflow
+
+        self.backends = backends
+        self.mode = mode
+        self.speculation = speculation
+        self.workflow_class = LangGraphWorkflow
+        self.timer = StageTimer()
+        self._questions = itertools.count()
+        self.timer.instrument(backends.memory, MEMORY_STAGES)
+        self.timer.instrument(backends.router, {"route": "route", "aroute": "route"})
+        self.timer.instrument(backends.summarizer, {"update": "summarize", "aupdate": "summarize"})
+
+    def _turn(self, thread_id: str):
+        workflow = self.workflow_class("bench_user", thread_id, memory_manager=self.backends.memory,
+                                       router=self.backends.router, summarizer=self.backends.summarizer,
+                                       speculation=self.speculation)
+        self.timer.instrument(workflow, NODE_STAGES)
+        n = next(self._questions)
+        return workflow, {"user_question": QUESTIONS[n % len(QUESTIONS)].format(n=n)}
+
+    def _play(self, thread_id: str, turns: int) -> None:
+        for _ in range(turns):
+            workflow, state = self._turn(thread_id)
+            start = time.perf_counter()
+            workflow.run(state)
+            self.timer.record("turn", time.perf_counter() - start)
+
+    async def _aplay(self, thread_id: str, turns: int) -> None:
+        for _ in range(turns):
+            workflow, state = self._turn(thread_id)
+            start = time.perf_counter()
+            await workflow.arun(state)
+            self.timer.record("turn", time.perf_counter() - start)
+
+    def measure(self, length: int, concurrency: int, turns: int) -> Dict[str, Any]:
+        """Time ``turns`` turns on each of ``concurrency`` threads prefilled with ``length`` messages."""
+        self.timer.samples.clear()
+        thread_ids = [f"bench-{length}-{concurrency}-{n}" for n in range(concurrency)]
+        for thread_id in thread_ids:
+            self.backends.memory.prefill("bench_user", thread_id, length)
+
+        start = time.perf_counter()
+        if self.mode == "arun":
+            async def play_all():
+                await asyncio.gather(*(self._aplay(thread_id, turns) for thread_id in thread_ids))
+            asyncio.run(play_all())
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(lambda thread_id: self._play(thread_id, turns), thread_ids))
+        elapsed = time.perf_counter() - start
+
+        return {
+            "mode": self.mode,
+            "length": length,
+            "concurrency": concurrency,
+            "turns_per_s": concurrency * turns / elapsed,
+            "stages": self.timer.summary(),
+        }
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'length':>6} {'conc':>5} {'stage':>22} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        for stage, stats in sorted(result["stages"].items()):
+            print(f"{result['length']:>6} {result['concurrency']:>5} {stage:>22} {stats['count']:>6} "
+                  f"{stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}")
+        print(f"{result['length']:>6} {result['concurrency']:>5} {'turns/s':>22} {result['turns_per_s']:>6.1f}")
+
+
+def regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float,
+                min_delta_ms: float) -> List[str]:
+    """Stages whose p95, and configurations whose throughput, got worse than the baseline allows."""
+    previous = {(b["mode"], b["length"], b["concurrency"]): b for b in baseline}
+    found = []
+    for result in results:
+        before = previous.get((result["mode"], result["length"], result["concurrency"]))
+        if before is None:
+            continue
+        label = f"{result['mode']} length={result['length']} concurrency={result['concurrency']}"
+        if result["turns_per_s"] < before["turns_per_s"] * (1 - tolerance):
+            found.append(f"{label} turns/s {before['turns_per_s']:.1f} -> {result['turns_per_s']:.1f}")
+        for stage, stats in result["stages"].items():
+            old = before["stages"].get(stage)
+            if old is None:
+                continue
+            # Sub-millisecond stages are mostly scheduler noise; require an absolute change too
+            if stats["p95"] > old["p95"] * (1 + tolerance) and stats["p95"] - old["p95"] > min_delta_ms:
+                found.append(f"{label} {stage} p95 {old['p95']:.2f} ms -> {stats['p95']:.2f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["run", "arun"], default="run")
+    parser.add_argument("--lengths", default="0,50,200", help="comma separated messages already in each thread")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated threads played at once")
+    parser.add_argument("--turns", type=int, default=5, help="turns per thread")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--mongo-latency", type=float, default=0.002)
+    parser.add_argument("--speculation", choices=["off", "likely", "both"], default="off",
+                        help="start agents while the LLM router decides")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore p95 changes smaller than this")
+    args = parser.parse_args()
+
+    from workflow.speculation import SpeculationPolicy, get_speculator
+
+    speculation = SpeculationPolicy(args.speculation) if args.speculation != "off" else None
+    results = []
+    with offline_backends(args.llm_latency, args.search_latency, args.mongo_latency) as backends:
+        bench = WorkflowBench(backends, args.mode, speculation)
+        for length in [int(x) for x in args.lengths.split(",")]:
+            for concurrency in [int(x) for x in args.concurrency.split(",")]:
+                results.append(bench.measure(length, concurrency, args.turns))
+
+    print_results(results)
+    if speculation is not None:
+        stats = get_speculator(speculation).stats()
+        print("speculation " + " ".join(f"{key}={value:.3g}" for key, value in stats.items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in found:
+            print(f"REGRESSION {line}")
+        print(f"{len(found)} regression(s) against {args.baseline}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
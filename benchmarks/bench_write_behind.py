@@ -0,0 +1,64 @@
+"""Request-path cost of persisting a turn, direct writes versus the write-behind queue.
+
+Each worker thread plays conversation turns the way the workflow does: save
+the user message, load recent history, save the assistant answer. With
+``write_behind`` off both saves are round trips on the request path; with it
+on they are queued and the flusher writes them in shared ``bulk_write``
+batches, while the history read still sees them.
+
+Usage:
+    python -m benchmarks.bench_write_behind --uri mongodb://localhost:27017/ --threads 16
+"""
+import argparse
+import statistics
+import threading
+import time
+from typing import List
+
+from memories.memories import MemoryManager
+
+
+def play_turns(memory: MemoryManager, thread_id: str, turns: int, latencies: List[float]) -> None:
+    for turn in range(turns):
+        start = time.perf_counter()
+        memory.save_message("bench_user", thread_id, "user", f"question {turn}")
+        history = memory.get_conversation_messages("bench_user", thread_id, limit=10)
+        assert history[-1].content == f"question {turn}", "history is missing the saved message"
+        memory.save_message("bench_user", thread_id, "assistant", f"answer {turn}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=50, help="turns per conversation")
+    args = parser.parse_args()
+
+    print(f"{'mode':>14} {'p50 ms':>10} {'p99 ms':>10} {'turns/s':>10} {'writes':>8}")
+    for write_behind in (False, True):
+        memory = MemoryManager(args.uri, write_behind=write_behind)
+        memory.clear_all_conversations()
+        latencies: List[float] = []
+        workers = [
+            threading.Thread(target=play_turns, args=(memory, f"bench_{n}", args.turns, latencies))
+            for n in range(args.threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        memory.flush()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        batches = memory.write_queue.stats()["batches"] if memory.write_queue else len(latencies) * 2
+        mode = "write-behind" if write_behind else "direct"
+        print(f"{mode:>14} {statistics.median(latencies):>10.3f} "
+              f"{latencies[int(len(latencies) * 0.99) - 1]:>10.3f} {len(latencies) / elapsed:>10.1f} {batches:>8}")
+        memory.clear_all_conversations()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Offline evaluation of the agent routers against a labelled query set.
+
+Reports, for the local keyword router, how many queries it resolves on its
+own (coverage), its accuracy on those, and its routing latency. With --llm
+the LLM router and the hybrid router are evaluated too (requires
+OPENAI_API_KEY), including agreement between the hybrid and LLM routers.
+
+Usage:
+    python -m benchmarks.eval_router
+    python -m benchmarks.eval_router --llm --threshold 0.75
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+from utils.env import load_environment
+from workflow.agent_router import KeywordRouter, LLMRouter, HybridRouter
+
+
+def load_queries(path: str) -> List[Dict[str, str]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default="benchmarks/data/router_queries.jsonl")
+    parser.add_argument("--threshold", type=float, default=0.75, help="local confidence needed to skip the LLM")
+    parser.add_argument("--llm", action="store_true", help="also evaluate the LLM and hybrid routers")
+    parser.add_argument("--verbose", action="store_true", help="print every misrouted query")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    local = KeywordRouter()
+
+    covered = correct = 0
+    start = time.perf_counter()
+    decisions = [local.route(item["query"]) for item in queries]
+    local_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    for item, decision in zip(queries, decisions):
+        if decision.confidence >= args.threshold:
+            covered += 1
+            if decision.agent_type == item["label"]:
+                correct += 1
+            elif args.verbose:
+                print(f"local misroute: {item['query']!r} -> {decision.agent_type} (expected {item['label']})")
+
+    print(f"queries:                {len(queries)}")
+    print(f"local coverage:         {covered / len(queries):.1%} (threshold {args.threshold})")
+    print(f"local accuracy:         {correct / covered:.1%}" if covered else "local accuracy:         n/a")
+    print(f"local latency:          {local_ms:.3f} ms/query")
+
+    if not args.llm:
+        return
+
+    load_environment()
+    llm = LLMRouter()
+    hybrid = HybridRouter(local, llm, args.threshold)
+
+    llm_correct = hybrid_correct = agreement = 0
+    llm_time = hybrid_time = 0.0
+    for item in queries:
+        start = time.perf_counter()
+        llm_decision = llm.route(item["query"])
+        llm_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        hybrid_decision = hybrid.route(item["query"])
+        hybrid_time += time.perf_counter() - start
+
+        llm_correct += llm_decision.agent_type == item["label"]
+        hybrid_correct += hybrid_decision.agent_type == item["label"]
+        agreement += hybrid_decision.agent_type == llm_decision.agent_type
+        if args.verbose and hybrid_decision.agent_type != llm_decision.agent_type:
+            print(f"disagreement: {item['query']!r} hybrid={hybrid_decision.agent_type} llm={llm_decision.agent_type}")
+
+    print(f"llm accuracy:           {llm_correct / len(queries):.1%}")
+    print(f"hybrid accuracy:        {hybrid_correct / len(queries):.1%}")
+    print(f"hybrid/llm agreement:   {agreement / len(queries):.1%}")
+    print(f"llm latency:            {llm_time * 1000 / len(queries):.1f} ms/query")
+    print(f"hybrid latency:         {hybrid_time * 1000 / len(queries):.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
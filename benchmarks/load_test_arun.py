@@ -0,0 +1,72 @@
+"""Throughput of LangGraphWorkflow.run versus concurrent arun with stubbed backends.
+
+Every backend is local and adds a fixed latency: a fake chat model for the
+router and the general agent, the stub Perplexity server for search, and an
+in-memory store standing in for MongoDB. Sequential ``run`` calls pay every
+latency back to back; ``arun`` turns are gathered on one event loop, so their
+waits overlap.
+
+Usage:
+    python -m benchmarks.load_test_arun --conversations 200 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from benchmarks.offline import offline_backends
+
+QUESTIONS = [
+    "5 day itinerary for Tokyo in April #{n}",
+    "Explain the difference between a visa and a passport stamp #{n}",
+    "Where should I go next? #{n}",
+]
+
+
+def _turns(count: int) -> List[Dict[str, Any]]:
+    return [{"user_question": QUESTIONS[n % len(QUESTIONS)].format(n=n)} for n in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--sequential", type=int, default=20, help="turns timed for the sync baseline")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--mongo-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    with offline_backends(args.llm_latency, args.search_latency, args.mongo_latency) as backends:
+        from workflow.langgraph_workflow import LangGraphWorkflow
+
+        router, memory = backends.router, backends.memory
+
+        def workflow(n: int) -> LangGraphWorkflow:
+            return LangGraphWorkflow(f"user-{n}", f"thread-{n}", memory_manager=memory, router=router)
+
+        start = time.perf_counter()
+        for n, turn in enumerate(_turns(args.sequential)):
+            workflow(n).run(dict(turn))
+        sync_elapsed = time.perf_counter() - start
+        sync_rate = args.sequential / sync_elapsed
+
+        async def concurrent():
+            turns = _turns(args.conversations)
+            return await asyncio.gather(*(
+                workflow(args.sequential + n).arun(dict(turn)) for n, turn in enumerate(turns)
+            ))
+
+        start = time.perf_counter()
+        results = asyncio.run(concurrent())
+        async_elapsed = time.perf_counter() - start
+        async_rate = args.conversations / async_elapsed
+        answered = sum(1 for result in results if result.get("response"))
+
+    print(f"{'mode':>12} {'turns':>6} {'seconds':>8} {'turns/s':>8}")
+    print(f"{'run':>12} {args.sequential:>6} {sync_elapsed:>8.2f} {sync_rate:>8.1f}")
+    print(f"{'arun':>12} {args.conversations:>6} {async_elapsed:>8.2f} {async_rate:>8.1f}")
+    print(f"speedup: {async_rate / sync_rate:.1f}x, {answered}/{args.conversations} async turns answered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Load test of the multi-session chat server with stubbed backends.
+
+Starts server.chat_server on a local port, backed by the fake chat model, the
+stub Perplexity server and the in-memory store. ``--sessions`` clients then
+each play ``--turns`` turns on their own (user_id, thread_id), over HTTP or,
+with ``--websocket``, over one WebSocket per session. Turns rejected with
+429 (backpressure) are retried after a short pause and counted.
+
+Usage:
+    python -m benchmarks.load_test_server --sessions 200 --turns 5 --max-concurrent-turns 32
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_workflow import QUESTIONS
+from benchmarks.offline import offline_backends, percentile
+from server.chat_server import ChatServer
+
+RETRY_DELAY = 0.05
+
+
+async def http_session(client: httpx.AsyncClient, n: int, turns: int, latencies: List[float],
+                       counters: Dict[str, int]) -> None:
+    for turn in range(turns):
+        body = {"user_id": f"user-{n}", "thread_id": f"thread-{n}",
+                "message": QUESTIONS[(n + turn) % len(QUESTIONS)].format(n=f"{n}.{turn}")}
+        start = time.perf_counter()
+        while True:
+            response = await client.post("/chat", json=body)
+            if response.status_code != 429:
+                break
+            counters["rejected"] += 1
+            await asyncio.sleep(RETRY_DELAY)
+        latencies.append(time.perf_counter() - start)
+        counters["ok" if response.status_code == 200 and response.json().get("response") else "failed"] += 1
+
+
+async def websocket_session(url: str, n: int, turns: int, latencies: List[float], counters: Dict[str, int]) -> None:
+    from websockets.asyncio.client import connect
+
+    async with connect(f"{url}/ws?user_id=user-{n}&thread_id=thread-{n}") as websocket:
+        for turn in range(turns):
+            message = json.dumps({"message": QUESTIONS[(n + turn) % len(QUESTIONS)].format(n=f"{n}.{turn}")})
+            start = time.perf_counter()
+            while True:
+                await websocket.send(message)
+                event = json.loads(await websocket.recv())
+                while event["type"] == "token":
+                    event = json.loads(await websocket.recv())
+                if event.get("error") != "overloaded":
+                    break
+                counters["rejected"] += 1
+                await asyncio.sleep(RETRY_DELAY)
+            latencies.append(time.perf_counter() - start)
+            counters["ok" if event["type"] == "done" and event.get("response") else "failed"] += 1
+
+
+def start_server(server: ChatServer) -> uvicorn.Server:
+    # Clients pause between retries; keep their pooled connections open meanwhile
+    uvicorn_server = uvicorn.Server(uvicorn.Config(server.app(), host="127.0.0.1", port=0, log_level="warning",
+                                                   backlog=4096, timeout_keep_alive=60))
+    threading.Thread(target=uvicorn_server.run, name="chat-server", daemon=True).start()
+    while not uvicorn_server.started:
+        time.sleep(0.01)
+    return uvicorn_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--websocket", action="store_true", help="stream turns over WebSockets instead of POST /chat")
+    parser.add_argument("--max-concurrent-turns", type=int, default=32)
+    parser.add_argument("--max-pending-turns", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--mongo-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    with offline_backends(args.llm_latency, args.search_latency, args.mongo_latency) as backends:
+        server = ChatServer(backends.memory, backends.router, backends.summarizer,
+                            max_concurrent_turns=args.max_concurrent_turns, max_pending_turns=args.max_pending_turns)
+        uvicorn_server = start_server(server)
+        host, port = uvicorn_server.servers[0].sockets[0].getsockname()[:2]
+        url = f"http://{host}:{port}"
+
+        latencies: List[float] = []
+        counters = {"ok": 0, "failed": 0, "rejected": 0}
+
+        async def load():
+            if args.websocket:
+                await asyncio.gather(*(
+                    websocket_session(url.replace("http", "ws", 1), n, args.turns, latencies, counters)
+                    for n in range(args.sessions)
+                ))
+                return
+            limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+                await asyncio.gather(*(
+                    http_session(client, n, args.turns, latencies, counters) for n in range(args.sessions)
+                ))
+
+        start = time.perf_counter()
+        asyncio.run(load())
+        elapsed = time.perf_counter() - start
+        stats = httpx.get(f"{url}/health").json()
+        uvicorn_server.should_exit = True
+
+    turns = args.sessions * args.turns
+    print(f"{'transport':>10} {'turns':>6} {'turns/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'429s':>6} {'failed':>7}")
+    print(f"{'websocket' if args.websocket else 'http':>10} {turns:>6} {turns / elapsed:>8.1f} "
+          f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} "
+          f"{counters['rejected']:>6} {counters['failed']:>7}")
+    print(f"server: {stats}")
+
+
+if __name__ == "__main__":
+    main()
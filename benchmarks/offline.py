@@ -0,0 +1,233 @@
+"""Local stand-ins for OpenAI, Perplexity and MongoDB, shared by the workflow benchmarks.
+
+``offline_backends`` starts the stub Perplexity server and wires a fake chat
+model into the router, the general agent and the summarizer, so a
+LangGraphWorkflow built from the returned pieces makes no network calls
+besides loopback requests to the stub. ``StageTimer`` wraps methods on those
+pieces to record how long each stage of a turn took.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+# The real clients are built at import time; give them harmless settings
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("PERPLEXITY_API_KEY", "stub")
+
+from benchmarks.stub_perplexity import DEFAULT_CONTENT, StubPerplexityServer
+from memories.mongodb_memories import Message
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """Answers after a fixed delay; sleeps in invoke, awaits in ainvoke.
+
+    stream/astream deliver the first token after ``latency`` and the rest
+    one word at a time, ``token_delay`` seconds apart.
+    """
+
+    def __init__(self, latency: float, token_delay: float = 0.0, answer_words: int = 1):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+
+    def _answer(self, input) -> FakeResponse:
+        text = str(input)
+        if "itinerary" in text.lower():
+            return FakeResponse("internet_search")
+        words = ["general", "answer"] + ["word"] * max(0, self.answer_words - 2)
+        return FakeResponse(" ".join(words) + f" #{len(text)}")
+
+    def _tokens(self, input) -> List[str]:
+        return [word + " " for word in self._answer(input).content.split(" ")]
+
+    def invoke(self, input, **kwargs) -> FakeResponse:
+        time.sleep(self.latency + self.token_delay * (len(self._tokens(input)) - 1))
+        return self._answer(input)
+
+    async def ainvoke(self, input, **kwargs) -> FakeResponse:
+        await asyncio.sleep(self.latency + self.token_delay * (len(self._tokens(input)) - 1))
+        return self._answer(input)
+
+    def stream(self, input, **kwargs) -> Iterator[FakeResponse]:
+        time.sleep(self.latency)
+        for index, token in enumerate(self._tokens(input)):
+            if index:
+                time.sleep(self.token_delay)
+            yield FakeResponse(token)
+
+    async def astream(self, input, **kwargs) -> AsyncIterator[FakeResponse]:
+        await asyncio.sleep(self.latency)
+        for index, token in enumerate(self._tokens(input)):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            yield FakeResponse(token)
+
+
+class InMemoryMemoryManager:
+    """MemoryManager stand-in with a fixed per-operation round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.messages: Dict[tuple, List[Message]] = {}
+        self.summaries: Dict[tuple, tuple] = {}
+
+    def _save(self, user_id, thread_id, role, content, metadata) -> str:
+        self.messages.setdefault((user_id, thread_id), []).append(
+            Message(role=role, content=content, timestamp=datetime.now(), metadata=metadata)
+        )
+        return f"{user_id}:{thread_id}"
+
+    def _recent(self, user_id, thread_id, limit) -> List[Message]:
+        messages = self.messages.get((user_id, thread_id), [])
+        return messages[-limit:] if limit else list(messages)
+
+    def _unsummarized(self, user_id, thread_id) -> tuple:
+        summary, summarized_count = self.summaries.get((user_id, thread_id), (None, 0))
+        return summary, summarized_count, self.messages.get((user_id, thread_id), [])[summarized_count:]
+
+    def _update_summary(self, user_id, thread_id, summary, summarized_count) -> bool:
+        if self.summaries.get((user_id, thread_id), (None, 0))[1] >= summarized_count:
+            return False
+        self.summaries[(user_id, thread_id)] = (summary, summarized_count)
+        return True
+
+    def prefill(self, user_id: str, thread_id: str, count: int, words: int = 40) -> None:
+        """Give a thread ``count`` alternating user/assistant messages of about ``words`` words each."""
+        messages = self.messages.setdefault((user_id, thread_id), [])
+        for n in range(count):
+            role = "user" if n % 2 == 0 else "assistant"
+            content = f"{role} message {n} " + "about the trip " * (words // 3)
+            messages.append(Message(role=role, content=content, timestamp=datetime.now(),
+                                    metadata={"token_count": words + 3}))
+
+    def save_message(self, user_id: str, thread_id: str, role: str, content: str,
+                     metadata: Optional[Dict[str, Any]] = None) -> str:
+        time.sleep(self.latency)
+        return self._save(user_id, thread_id, role, content, metadata)
+
+    async def asave_message(self, user_id: str, thread_id: str, role: str, content: str,
+                            metadata: Optional[Dict[str, Any]] = None) -> str:
+        await asyncio.sleep(self.latency)
+        return self._save(user_id, thread_id, role, content, metadata)
+
+    def get_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None,
+                                  include_metadata: bool = True) -> List[Message]:
+        time.sleep(self.latency)
+        return self._recent(user_id, thread_id, limit)
+
+    async def aget_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None,
+                                         include_metadata: bool = True) -> List[Message]:
+        await asyncio.sleep(self.latency)
+        return self._recent(user_id, thread_id, limit)
+
+    def get_unsummarized_messages(self, user_id: str, thread_id: str) -> tuple:
+        time.sleep(self.latency)
+        return self._unsummarized(user_id, thread_id)
+
+    async def aget_unsummarized_messages(self, user_id: str, thread_id: str) -> tuple:
+        await asyncio.sleep(self.latency)
+        return self._unsummarized(user_id, thread_id)
+
+    def update_summary(self, user_id: str, thread_id: str, summary: str, summarized_count: int) -> bool:
+        time.sleep(self.latency)
+        return self._update_summary(user_id, thread_id, summary, summarized_count)
+
+    async def aupdate_summary(self, user_id: str, thread_id: str, summary: str, summarized_count: int) -> bool:
+        await asyncio.sleep(self.latency)
+        return self._update_summary(user_id, thread_id, summary, summarized_count)
+
+
+@dataclass
+class OfflineBackends:
+    """Everything a LangGraphWorkflow needs, with no real external service behind it."""
+    llm: FakeChatModel
+    router: Any
+    summarizer: Any
+    memory: InMemoryMemoryManager
+    server: StubPerplexityServer
+
+
+@contextmanager
+def offline_backends(llm_latency: float = 0.2, search_latency: float = 0.5, mongo_latency: float = 0.005,
+                     token_delay: float = 0.0, answer_words: int = 1,
+                     search_content: str = DEFAULT_CONTENT) -> Iterator[OfflineBackends]:
+    """Start the stub Perplexity server and route every model call to one FakeChatModel."""
+    with StubPerplexityServer(latency=search_latency, token_delay=token_delay, content=search_content) as server:
+        os.environ["PERPLEXITY_API_URL"] = server.url
+        import tools.general_agent
+        from utils.conversion_summarizer import ConversationSummarizer
+        from workflow.agent_router import HybridRouter, LLMRouter
+
+        llm = FakeChatModel(llm_latency, token_delay, answer_words)
+        tools.general_agent.llm_client = llm
+        fallback = LLMRouter()
+        fallback._llm = llm
+        summarizer = ConversationSummarizer()
+        summarizer._llm = llm
+        yield OfflineBackends(llm, HybridRouter(fallback_router=fallback), summarizer,
+                              InMemoryMemoryManager(mongo_latency), server)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+class StageTimer:
+    """Records wall time per named stage, from any thread or event loop."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        """``func`` timed under ``stage``; coroutine functions stay awaitable."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, obj: Any, stages: Dict[str, str]) -> None:
+        """Replace each attribute named in ``stages`` on ``obj`` with a timed wrapper."""
+        for attribute, stage in stages.items():
+            setattr(obj, attribute, self.wrap(stage, getattr(obj, attribute)))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count, p50, p95 and p99 in milliseconds for every stage."""
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        return {
+            stage: {"count": len(values), **{f"p{pct}": percentile(values, pct) * 1000 for pct in (50, 95, 99)}}
+            for stage, values in samples.items()
+        }
@@ -0,0 +1,178 @@
+"""Local stand-in for the Perplexity chat completions API.
+
+Serves POST /chat/completions with a canned travel plan after a configurable
+delay, and can fail the first N requests with a given status to exercise
+retries. Requests with ``"stream": true`` get the plan as Server-Sent Events,
+one word per event, ``token_delay`` seconds apart. Point the search tool at it
+with PERPLEXITY_API_URL.
+
+Usage:
+    python -m benchmarks.stub_perplexity --port 8081 --latency 0.5 --token-delay 0.01
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_CONTENT = (
+    "### 1. Transportation\n- Round-trip flights: ~$800\n\n"
+    "### 2. Accommodation\n- Mid-range hotel: ~$120/night\n\n"
+    "### 3. Daily Itinerary\n**Day 1:** Arrival and old town walk\n"
+)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Load tests open many connections at once; the default backlog of 5 drops SYNs (1 s retransmits)
+    request_queue_size = 128
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients may hang up mid-stream (e.g. a cancelled speculative search); only log real failures
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubPerplexityServer:
+    """Threaded stub server; usable as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 content: str = DEFAULT_CONTENT, fail_first: int = 0, fail_status: int = 503,
+                 token_delay: float = 0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.content = content
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = _HTTPServer((host, port), self._handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+            # Headers and body are written separately; avoid Nagle/delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    failing = server.requests <= server.fail_first
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if failing:
+                    self._send_json(server.fail_status, {"error": "injected failure"})
+                    return
+                if payload.get("stream"):
+                    self._send_events(server.completion_chunks(payload))
+                    return
+                self._send_json(200, server.completion(payload))
+
+            def _send_events(self, chunks):
+                # No Content-Length for a stream, so use chunked transfer encoding to keep the connection
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for index, chunk in enumerate(chunks):
+                    if index and server.token_delay:
+                        time.sleep(server.token_delay)
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def completion(self, payload: dict) -> dict:
+        """Chat completion body in the Perplexity response format."""
+        query = payload.get("messages", [{}])[-1].get("content", "")
+        return {
+            "id": "stub",
+            "model": payload.get("model", "sonar"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.content}}],
+            "usage": {
+                "prompt_tokens": len(query.split()),
+                "completion_tokens": len(self.content.split()),
+            },
+        }
+
+    def completion_chunks(self, payload: dict) -> list:
+        """Streaming completion events, one per word of the canned content."""
+        tokens = re.findall(r"\S+\s*|\s+", self.content)
+        chunks = [
+            {"id": "stub", "model": payload.get("model", "sonar"),
+             "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}]}
+            for token in tokens
+        ]
+        chunks.append({"id": "stub", "model": payload.get("model", "sonar"),
+                       "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        return chunks
+
+    def start(self) -> "StubPerplexityServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubPerplexityServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before responding")
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = StubPerplexityServer(args.host, args.port, args.latency,
+                                  fail_first=args.fail_first, fail_status=args.fail_status,
+                                  token_delay=args.token_delay)
+    print(f"Stub Perplexity API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
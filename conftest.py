@@ -0,0 +1,51 @@
+"""Shared pytest fixtures: an in-memory MongoDB (mongomock) behind the process-wide client registry."""
+import uuid
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+from mongomock.collection import BulkOperationBuilder, Collection
+
+
+def _ignore_sort(method):
+    # PyMongo 4.11+ passes sort= to bulk update builders; mongomock does not accept it yet
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+for _name in ("add_replace", "add_update"):
+    setattr(BulkOperationBuilder, _name, _ignore_sort(getattr(BulkOperationBuilder, _name)))
+
+
+def _find_modified_by_id(method):
+    # mongomock re-reads the updated document with the query unless the projection keeps _id, so it
+    # returns None once the update made the query stop matching; MongoDB returns the document it modified
+    def wrapper(self, query, projection=None, *args, **kwargs):
+        if not (isinstance(projection, dict) and projection.get("_id") == 0 and len(projection) > 1):
+            return method(self, query, projection, *args, **kwargs)
+        document = method(self, query, {key: value for key, value in projection.items() if key != "_id"},
+                          *args, **kwargs)
+        if document is not None:
+            document.pop("_id", None)
+        return document
+    return wrapper
+
+
+Collection._find_and_modify = _find_modified_by_id(Collection._find_and_modify)
+
+
+@pytest.fixture
+def mongo_uri(monkeypatch):
+    """Connection string whose MongoClient is a fresh mongomock client.
+
+    The string is unique per test, so process-wide registries keyed by it
+    (conversation caches, write-behind queues) start empty as well.
+    """
+    from memories import mongodb_client
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mongodb_client, "MongoClient", lambda *args, **kwargs: client)
+    mongodb_client.close_mongo_clients()
+    yield f"mongodb://test-{uuid.uuid4().hex}/"
+    mongodb_client.close_mongo_clients()
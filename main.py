@@ -1,12 +1,27 @@
+import argparse
+import sys
 from workflow.langgraph_workflow import LangGraphWorkflow
+from utils import tracing
 from typing import Dict, Any
 
 
 def main():
+    # The multi-session server has its own options: python main.py serve --port 8000
+    if sys.argv[1:2] == ["serve"]:
+        from server.chat_server import main as serve
+
+        sys.argv = [f"{sys.argv[0]} serve"] + sys.argv[2:]
+        serve()
+        return
+
+    parser = argparse.ArgumentParser(description="Chat with the travel planner in the terminal.")
+    parser.add_argument("--user-id", default="user123")
+    parser.add_argument("--thread-id", default="thread456")
+    args = parser.parse_args()
+    tracing.serve_metrics()
+
     # Initialize workflow with user and thread IDs
-    user_id = "user123" # dummy data
-    thread_id = "thread456" # dummy data
-    workflow = LangGraphWorkflow(user_id=user_id, thread_id=thread_id)
+    workflow = LangGraphWorkflow(user_id=args.user_id, thread_id=args.thread_id)
 
     # Initialize conversation state
     conversation_state: Dict[str, Any] = {
@@ -34,34 +49,29 @@ def main():
         })
         conversation_state["user_question"] = user_question
 
-        # Run the workflow
+        # Run the workflow, printing the answer as it streams in
+        result_state: Dict[str, Any] = {}
+        streamed = False
         try:
-            result_state = workflow.run(conversation_state)
+            for kind, value in workflow.stream(conversation_state):
+                if kind == "token":
+                    if not streamed:
+                        print("Assistant: ", end="", flush=True)
+                        streamed = True
+                    print(value, end="", flush=True)
+                else:
+                    result_state = value
         except Exception as e:
-            print(f"Workflow run failed: {e}")
+            print(f"\nWorkflow run failed: {e}")
             continue
 
-        # Extract assistant reply
-        assistant_reply = None
-        if isinstance(result_state, dict):
-            msgs = result_state.get("messages")
-            if isinstance(msgs, list) and len(msgs) > 0:
-                # Get the last assistant message
-                for msg in reversed(msgs):
-                    if isinstance(msg, dict) and msg.get("role") == "assistant":
-                        assistant_reply = msg.get("content")
-                        break
-                    elif hasattr(msg, "content"):
-                        assistant_reply = getattr(msg, "content", None)
-                        break
-
-            if not assistant_reply:
-                assistant_reply = result_state.get("assistant_reply") or result_state.get("response")
-
-        if assistant_reply:
-            print(f"Assistant: {assistant_reply}")
+        if streamed:
+            print()
             # Update conversation state with the full message history
-            conversation_state = result_state if isinstance(result_state, dict) else conversation_state
+            conversation_state = result_state or conversation_state
+        elif result_state.get("response"):
+            print(f"Assistant: {result_state['response']}")
+            conversation_state = result_state
         else:
             print("No response generated.")
 
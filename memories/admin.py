@@ -0,0 +1,40 @@
+"""Administrative commands for the conversation store.
+
+Usage:
+    python -m memories.admin setup      # create indexes, clean up legacy documents
+    python -m memories.admin migrate    # migrate legacy data to the configured layout
+"""
+import argparse
+import os
+from .memories import MemoryManager
+from .mongodb_memories import EMBEDDED_STORAGE, BUCKETED_STORAGE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["setup", "migrate"])
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--storage-mode", choices=[EMBEDDED_STORAGE, BUCKETED_STORAGE], default=EMBEDDED_STORAGE)
+    parser.add_argument("--bucket-size", type=int, default=100)
+    args = parser.parse_args()
+
+    memory_manager = MemoryManager(
+        args.uri,
+        storage_mode=args.storage_mode,
+        bucket_size=args.bucket_size,
+        auto_setup=False,
+        write_behind=False
+    )
+
+    if args.command == "setup":
+        memory_manager.setup_database()
+        print("Indexes created")
+    elif args.command == "migrate":
+        memory_manager.setup_database()
+        if not memory_manager.migrate_legacy_data():
+            raise SystemExit(1)
+        print("Migration complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils import tracing
+from .mongodb_client import get_async_mongo_client
+from .mongodb_memories import (
+    MongoDBMemory, Message, BUCKETED_STORAGE, BUCKETED_HEADER_MATCH, CONVERSATION_ID_PROJECTION,
+    HEADER_COUNT_PROJECTION, SUMMARY_PROJECTION, THREAD_STATE_PROJECTION, HEADER_LIST_PROJECTION, LIST_SORT,
+    ConversationHeader, _claim_update, _record_read, _skip_empty_header
+)
+
+
+class AsyncMongoDBMemory:
+    """Non-blocking access to the per-turn operations of a MongoDBMemory.
+
+    Queries and updates are built by the wrapped MongoDBMemory so both paths
+    share one storage layout; only the I/O goes through PyMongo's async client.
+    """
+
+    def __init__(self, memory: MongoDBMemory):
+        self.memory = memory
+
+    def _collections(self):
+        client = get_async_mongo_client(self.memory.connection_string, self.memory.max_pool_size,
+                                        self.memory.min_pool_size)
+        db = client[self.memory.database_name]
+        return db[self.memory.collection_name], db[f"{self.memory.collection_name}_buckets"]
+
+    async def _append(self, query: Dict[str, Any], update: Dict[str, Any],
+                      projection: Dict[str, Any]) -> Dict[str, Any]:
+        collection, _ = self._collections()
+        query = _skip_empty_header(query)
+        try:
+            return await collection.find_one_and_update(
+                query, update, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            claimed = await collection.find_one_and_update(
+                {**query, "message_count": 0}, _claim_update(update),
+                projection=projection, return_document=ReturnDocument.AFTER
+            )
+            if claimed is not None:
+                return claimed
+            # Lost the race to create the conversation; retry against the existing document
+            return await collection.find_one_and_update(
+                query, update, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+            )
+
+    @tracing.traced("memory.add_message")
+    async def add_message(self, user_id: str, thread_id: str, role: str, content: str,
+                          metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Add a message to the conversation."""
+        message = Message(role=role, content=content, timestamp=datetime.now(), metadata=metadata)
+        return await self.append_message(user_id, thread_id, message)
+
+    @tracing.traced("memory.append_message")
+    async def append_message(self, user_id: str, thread_id: str, message: Message) -> str:
+        """Append an already-built message; returns the conversation id."""
+        query = {"user_id": user_id, "thread_id": thread_id}
+
+        if self.memory.storage_mode == BUCKETED_STORAGE:
+            header = await self._reserve_sequence_numbers(user_id, thread_id, message)
+            [(bucket_query, bucket_update)] = self.memory._bucket_appends(header, user_id, thread_id, [message])
+            _, buckets = self._collections()
+            try:
+                await buckets.update_one(bucket_query, bucket_update, upsert=True)
+            except DuplicateKeyError:
+                await buckets.update_one(bucket_query, bucket_update, upsert=True)
+            return header["conversation_id"]
+
+        conversation_doc = await self._append(
+            query,
+            self.memory._embedded_append_update(user_id, thread_id, [message]),
+            CONVERSATION_ID_PROJECTION
+        )
+        return conversation_doc["conversation_id"]
+
+    async def _reserve_sequence_numbers(self, user_id: str, thread_id: str, message: Message) -> Dict[str, Any]:
+        """Async counterpart of MongoDBMemory._reserve_sequence_numbers for one message."""
+        query = {"user_id": user_id, "thread_id": thread_id, **BUCKETED_HEADER_MATCH}
+        update = self.memory._bucketed_header_update(user_id, thread_id, [message])
+        try:
+            return await self._append(query, update, HEADER_COUNT_PROJECTION)
+        except DuplicateKeyError:
+            # Still stored embedded: migrate it first
+            if not await self._migrate_thread(user_id, thread_id):
+                raise ValueError(f"Thread {thread_id} of {user_id} is stored embedded and could not be migrated "
+                                 f"to buckets; run migrate_legacy_data")
+            return await self._append(query, update, HEADER_COUNT_PROJECTION)
+
+    async def _read_messages(self, user_id: str, thread_id: str, limit: Optional[int],
+                             include_metadata: bool, role: Optional[str] = None) -> List[Message]:
+        collection, buckets = self._collections()
+        source = buckets if self.memory.storage_mode == BUCKETED_STORAGE else collection
+        pipeline = self.memory._messages_pipeline(
+            {"user_id": user_id, "thread_id": thread_id}, limit, include_metadata, role
+        )
+        cursor = await source.aggregate(pipeline, allowDiskUse=True)
+        docs = await cursor.to_list(None)
+        if not docs and self.memory.storage_mode == BUCKETED_STORAGE and await self._migrate_thread(user_id, thread_id):
+            cursor = await buckets.aggregate(pipeline, allowDiskUse=True)
+            docs = await cursor.to_list(None)
+        return self.memory._messages_from_docs(docs)
+
+    async def _migrate_thread(self, user_id: str, thread_id: str) -> bool:
+        """Migrate a thread still stored embedded (see MongoDBMemory._migrate_thread) on a worker thread."""
+        return await asyncio.to_thread(self.memory._migrate_thread, user_id, thread_id)
+
+    @tracing.traced("memory.get_conversation_messages")
+    async def get_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None,
+                                        include_metadata: bool = True) -> List[Message]:
+        """Get the last ``limit`` messages from a conversation."""
+        return await self._read_messages(user_id, thread_id, limit, include_metadata)
+
+    @tracing.traced("memory.get_messages_by_role")
+    async def get_messages_by_role(self, user_id: str, thread_id: str, role: str, limit: Optional[int] = None,
+                                   include_metadata: bool = True) -> List[Message]:
+        """Get the last ``limit`` messages with the given role."""
+        return await self._read_messages(user_id, thread_id, limit, include_metadata, role)
+
+    @tracing.traced("memory.get_unsummarized_messages")
+    async def get_unsummarized_messages(self, user_id: str,
+                                        thread_id: str) -> Tuple[Optional[str], int, List[Message]]:
+        """Return the rolling summary, how many messages it covers, and the messages after those."""
+        collection, buckets = self._collections()
+        match = {"user_id": user_id, "thread_id": thread_id}
+        if self.memory.storage_mode == BUCKETED_STORAGE:
+            header = await collection.find_one(match, SUMMARY_PROJECTION)
+            if header is None:
+                return None, 0, []
+            if header.get("storage") != BUCKETED_STORAGE and await self._migrate_thread(user_id, thread_id):
+                header = await collection.find_one(match, SUMMARY_PROJECTION)
+            summarized_count = header.get("summarized_count", 0)
+            cursor = await buckets.aggregate(self.memory._unsummarized_bucket_pipeline(match, summarized_count))
+            docs = await cursor.to_list(None)
+            _record_read(docs)
+            return header.get("summary"), summarized_count, [Message.from_dict(msg_data) for msg_data in docs]
+
+        cursor = await collection.aggregate(self.memory._unsummarized_pipeline(match))
+        docs = await cursor.to_list(None)
+        if not docs:
+            return None, 0, []
+        doc = docs[0]
+        _record_read(doc["messages"])
+        return doc.get("summary"), doc["summarized_count"], [Message.from_dict(msg_data) for msg_data in doc["messages"]]
+
+    @tracing.traced("memory.get_thread_state")
+    async def get_thread_state(self, user_id: str, thread_id: str,
+                               limit: Optional[int] = None) -> Tuple[Optional[str], int, int, List[Message]]:
+        """Return the rolling summary, how many messages it covers, the thread length and its last ``limit`` messages."""
+        collection, _ = self._collections()
+        match = {"user_id": user_id, "thread_id": thread_id}
+        if self.memory.storage_mode == BUCKETED_STORAGE:
+            header = await collection.find_one(match, THREAD_STATE_PROJECTION)
+            if header is None:
+                return None, 0, 0, []
+            if header.get("storage") != BUCKETED_STORAGE and await self._migrate_thread(user_id, thread_id):
+                header = await collection.find_one(match, THREAD_STATE_PROJECTION)
+            messages = await self._read_messages(user_id, thread_id, limit, True)
+            return header.get("summary"), header.get("summarized_count", 0), header.get("message_count", 0), messages
+
+        cursor = await collection.aggregate(self.memory._thread_state_pipeline(match, limit))
+        docs = await cursor.to_list(None)
+        if not docs:
+            return None, 0, 0, []
+        doc = docs[0]
+        _record_read(doc["messages"])
+        messages = [Message.from_dict(msg_data) for msg_data in doc["messages"]]
+        return doc.get("summary"), doc["summarized_count"], doc["total"], messages
+
+    @tracing.traced("memory.update_summary")
+    async def update_summary(self, user_id: str, thread_id: str, summary: str, summarized_count: int) -> bool:
+        """Store a rolling summary unless a newer one is already stored."""
+        collection, _ = self._collections()
+        try:
+            query, update = self.memory._summary_update(user_id, thread_id, summary, summarized_count)
+            result = await collection.update_one(query, update)
+            return result.modified_count > 0
+        except Exception as e:
+            print(f"Error updating summary: {e}")
+            return False
+
+    @tracing.traced("memory.list_conversations")
+    async def list_conversations(self, user_id: str, limit: int = 20,
+                                 cursor: Optional[str] = None) -> Tuple[List[ConversationHeader], Optional[str]]:
+        """List a user's conversation headers, most recently updated first; returns (page, next cursor)."""
+        collection, _ = self._collections()
+        docs = await (
+            collection.find(self.memory._list_query(user_id, cursor), HEADER_LIST_PROJECTION)
+            .sort(LIST_SORT)
+            .limit(limit + 1)
+            .to_list(None)
+        )
+        return self.memory._list_page(docs, limit)
@@ -0,0 +1,282 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure, PyMongoError
+from utils import tracing
+from .mongodb_memories import Message, MongoDBMemory, WRITER_ID
+
+ThreadKey = Tuple[str, str]
+T = TypeVar("T")
+
+# Rough per-message overhead on top of the content, for the byte limit
+MESSAGE_OVERHEAD_BYTES = 200
+
+_registry_lock = threading.Lock()
+_caches: Dict[Tuple[Any, ...], "ConversationCache"] = {}
+
+
+def _message_bytes(message: Message) -> int:
+    return len(message.content) + MESSAGE_OVERHEAD_BYTES
+
+
+def _copies(messages: List[Message]) -> List[Message]:
+    return [message.copy() for message in messages]
+
+
+@dataclass
+class CachedThread:
+    """What the cache knows about one thread: its summary fields and newest messages.
+
+    ``messages`` is a suffix of the thread; ``total`` is the thread length,
+    so the suffix starts at index ``total - len(messages)``. Views return
+    copies of the messages, so callers cannot change what other sessions read.
+    """
+    messages: List[Message]
+    total: int
+    summary: Optional[str] = None
+    summarized_count: int = 0
+    size: int = field(default=0, compare=False)
+
+    @property
+    def start(self) -> int:
+        return self.total - len(self.messages)
+
+    def last(self, limit: Optional[int] = None) -> List[Message]:
+        """Last ``limit`` cached messages (all of them without a limit)."""
+        return _copies(self.messages[-limit:] if limit else self.messages)
+
+    def recent(self, limit: Optional[int] = None) -> Optional[List[Message]]:
+        """Last ``limit`` messages of the thread, or None if the cached suffix is too short."""
+        if (limit and len(self.messages) >= limit) or self.start == 0:
+            return self.last(limit)
+        return None
+
+    def by_role(self, role: str, limit: Optional[int] = None) -> Optional[List[Message]]:
+        """Last ``limit`` messages with ``role``, or None unless the whole thread is cached."""
+        if self.start != 0:
+            return None
+        messages = [message for message in self.messages if message.role == role]
+        return _copies(messages[-limit:] if limit else messages)
+
+    def unsummarized(self) -> Optional[Tuple[Optional[str], int, List[Message]]]:
+        """(summary, summarized_count, messages after those), or None if they are not all cached."""
+        if self.start > self.summarized_count:
+            return None
+        return self.summary, self.summarized_count, _copies(self.messages[self.summarized_count - self.start:])
+
+
+class ConversationCache:
+    """LRU cache of recent thread state, bounded by entry count and approximate bytes.
+
+    Filled from one ``get_thread_state`` read and kept current by write-through
+    from the MemoryManager, so the several history reads of a turn (the
+    workflow's window, the router's context, the summarizer's tail) are served
+    from memory. A fill started before a concurrent write to the same thread
+    is discarded rather than stored, so a stale read never overwrites a fresher
+    entry. ``watch`` adds cross-process invalidation through a change stream.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 max_messages: int = 200, fill_window: int = 50):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.fill_window = fill_window
+        self._entries: "OrderedDict[ThreadKey, CachedThread]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Threads with a fill in progress -> [fills running, write generation of the last write]
+        self._filling: Dict[ThreadKey, List[int]] = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._watcher: Optional[threading.Thread] = None
+
+    def read(self, key: ThreadKey, view: Callable[[CachedThread], Optional[T]]) -> Optional[T]:
+        """Apply ``view`` to the thread's entry; None on a miss or if the entry cannot answer."""
+        with self._lock:
+            entry = self._entries.get(key)
+            result = view(entry) if entry is not None else None
+            if result is None:
+                self._misses += 1
+                tracing.add("cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            tracing.add("cache_hits")
+            return result
+
+    def fill_limit(self, limit: Optional[int]) -> Optional[int]:
+        """How many messages a miss should load: at least the fill window, all of them for unlimited reads."""
+        return None if limit is None else max(limit, self.fill_window)
+
+    def begin_fill(self, key: ThreadKey) -> int:
+        """Start loading a thread from MongoDB; pass the returned token to end_fill."""
+        with self._lock:
+            self._generation += 1
+            state = self._filling.setdefault(key, [0, 0])
+            state[0] += 1
+            return self._generation
+
+    def end_fill(self, key: ThreadKey, token: int, entry: Optional[CachedThread]) -> None:
+        """Store a loaded entry unless the thread was written to since begin_fill."""
+        with self._lock:
+            state = self._filling[key]
+            stale = state[1] > token
+            state[0] -= 1
+            if not state[0]:
+                del self._filling[key]
+            if entry is None or stale:
+                return
+            # The caller keeps using ``entry``; the cache holds its own copies
+            self._store(key, CachedThread(_copies(entry.messages[-self.max_messages:]), entry.total, entry.summary, entry.summarized_count))
+
+    def append(self, key: ThreadKey, message: Message) -> None:
+        """Write-through for a saved message."""
+        with self._lock:
+            self._mark_written(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.messages.append(message.copy())
+            entry.total += 1
+            entry.size += _message_bytes(message)
+            self._bytes += _message_bytes(message)
+            self._trim(entry)
+            self._evict()
+
+    def set_summary(self, key: ThreadKey, summary: str, summarized_count: int) -> None:
+        """Write-through for a stored rolling summary."""
+        with self._lock:
+            self._mark_written(key)
+            entry = self._entries.get(key)
+            if entry is not None and summarized_count > entry.summarized_count:
+                entry.summary = summary
+                entry.summarized_count = summarized_count
+
+    def invalidate(self, key: ThreadKey) -> None:
+        with self._lock:
+            self._mark_written(key)
+            self._drop(key)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                self._drop(key)
+            for key in self._filling:
+                if key[0] == user_id:
+                    self._mark_written(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for key in self._filling:
+                self._mark_written(key)
+
+    def grow(self, max_entries: int, max_bytes: int) -> None:
+        """Raise the limits to at least ``max_entries`` and ``max_bytes``; they are never lowered."""
+        with self._lock:
+            self.max_entries = max(self.max_entries, max_entries)
+            self.max_bytes = max(self.max_bytes, max_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self._hits, "misses": self._misses}
+
+    def _mark_written(self, key: ThreadKey) -> None:
+        state = self._filling.get(key)
+        if state is not None:
+            self._generation += 1
+            state[1] = self._generation
+
+    def _store(self, key: ThreadKey, entry: CachedThread) -> None:
+        self._drop(key)
+        del entry.messages[:max(0, len(entry.messages) - self.max_messages)]
+        entry.size = sum(_message_bytes(message) for message in entry.messages)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def _trim(self, entry: CachedThread) -> None:
+        """Keep at most ``max_messages`` of the newest messages."""
+        excess = len(entry.messages) - self.max_messages
+        if excess > 0:
+            removed = sum(_message_bytes(message) for message in entry.messages[:excess])
+            del entry.messages[:excess]
+            entry.size -= removed
+            self._bytes -= removed
+
+    def _drop(self, key: ThreadKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+
+    def watch(self, collection: Collection, retry_delay: float = 5.0) -> None:
+        """Invalidate entries changed by other processes, using a change stream on ``collection``.
+
+        Change streams need a replica set or sharded cluster; on a standalone
+        server a warning is printed and the cache stays process-local.
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(
+                target=self._watch, args=(collection, retry_delay), name="conversation-cache-watch", daemon=True
+            )
+        self._watcher.start()
+
+    def _watch(self, collection: Collection, retry_delay: float) -> None:
+        pipeline = [
+            {"$match": {"$or": [
+                {"operationType": {"$nin": ["insert", "update", "replace"]}},
+                {"fullDocument.writer_id": {"$ne": WRITER_ID}}
+            ]}},
+            {"$project": {"operationType": 1, "fullDocument.user_id": 1, "fullDocument.thread_id": 1}}
+        ]
+        while True:
+            try:
+                with collection.watch(pipeline, full_document="updateLookup") as stream:
+                    for change in stream:
+                        document = change.get("fullDocument") or {}
+                        if "user_id" in document and "thread_id" in document:
+                            self.invalidate((document["user_id"], document["thread_id"]))
+                        else:
+                            # Deletes only carry the _id; drop everything rather than serve stale history
+                            self.clear()
+            except OperationFailure as e:
+                print(f"Warning: conversation cache change stream unavailable, invalidation is process-local: {e}")
+                return
+            except PyMongoError as e:
+                print(f"Warning: conversation cache change stream interrupted, retrying: {e}")
+                # Changes may have been missed while disconnected
+                self.clear()
+                time.sleep(retry_delay)
+
+
+def get_conversation_cache(memory: MongoDBMemory, max_entries: int = 1000,
+                           max_bytes: int = 64 * 1024 * 1024) -> ConversationCache:
+    """Return the process-wide cache for the memory's collections.
+
+    Every manager of the same collections shares one cache, so a write through
+    one is seen by the reads of the others. When they ask for different limits
+    the cache keeps the largest.
+    """
+    key = (memory.connection_string, memory.database_name, memory.collection_name, memory.storage_mode)
+    cache = _caches.get(key)
+    if cache is None:
+        with _registry_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = ConversationCache(max_entries, max_bytes)
+                _caches[key] = cache
+    cache.grow(max_entries, max_bytes)
+    return cache
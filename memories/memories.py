@@ -1,43 +1,316 @@
+import asyncio
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from .mongodb_memories import MongoDBMemory, Message, Conversation
+from typing import List, Optional, Dict, Any, Tuple
+from .mongodb_memories import (
+    MongoDBMemory, Message, Conversation, ConversationHeader, ContentCodec, DEFAULT_CODEC, EMBEDDED_STORAGE,
+    lean_messages
+)
+from .async_mongodb_memories import AsyncMongoDBMemory
+from .conversation_cache import CachedThread, ConversationCache, get_conversation_cache
+from .write_behind import DEFAULT_WRITE_BEHIND, WriteBehindQueue, find_write_behind_queue, get_write_behind_queue
+
+
+def _merge_pending(stored: List[Message], pending: List[Message], limit: Optional[int] = None,
+                   include_metadata: bool = True, role: Optional[str] = None) -> List[Message]:
+    """Stored messages followed by queued ones, filtered and trimmed like the stored read."""
+    if role:
+        pending = [message for message in pending if message.role == role]
+    if not include_metadata:
+        pending = lean_messages(pending)
+    messages = stored + pending
+    return messages[-limit:] if limit else messages
 
 
 class MemoryManager:
-    def __init__(self, connection_string: str = "mongodb://localhost:27017/"):
-        self.db = MongoDBMemory(connection_string)
+    def __init__(self, connection_string: str = "mongodb://localhost:27017/",
+                 storage_mode: str = EMBEDDED_STORAGE, bucket_size: int = 100,
+                 max_pool_size: Optional[int] = None, min_pool_size: Optional[int] = None,
+                 auto_setup: bool = True, write_behind: bool = DEFAULT_WRITE_BEHIND, cache_size: int = 1000,
+                 cache_bytes: int = 64 * 1024 * 1024, watch_changes: bool = False,
+                 codec: Optional[ContentCodec] = DEFAULT_CODEC, flush_timeout: float = 10.0):
+        self.db = MongoDBMemory(
+            connection_string,
+            storage_mode=storage_mode,
+            bucket_size=bucket_size,
+            max_pool_size=max_pool_size,
+            min_pool_size=min_pool_size,
+            auto_setup=auto_setup,
+            codec=codec
+        )
+        # Async twin sharing the same layout, for the asyncio workflow path
+        self.async_db = AsyncMongoDBMemory(self.db)
+        # Optional: message saves are queued and persisted in batches off the request path
+        self.write_queue: Optional[WriteBehindQueue] = get_write_behind_queue(self.db) if write_behind else None
+        # Longest a read or summary update waits for queued messages to be written
+        self.flush_timeout = flush_timeout
+        # Recent thread state shared by the reads of a turn; cache_size=0 disables it
+        self.cache: Optional[ConversationCache] = (
+            get_conversation_cache(self.db, cache_size, cache_bytes) if cache_size > 0 else None
+        )
+        if self.cache is not None and watch_changes:
+            self.cache.watch(self.db.collection)
+
+    def setup_database(self) -> None:
+        """Create indexes and clean up legacy documents (admin operation)."""
+        self.db.setup_database()
 
     def save_message(self, user_id: str, thread_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Add a message to the conversation."""
-        return self.db.add_message(user_id, thread_id, role, content, metadata)
+        """Add a message to the conversation.
+
+        With write-behind enabled the message is only queued and "" is
+        returned, since the conversation id is assigned when it is flushed.
+        """
+        if self.write_queue is not None:
+            message = self.write_queue.enqueue(user_id, thread_id, role, content, metadata)
+            self._cache_append(user_id, thread_id, message)
+            return ""
+        # Another manager may still have messages of this thread queued; keep the order
+        self.flush(user_id, thread_id)
+        message = Message(role=role, content=content, timestamp=datetime.now(), metadata=metadata)
+        conversation_id = self.db.append_message(user_id, thread_id, message)
+        self._cache_append(user_id, thread_id, message)
+        return conversation_id
+
+    def _pending_queue(self) -> Optional[WriteBehindQueue]:
+        """This manager's queue, or the one another manager of the same collections queues saves in."""
+        return self.write_queue or find_write_behind_queue(self.db)
+
+    def _cache_append(self, user_id: str, thread_id: str, message: Message) -> None:
+        if self.cache is not None:
+            self.cache.append((user_id, thread_id), message)
+
+    def flush(self, user_id: Optional[str] = None, thread_id: Optional[str] = None) -> None:
+        """Persist queued messages of one thread (or all of them) before returning.
+
+        Raises TimeoutError if they are not written within ``flush_timeout``
+        seconds, e.g. while MongoDB is unreachable.
+        """
+        queue = self._pending_queue()
+        if queue is None:
+            return
+        key = (user_id, thread_id) if user_id and thread_id else None
+        if not queue.flush(key, self.flush_timeout):
+            raise TimeoutError(f"Queued messages were not persisted within {self.flush_timeout}s")
+
+    def _read_with_pending(self, user_id: str, thread_id: str, read):
+        """Run a stored read while the thread is pinned; returns (result, queued messages)."""
+        queue = self._pending_queue()
+        if queue is None:
+            return read(), []
+        key = (user_id, thread_id)
+        queue.begin_read(key)
+        try:
+            return read(), queue.pending(key)
+        finally:
+            queue.end_read(key)
+
+    async def _aread_with_pending(self, user_id: str, thread_id: str, read):
+        """Async variant of _read_with_pending; only waits in a worker thread if a flush is in flight."""
+        queue = self._pending_queue()
+        if queue is None:
+            return await read(), []
+        key = (user_id, thread_id)
+        if not queue.begin_read(key, block=False):
+            await asyncio.to_thread(queue.begin_read, key)
+        try:
+            return await read(), queue.pending(key)
+        finally:
+            queue.end_read(key)
+
+    def _load_thread(self, user_id: str, thread_id: str, limit: Optional[int]) -> CachedThread:
+        """Read a thread's state (plus queued messages) with one query and offer it to the cache."""
+        key = (user_id, thread_id)
+        entry = None
+        token = self.cache.begin_fill(key)
+        try:
+            (summary, summarized_count, total, stored), pending = self._read_with_pending(
+                user_id, thread_id, lambda: self.db.get_thread_state(user_id, thread_id, self.cache.fill_limit(limit))
+            )
+            entry = CachedThread(stored + pending, total + len(pending), summary, summarized_count)
+            return entry
+        finally:
+            self.cache.end_fill(key, token, entry)
+
+    async def _aload_thread(self, user_id: str, thread_id: str, limit: Optional[int]) -> CachedThread:
+        """Async variant of _load_thread."""
+        key = (user_id, thread_id)
+        entry = None
+        token = self.cache.begin_fill(key)
+        try:
+            (summary, summarized_count, total, stored), pending = await self._aread_with_pending(
+                user_id, thread_id,
+                lambda: self.async_db.get_thread_state(user_id, thread_id, self.cache.fill_limit(limit))
+            )
+            entry = CachedThread(stored + pending, total + len(pending), summary, summarized_count)
+            return entry
+        finally:
+            self.cache.end_fill(key, token, entry)
+
+    def get_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None,
+                                  include_metadata: bool = True) -> List[Message]:
+        """Get the last ``limit`` messages from a specific conversation, including queued ones."""
+        if self.cache is None:
+            stored, pending = self._read_with_pending(
+                user_id, thread_id,
+                lambda: self.db.get_conversation_messages(user_id, thread_id, limit, include_metadata)
+            )
+            return _merge_pending(stored, pending, limit, include_metadata)
+
+        messages = self.cache.read((user_id, thread_id), lambda entry: entry.recent(limit))
+        if messages is None:
+            messages = self._load_thread(user_id, thread_id, limit).last(limit)
+        return messages if include_metadata else lean_messages(messages)
 
-    def get_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None) -> List[Message]:
-        """Get messages from a specific conversation."""
-        return self.db.get_conversation_messages(user_id, thread_id, limit)
+    def get_unsummarized_messages(self, user_id: str, thread_id: str) -> Tuple[Optional[str], int, List[Message]]:
+        """Get the rolling summary, the number of messages it covers, and the messages after those."""
+        if self.cache is not None:
+            cached = self.cache.read((user_id, thread_id), CachedThread.unsummarized)
+            if cached is None:
+                cached = self._load_thread(user_id, thread_id, self.cache.fill_window).unsummarized()
+            if cached is not None:
+                summary, summarized_count, messages = cached
+                return summary, summarized_count, lean_messages(messages)
+
+        # Tail longer than the cache loads, or no cache
+        (summary, summarized_count, stored), pending = self._read_with_pending(
+            user_id, thread_id, lambda: self.db.get_unsummarized_messages(user_id, thread_id)
+        )
+        return summary, summarized_count, stored + lean_messages(pending)
+
+    def update_summary(self, user_id: str, thread_id: str, summary: str, summarized_count: int) -> bool:
+        """Store a rolling summary covering the first ``summarized_count`` messages."""
+        # The summary may cover messages that are still queued
+        self.flush(user_id, thread_id)
+        updated = self.db.update_summary(user_id, thread_id, summary, summarized_count)
+        if updated and self.cache is not None:
+            self.cache.set_summary((user_id, thread_id), summary, summarized_count)
+        return updated
+
+    async def asave_message(self, user_id: str, thread_id: str, role: str, content: str,
+                            metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Async variant of save_message."""
+        if self.write_queue is not None:
+            message = self.write_queue.enqueue(user_id, thread_id, role, content, metadata)
+            self._cache_append(user_id, thread_id, message)
+            return ""
+        await self.aflush(user_id, thread_id)
+        message = Message(role=role, content=content, timestamp=datetime.now(), metadata=metadata)
+        conversation_id = await self.async_db.append_message(user_id, thread_id, message)
+        self._cache_append(user_id, thread_id, message)
+        return conversation_id
+
+    async def aflush(self, user_id: Optional[str] = None, thread_id: Optional[str] = None) -> None:
+        """Async variant of flush."""
+        if self._pending_queue() is not None:
+            await asyncio.to_thread(self.flush, user_id, thread_id)
+
+    async def aget_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None,
+                                         include_metadata: bool = True) -> List[Message]:
+        """Async variant of get_conversation_messages."""
+        if self.cache is None:
+            stored, pending = await self._aread_with_pending(
+                user_id, thread_id,
+                lambda: self.async_db.get_conversation_messages(user_id, thread_id, limit, include_metadata)
+            )
+            return _merge_pending(stored, pending, limit, include_metadata)
+
+        messages = self.cache.read((user_id, thread_id), lambda entry: entry.recent(limit))
+        if messages is None:
+            messages = (await self._aload_thread(user_id, thread_id, limit)).last(limit)
+        return messages if include_metadata else lean_messages(messages)
+
+    async def aget_unsummarized_messages(self, user_id: str,
+                                         thread_id: str) -> Tuple[Optional[str], int, List[Message]]:
+        """Async variant of get_unsummarized_messages."""
+        if self.cache is not None:
+            cached = self.cache.read((user_id, thread_id), CachedThread.unsummarized)
+            if cached is None:
+                cached = (await self._aload_thread(user_id, thread_id, self.cache.fill_window)).unsummarized()
+            if cached is not None:
+                summary, summarized_count, messages = cached
+                return summary, summarized_count, lean_messages(messages)
+
+        (summary, summarized_count, stored), pending = await self._aread_with_pending(
+            user_id, thread_id, lambda: self.async_db.get_unsummarized_messages(user_id, thread_id)
+        )
+        return summary, summarized_count, stored + lean_messages(pending)
+
+    async def aupdate_summary(self, user_id: str, thread_id: str, summary: str, summarized_count: int) -> bool:
+        """Async variant of update_summary."""
+        await self.aflush(user_id, thread_id)
+        updated = await self.async_db.update_summary(user_id, thread_id, summary, summarized_count)
+        if updated and self.cache is not None:
+            self.cache.set_summary((user_id, thread_id), summary, summarized_count)
+        return updated
+
+    def get_message_page(self, user_id: str, thread_id: str,
+                         before_bucket: Optional[int] = None) -> Tuple[List[Message], Optional[int]]:
+        """Page backwards through a bucketed conversation; returns (messages, next cursor)."""
+        self.flush(user_id, thread_id)
+        return self.db.get_message_page(user_id, thread_id, before_bucket)
 
     def get_conversation(self, user_id: str, thread_id: str) -> Optional[Conversation]:
         """Get the full conversation object."""
+        self.flush(user_id, thread_id)
         return self.db.get_conversation(user_id, thread_id)
 
     def get_user_conversations(self, user_id: str, limit: int = 10) -> List[Conversation]:
         """Get all conversations for a user."""
+        self.flush()
         return self.db.get_user_conversations(user_id, limit)
 
+    def list_conversations(self, user_id: str, limit: int = 20,
+                           cursor: Optional[str] = None) -> Tuple[List[ConversationHeader], Optional[str]]:
+        """List a user's conversation headers (no messages), newest first; returns (page, next cursor)."""
+        self.flush()
+        return self.db.list_conversations(user_id, limit, cursor)
+
+    async def alist_conversations(self, user_id: str, limit: int = 20,
+                                  cursor: Optional[str] = None) -> Tuple[List[ConversationHeader], Optional[str]]:
+        """Async variant of list_conversations."""
+        await self.aflush()
+        return await self.async_db.list_conversations(user_id, limit, cursor)
+
     def delete_conversation(self, user_id: str, thread_id: str) -> bool:
-        """Delete a specific conversation."""
-        return self.db.delete_conversation(user_id, thread_id)
+        """Delete a specific conversation, dropping any of its queued messages."""
+        key = (user_id, thread_id)
+        queue = self._pending_queue()
+        if queue is None:
+            deleted = self.db.delete_conversation(user_id, thread_id)
+        else:
+            queue.begin_read(key)
+            try:
+                queue.discard(key)
+                deleted = self.db.delete_conversation(user_id, thread_id)
+            finally:
+                queue.end_read(key)
+        if self.cache is not None:
+            self.cache.invalidate(key)
+        return deleted
 
     def clear_user_conversations(self, user_id: str) -> bool:
         """Clear all conversations for a user."""
-        return self.db.clear_user_conversations(user_id)
+        self.flush()
+        cleared = self.db.clear_user_conversations(user_id)
+        if self.cache is not None:
+            self.cache.invalidate_user(user_id)
+        return cleared
 
     def clear_all_conversations(self) -> bool:
         """Clear all conversations from the database."""
-        return self.db.clear_all_conversations()
+        self.flush()
+        cleared = self.db.clear_all_conversations()
+        if self.cache is not None:
+            self.cache.clear()
+        return cleared
 
     def migrate_legacy_data(self) -> bool:
         """Migrate legacy data to new conversation format."""
-        return self.db.migrate_legacy_data()
+        self.flush()
+        migrated = self.db.migrate_legacy_data()
+        if self.cache is not None:
+            self.cache.clear()
+        return migrated
 
     # Backward compatibility methods
     def save_memory(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
@@ -56,12 +329,22 @@ class MemoryManager:
         return self.get_conversation_messages(user_id, thread_id, limit)
 
     def get_messages_by_role(self, user_id: str, thread_id: str, role: str, limit: Optional[int] = None) -> List[Message]:
-        """Get messages by role from a conversation."""
-        messages = self.get_conversation_messages(user_id, thread_id)
-        filtered_messages = [msg for msg in messages if msg.role == role]
-        if limit:
-            return filtered_messages[-limit:]
-        return filtered_messages
+        """Get messages by role from a conversation, including queued ones."""
+        if self.cache is not None:
+            messages = self.cache.read((user_id, thread_id), lambda entry: entry.by_role(role, limit))
+            if messages is not None:
+                return messages
+        stored, pending = self._read_with_pending(
+            user_id, thread_id, lambda: self.db.get_messages_by_role(user_id, thread_id, role, limit)
+        )
+        return _merge_pending(stored, pending, limit, role=role)
+
+    def get_messages_by_role_bulk(self, role: str, user_id: Optional[str] = None,
+                                  thread_ids: Optional[List[str]] = None,
+                                  limit: Optional[int] = None) -> Dict[Tuple[str, str], List[Message]]:
+        """Get messages by role across many conversations, keyed by (user_id, thread_id)."""
+        self.flush()
+        return self.db.get_messages_by_role_bulk(role, user_id, thread_ids, limit)
 
     def get_user_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None) -> List[Message]:
         """Get all user messages from a conversation."""
@@ -0,0 +1,330 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from bson import Binary
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple,
+    SerializerProtocol, get_checkpoint_id, get_checkpoint_metadata
+)
+from .mongodb_client import get_async_mongo_client, get_mongo_client, run_once
+from utils import tracing
+
+# Pending writes are returned in the order the graph applied them
+WRITES_SORT = [("task_path", ASCENDING), ("task_id", ASCENDING), ("idx", ASCENDING)]
+
+
+class MongoDBCheckpointer(BaseCheckpointSaver):
+    """LangGraph checkpointer storing each step's state deltas in MongoDB.
+
+    Pass it to ``StateGraph.compile(checkpointer=...)`` (or to
+    ``LangGraphWorkflow(checkpointer=...)``). Three collections share the
+    ``collection_name`` prefix:
+
+    - ``checkpoints``: one small document per checkpoint holding the channel
+      versions, metadata and parent id, but no channel values;
+    - ``checkpoints_blobs``: one document per (channel, version), written only
+      for the channels a step changed, so unchanged state is never rewritten;
+    - ``checkpoints_writes``: the pending writes of interrupted steps.
+
+    Threads are keyed by ``configurable.user_id`` and ``thread_id``, so two
+    users' threads never collide even when their thread ids do.
+    """
+
+    def __init__(self, connection_string: str = "mongodb://localhost:27017/",
+                 database_name: str = "memories", collection_name: str = "checkpoints",
+                 max_pool_size: Optional[int] = None, min_pool_size: Optional[int] = None,
+                 auto_setup: bool = True, serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=serde)
+        self.client = get_mongo_client(connection_string, max_pool_size, min_pool_size)
+        self.db = self.client[database_name]
+        self.checkpoints = self.db[collection_name]
+        self.blobs = self.db[f"{collection_name}_blobs"]
+        self.writes = self.db[f"{collection_name}_writes"]
+        # Kept so the async methods can open the same collections on the running loop
+        self.connection_string = connection_string
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+
+        if auto_setup:
+            run_once((connection_string, database_name, collection_name, "checkpoints"), self._create_indexes)
+
+    def setup_database(self) -> None:
+        """Create indexes unconditionally."""
+        self._create_indexes()
+
+    def _create_indexes(self) -> None:
+        thread = [("user_id", 1), ("thread_id", 1), ("checkpoint_ns", 1)]
+        indexes = [
+            # Unique per checkpoint; the latest is the highest id, since checkpoint ids sort by time
+            (self.checkpoints, thread + [("checkpoint_id", -1)]),
+            (self.blobs, thread + [("channel", 1), ("version", 1)]),
+            (self.writes, thread + [("checkpoint_id", 1), ("task_id", 1), ("idx", 1)]),
+        ]
+        for collection, keys in indexes:
+            try:
+                collection.create_index(keys, unique=True)
+            except Exception as e:
+                print(f"Warning: Could not create index {keys} on {collection.name}: {e}")
+
+    def _async_collections(self):
+        client = get_async_mongo_client(self.connection_string, self.max_pool_size, self.min_pool_size)
+        db = client[self.database_name]
+        return (db[self.collection_name], db[f"{self.collection_name}_blobs"],
+                db[f"{self.collection_name}_writes"])
+
+    # Queries and documents, shared by the sync and async methods
+
+    @staticmethod
+    def _thread(config: RunnableConfig) -> Dict[str, str]:
+        configurable = config["configurable"]
+        return {
+            "user_id": str(configurable.get("user_id", "")),
+            "thread_id": str(configurable["thread_id"]),
+            "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+        }
+
+    @staticmethod
+    def _config(thread: Dict[str, str], checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {**thread, "checkpoint_id": checkpoint_id}}
+
+    @staticmethod
+    def _checkpoint_query(config: RunnableConfig, thread: Dict[str, str]) -> Dict[str, Any]:
+        checkpoint_id = get_checkpoint_id(config)
+        return {**thread, "checkpoint_id": checkpoint_id} if checkpoint_id else thread
+
+    @staticmethod
+    def _blob_query(thread: Dict[str, str], versions: ChannelVersions) -> Dict[str, Any]:
+        return {**thread, "$or": [{"channel": channel, "version": str(version)}
+                                  for channel, version in versions.items()]}
+
+    def _dump(self, value: Any) -> Tuple[str, Binary]:
+        type_, data = self.serde.dumps_typed(value)
+        return type_, Binary(data)
+
+    def _put_docs(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                  new_versions: ChannelVersions) -> Tuple[Dict[str, str], List[UpdateOne], Dict[str, Any], int]:
+        """Blob upserts for the changed channels and the checkpoint document; returns their byte size too."""
+        thread = self._thread(config)
+        values = checkpoint["channel_values"]
+        blob_ops = []
+        size = 0
+        for channel, version in new_versions.items():
+            # Channels without a value (triggers, branches) only need their version, kept on the checkpoint
+            if channel not in values:
+                continue
+            type_, data = self._dump(values[channel])
+            size += len(data)
+            blob_ops.append(UpdateOne(
+                {**thread, "channel": channel, "version": str(version)},
+                {"$setOnInsert": {"type": type_, "value": data}},
+                upsert=True
+            ))
+        type_, data = self._dump({key: value for key, value in checkpoint.items() if key != "channel_values"})
+        metadata_type, metadata_data = self._dump(get_checkpoint_metadata(config, metadata))
+        size += len(data) + len(metadata_data)
+        doc = {
+            **thread,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": data,
+            "metadata_type": metadata_type,
+            "metadata": metadata_data,
+        }
+        return thread, blob_ops, doc, size
+
+    def _write_ops(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str) -> Tuple[List[UpdateOne], int]:
+        thread = self._thread(config)
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        ops = []
+        size = 0
+        for index, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, index)
+            type_, data = self._dump(value)
+            size += len(data)
+            fields = {"channel": channel, "type": type_, "value": data, "task_path": task_path}
+            # Errors and interrupts replace earlier ones; a task's regular writes are stored once
+            ops.append(UpdateOne(
+                {**thread, "checkpoint_id": checkpoint_id, "task_id": task_id, "idx": idx},
+                {"$set" if idx < 0 else "$setOnInsert": fields},
+                upsert=True
+            ))
+        return ops, size
+
+    def _load(self, type_: str, data: Any) -> Any:
+        # msgpack only accepts exact bytes, not the Binary subclass some drivers return
+        return self.serde.loads_typed((type_, bytes(data)))
+
+    def _load_checkpoint(self, doc: Dict[str, Any]) -> Checkpoint:
+        return self._load(doc["type"], doc["checkpoint"])
+
+    def _tuple(self, doc: Dict[str, Any], checkpoint: Checkpoint, blob_docs: List[Dict[str, Any]],
+               write_docs: List[Dict[str, Any]]) -> CheckpointTuple:
+        thread = {key: doc[key] for key in ("user_id", "thread_id", "checkpoint_ns")}
+        if tracing.enabled():
+            tracing.add("bytes_read", len(doc["checkpoint"]) + sum(len(blob["value"]) for blob in blob_docs)
+                        + sum(len(write["value"]) for write in write_docs))
+        parent_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config=self._config(thread, doc["checkpoint_id"]),
+            checkpoint={
+                **checkpoint,
+                "channel_values": {blob["channel"]: self._load(blob["type"], blob["value"])
+                                   for blob in blob_docs},
+            },
+            metadata=self._load(doc["metadata_type"], doc["metadata"]),
+            parent_config=self._config(thread, parent_id) if parent_id else None,
+            pending_writes=[
+                (write["task_id"], write["channel"], self._load(write["type"], write["value"]))
+                for write in write_docs
+            ],
+        )
+
+    def _list_query(self, config: Optional[RunnableConfig],
+                    before: Optional[RunnableConfig]) -> Dict[str, Any]:
+        query: Dict[str, Any] = {}
+        if config is not None:
+            configurable = config["configurable"]
+            query = {"thread_id": str(configurable["thread_id"])}
+            if "user_id" in configurable:
+                query["user_id"] = str(configurable["user_id"])
+            if "checkpoint_ns" in configurable:
+                query["checkpoint_ns"] = configurable["checkpoint_ns"]
+            if get_checkpoint_id(config):
+                query["checkpoint_id"] = get_checkpoint_id(config)
+        if before is not None and get_checkpoint_id(before):
+            query["checkpoint_id"] = {**({"$eq": query["checkpoint_id"]} if "checkpoint_id" in query else {}),
+                                      "$lt": get_checkpoint_id(before)}
+        return query
+
+    @staticmethod
+    def _matches(metadata: CheckpointMetadata, filter: Optional[Dict[str, Any]]) -> bool:
+        return not filter or all(metadata.get(key) == value for key, value in filter.items())
+
+    # Sync API
+
+    @tracing.traced("checkpoint.get_tuple")
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """The checkpoint named by ``config``, or the thread's latest one."""
+        thread = self._thread(config)
+        doc = self.checkpoints.find_one(self._checkpoint_query(config, thread),
+                                        sort=[("checkpoint_id", DESCENDING)])
+        if doc is None:
+            return None
+        return self._read_tuple(doc)
+
+    def _read_tuple(self, doc: Dict[str, Any]) -> CheckpointTuple:
+        thread = {key: doc[key] for key in ("user_id", "thread_id", "checkpoint_ns")}
+        checkpoint = self._load_checkpoint(doc)
+        versions = checkpoint["channel_versions"]
+        blob_docs = list(self.blobs.find(self._blob_query(thread, versions))) if versions else []
+        write_docs = list(self.writes.find({**thread, "checkpoint_id": doc["checkpoint_id"]}).sort(WRITES_SORT))
+        return self._tuple(doc, checkpoint, blob_docs, write_docs)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Checkpoints newest first, optionally filtered by metadata values."""
+        cursor = self.checkpoints.find(self._list_query(config, before)).sort("checkpoint_id", DESCENDING)
+        for doc in cursor:
+            if limit is not None and limit <= 0:
+                break
+            checkpoint_tuple = self._read_tuple(doc)
+            if not self._matches(checkpoint_tuple.metadata, filter):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield checkpoint_tuple
+
+    @tracing.traced("checkpoint.put")
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        """Store a checkpoint and the values of the channels it changed."""
+        thread, blob_ops, doc, size = self._put_docs(config, checkpoint, metadata, new_versions)
+        if blob_ops:
+            self.blobs.bulk_write(blob_ops, ordered=False)
+        self.checkpoints.update_one({**thread, "checkpoint_id": checkpoint["id"]}, {"$set": doc}, upsert=True)
+        tracing.add("bytes_written", size)
+        return self._config(thread, checkpoint["id"])
+
+    @tracing.traced("checkpoint.put_writes")
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        """Store the writes of one task, linked to the checkpoint they will be applied to."""
+        ops, size = self._write_ops(config, writes, task_id, task_path)
+        if ops:
+            self.writes.bulk_write(ops, ordered=False)
+            tracing.add("bytes_written", size)
+
+    def delete_thread(self, thread_id: str, user_id: Optional[str] = None) -> None:
+        """Delete a thread's checkpoints, blobs and writes (for every user unless ``user_id`` is given)."""
+        query = {"thread_id": str(thread_id)}
+        if user_id is not None:
+            query["user_id"] = str(user_id)
+        for collection in (self.checkpoints, self.blobs, self.writes):
+            collection.delete_many(query)
+
+    # Async API, issuing the same queries through PyMongo's async client
+
+    @tracing.traced("checkpoint.get_tuple")
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        checkpoints, _, _ = self._async_collections()
+        thread = self._thread(config)
+        doc = await checkpoints.find_one(self._checkpoint_query(config, thread),
+                                         sort=[("checkpoint_id", DESCENDING)])
+        if doc is None:
+            return None
+        return await self._aread_tuple(doc)
+
+    async def _aread_tuple(self, doc: Dict[str, Any]) -> CheckpointTuple:
+        _, blobs, writes = self._async_collections()
+        thread = {key: doc[key] for key in ("user_id", "thread_id", "checkpoint_ns")}
+        checkpoint = self._load_checkpoint(doc)
+        versions = checkpoint["channel_versions"]
+        blob_docs = await blobs.find(self._blob_query(thread, versions)).to_list() if versions else []
+        write_docs = await writes.find({**thread, "checkpoint_id": doc["checkpoint_id"]}).sort(WRITES_SORT).to_list()
+        return self._tuple(doc, checkpoint, blob_docs, write_docs)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        checkpoints, _, _ = self._async_collections()
+        cursor = checkpoints.find(self._list_query(config, before)).sort("checkpoint_id", DESCENDING)
+        async for doc in cursor:
+            if limit is not None and limit <= 0:
+                break
+            checkpoint_tuple = await self._aread_tuple(doc)
+            if not self._matches(checkpoint_tuple.metadata, filter):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield checkpoint_tuple
+
+    @tracing.traced("checkpoint.put")
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        checkpoints, blobs, _ = self._async_collections()
+        thread, blob_ops, doc, size = self._put_docs(config, checkpoint, metadata, new_versions)
+        if blob_ops:
+            await blobs.bulk_write(blob_ops, ordered=False)
+        await checkpoints.update_one({**thread, "checkpoint_id": checkpoint["id"]}, {"$set": doc}, upsert=True)
+        tracing.add("bytes_written", size)
+        return self._config(thread, checkpoint["id"])
+
+    @tracing.traced("checkpoint.put_writes")
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        _, _, writes_collection = self._async_collections()
+        ops, size = self._write_ops(config, writes, task_id, task_path)
+        if ops:
+            await writes_collection.bulk_write(ops, ordered=False)
+            tracing.add("bytes_written", size)
+
+    async def adelete_thread(self, thread_id: str, user_id: Optional[str] = None) -> None:
+        query = {"thread_id": str(thread_id)}
+        if user_id is not None:
+            query["user_id"] = str(user_id)
+        for collection in self._async_collections():
+            await collection.delete_many(query)
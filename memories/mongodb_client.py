@@ -0,0 +1,90 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+from pymongo import AsyncMongoClient, MongoClient
+from utils.env import load_environment
+
+load_environment()
+
+# Pool sizes applied when a caller does not pass its own
+DEFAULT_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+DEFAULT_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+
+_lock = threading.Lock()
+_setup_lock = threading.Lock()
+_clients: Dict[Tuple[str, int, int], MongoClient] = {}
+_completed_setup: Set[Hashable] = set()
+# Async clients are bound to the event loop they first run on
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, int, int], AsyncMongoClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_mongo_client(connection_string: str = "mongodb://localhost:27017/",
+                     max_pool_size: Optional[int] = None,
+                     min_pool_size: Optional[int] = None) -> MongoClient:
+    """Return the process-wide MongoClient for a connection string and pool configuration.
+
+    MongoClient is thread-safe and owns a connection pool, so every memory
+    instance in the process shares one client instead of opening its own pool.
+    """
+    key = (
+        connection_string,
+        DEFAULT_MAX_POOL_SIZE if max_pool_size is None else max_pool_size,
+        DEFAULT_MIN_POOL_SIZE if min_pool_size is None else min_pool_size
+    )
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(connection_string, maxPoolSize=key[1], minPoolSize=key[2])
+            _clients[key] = client
+        return client
+
+
+def get_async_mongo_client(connection_string: str = "mongodb://localhost:27017/",
+                           max_pool_size: Optional[int] = None,
+                           min_pool_size: Optional[int] = None) -> AsyncMongoClient:
+    """Return the AsyncMongoClient shared by every task on the running event loop."""
+    key = (
+        connection_string,
+        DEFAULT_MAX_POOL_SIZE if max_pool_size is None else max_pool_size,
+        DEFAULT_MIN_POOL_SIZE if min_pool_size is None else min_pool_size
+    )
+    loop_clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = loop_clients.get(key)
+    if client is None:
+        client = AsyncMongoClient(connection_string, maxPoolSize=key[1], minPoolSize=key[2])
+        loop_clients[key] = client
+    return client
+
+
+def run_once(key: Hashable, setup: Callable[[], Any]) -> bool:
+    """Run a setup callback once per process for the given key.
+
+    Returns True if the callback ran on this call. The key is only recorded
+    once the callback returns, so a failed setup is retried on the next call.
+    """
+    if key in _completed_setup:
+        return False
+
+    with _setup_lock:
+        if key in _completed_setup:
+            return False
+        setup()
+        _completed_setup.add(key)
+        return True
+
+
+def close_mongo_clients() -> None:
+    """Close every registered client and forget completed setup (e.g. after fork or in tests)."""
+    with _lock, _setup_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _completed_setup.clear()
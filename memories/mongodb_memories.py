@@ -1,98 +1,541 @@
 import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
+from collections.abc import MutableSequence
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from copy import deepcopy
+from dataclasses import dataclass
 import json
-from bson import ObjectId
-from pymongo import MongoClient, ASCENDING, DESCENDING
+import threading
+import uuid
+import zlib
+from bson import Binary, ObjectId
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne
 from pymongo.collection import Collection
 from pymongo.database import Database
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo.errors import ConnectionFailure, OperationFailure, DuplicateKeyError, BulkWriteError
+from .mongodb_client import get_mongo_client, run_once
+from utils import tracing
 
+try:
+    import zstandard
+except ImportError:  # optional: zlib is always available
+    zstandard = None
 
-@dataclass
+# Storage layouts for conversation messages
+EMBEDDED_STORAGE = "embedded"  # every message in one array on the conversation document
+BUCKETED_STORAGE = "bucketed"  # small header document plus fixed-size message buckets
+
+# Projections returned by upserting appends
+CONVERSATION_ID_PROJECTION = {"_id": 0, "conversation_id": 1}
+HEADER_COUNT_PROJECTION = {"_id": 0, "conversation_id": 1, "message_count": 1}
+SUMMARY_PROJECTION = {"_id": 0, "summary": 1, "summarized_count": 1, "storage": 1}
+# Headers bucketed appends may reserve sequence numbers on; a thread still stored embedded is migrated first
+BUCKETED_HEADER_MATCH = {"$or": [{"storage": BUCKETED_STORAGE}, {"messages": {"$exists": False}}]}
+# Recent sequence-number reservations kept on a bucketed header, so a retried write can reuse its numbers
+RESERVATION_LOG = 32
+RESERVATION_PROJECTION = {"_id": 0, "conversation_id": 1, "message_count": 1, "reservations": 1}
+# Fields kept when metadata is skipped; the cached token count is tiny and saves re-tokenizing
+LEAN_MESSAGE_EXPRESSION = {
+    "role": "$$m.role",
+    "content": "$$m.content",
+    "timestamp": "$$m.timestamp",
+    "metadata": {"token_count": "$$m.metadata.token_count"}
+}
+LEAN_MESSAGE_PROJECTION = {"_id": 0, "role": 1, "content": 1, "timestamp": 1, "metadata.token_count": 1}
+THREAD_STATE_PROJECTION = {"_id": 0, "summary": 1, "summarized_count": 1, "message_count": 1, "storage": 1}
+# Header fields maintained on every write, enough to list conversations without their messages
+HEADER_LIST_PROJECTION = {
+    "_id": 0, "conversation_id": 1, "user_id": 1, "thread_id": 1, "created_at": 1, "updated_at": 1,
+    "message_count": 1, "title": 1, "last_message": 1, "summary": 1
+}
+# Characters of a message kept as a conversation title or last-message preview
+PREVIEW_CHARS = 120
+LIST_SORT = [("updated_at", DESCENDING), ("conversation_id", DESCENDING)]
+
+# BSON binary subtypes (user-defined range) marking compressed message content
+ZLIB_CONTENT_SUBTYPE = 0x80
+ZSTD_CONTENT_SUBTYPE = 0x81
+
+# Stamped on every conversation write so change-stream consumers can skip their own process's writes
+WRITER_ID = uuid.uuid4().hex
+
+def decode_content(value: Any) -> Any:
+    """Message content as text, decompressing values stored by a ContentCodec; plain strings pass through."""
+    if not isinstance(value, Binary):
+        return value
+    if value.subtype == ZLIB_CONTENT_SUBTYPE:
+        return zlib.decompress(value).decode("utf-8")
+    if value.subtype == ZSTD_CONTENT_SUBTYPE:
+        if zstandard is None:
+            raise ValueError("Reading zstd-compressed messages requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(value).decode("utf-8")
+    return value
+
+
+class ContentCodec:
+    """Compresses message content of at least ``threshold`` UTF-8 bytes into BSON binary.
+
+    Long assistant answers (Perplexity itineraries) are markdown that
+    compresses several times over. Readers always decode compressed content
+    in Message.from_dict, so documents written with and without a codec can
+    be mixed freely. Content that does not shrink is stored as text.
+    """
+
+    def __init__(self, threshold: int = 2048, algorithm: str = "zlib", level: Optional[int] = None):
+        if algorithm not in ("zlib", "zstd"):
+            raise ValueError(f"Unknown compression algorithm: {algorithm}")
+        if algorithm == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.level = level if level is not None else (6 if algorithm == "zlib" else 3)
+        # Identifies the configuration in process-wide registries
+        self.key = (algorithm, threshold, self.level)
+        self._lock = threading.Lock()
+        self._messages = 0
+        self._raw_bytes = 0
+        self._stored_bytes = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ContentCodec"]:
+        """Codec configured by MEMORY_COMPRESSION (zlib, zstd or unset) and MEMORY_COMPRESSION_THRESHOLD."""
+        algorithm = os.getenv("MEMORY_COMPRESSION", "").strip().lower()
+        if algorithm in ("", "none", "off"):
+            return None
+        return cls(int(os.getenv("MEMORY_COMPRESSION_THRESHOLD", "2048")), algorithm)
+
+    def encode(self, content: str) -> Any:
+        """Stored form of ``content``: the string itself, or compressed BSON binary."""
+        raw = content.encode("utf-8")
+        if len(raw) < self.threshold:
+            return content
+        if self.algorithm == "zlib":
+            data, subtype = zlib.compress(raw, self.level), ZLIB_CONTENT_SUBTYPE
+        else:
+            data, subtype = zstandard.ZstdCompressor(level=self.level).compress(raw), ZSTD_CONTENT_SUBTYPE
+        if len(data) >= len(raw):
+            return content
+        with self._lock:
+            self._messages += 1
+            self._raw_bytes += len(raw)
+            self._stored_bytes += len(data)
+        return Binary(data, subtype)
+
+    def stats(self) -> Dict[str, float]:
+        """Messages compressed by this process, their size before and after, and the ratio."""
+        with self._lock:
+            return {
+                "compressed_messages": self._messages,
+                "raw_bytes": self._raw_bytes,
+                "stored_bytes": self._stored_bytes,
+                "ratio": self._raw_bytes / self._stored_bytes if self._stored_bytes else 1.0
+            }
+
+
+# Codec used when a MongoDBMemory is not given one explicitly
+DEFAULT_CODEC = ContentCodec.from_env()
+
+
+def _parse_timestamp(value: Any) -> Any:
+    """BSON dates arrive as datetimes already; only legacy ISO strings need parsing."""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True)
 class Message:
     """Represents a single message in a conversation."""
     role: str  # 'user', 'assistant', 'system'
     content: str
     timestamp: datetime
     metadata: Optional[Dict[str, Any]] = None
+    # Set on queued messages, so a retried write can tell whether it already landed
+    id: Optional[str] = None
 
     def to_dict(self) -> dict:
-        """Convert Message object to dictionary."""
-        data = {k: v for k, v in asdict(self).items() if v is not None}
+        """Convert Message object to a dictionary ready for BSON encoding (datetimes stay native)."""
+        data = {"role": self.role, "content": self.content}
+        if self.timestamp is not None:
+            data["timestamp"] = self.timestamp
+        if self.metadata is not None:
+            data["metadata"] = self.metadata
+        if self.id is not None:
+            data["id"] = self.id
         return data
 
+    def copy(self) -> "Message":
+        """Independent copy: changing it, or its metadata, leaves this message untouched."""
+        return Message(self.role, self.content, self.timestamp, deepcopy(self.metadata), self.id)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        """Create Message object from a stored message dictionary."""
+        return cls(
+            data['role'], decode_content(data['content']), _parse_timestamp(data.get('timestamp')), data.get('metadata'),
+            data.get('id')
+        )
+
+
+class LazyMessageList(MutableSequence):
+    """List of messages over stored message documents, decoding each one on first access.
 
-@dataclass
+    Loading a long conversation then only costs the BSON decode: Message
+    objects are built for the items actually read, and items never read are
+    written back as their original documents.
+    """
+    __slots__ = ("_docs", "_messages")
+
+    def __init__(self, docs: Iterable[Dict[str, Any]] = ()):
+        self._docs: List[Optional[Dict[str, Any]]] = list(docs)
+        self._messages: List[Optional[Message]] = [None] * len(self._docs)
+
+    def _decode(self, index: int) -> Message:
+        message = self._messages[index]
+        if message is None:
+            message = self._messages[index] = Message.from_dict(self._docs[index])
+        return message
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._decode(i) for i in range(*index.indices(len(self._messages)))]
+        return self._decode(index)
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            value = list(value)
+            self._docs[index] = [None] * len(value)
+        self._messages[index] = value
+
+    def __delitem__(self, index) -> None:
+        del self._docs[index]
+        del self._messages[index]
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        for index in range(len(self._messages)):
+            yield self._decode(index)
+
+    def insert(self, index: int, value: Message) -> None:
+        self._docs.insert(index, None)
+        self._messages.insert(index, value)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (list, LazyMessageList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        decoded = sum(message is not None for message in self._messages)
+        return f"LazyMessageList({len(self)} messages, {decoded} decoded)"
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Message documents for storage; undecoded items are passed through unchanged."""
+        return [doc if message is None else message.to_dict() for doc, message in zip(self._docs, self._messages)]
+
+
+def lean_messages(messages: List[Message]) -> List[Message]:
+    """Copies of ``messages`` reduced to the fields LEAN_MESSAGE_PROJECTION keeps."""
+    return [
+        Message(message.role, message.content, message.timestamp,
+                {key: value for key, value in (message.metadata or {}).items() if key == "token_count"})
+        for message in messages
+    ]
+
+
+def _record_read(message_docs: Iterable[Dict[str, Any]]) -> None:
+    """Add the stored content size of raw message documents to the current trace span."""
+    if tracing.enabled():
+        tracing.add("bytes_read", sum(len(doc.get("content") or "") for doc in message_docs))
+
+
+def _preview(content: str) -> str:
+    return content[:PREVIEW_CHARS]
+
+
+@dataclass(slots=True)
+class ConversationHeader:
+    """A conversation as listed in a sidebar: header fields only, no messages."""
+    conversation_id: str
+    user_id: str
+    thread_id: str
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    title: Optional[str] = None  # Preview of the first message
+    last_message: Optional[Dict[str, Any]] = None  # Role and preview of the newest message
+    summary: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationHeader":
+        """Create a ConversationHeader from a document projected with HEADER_LIST_PROJECTION."""
+        return cls(
+            conversation_id=data['conversation_id'],
+            user_id=data['user_id'],
+            thread_id=data['thread_id'],
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at'),
+            message_count=data.get('message_count', 0),
+            title=data.get('title'),
+            last_message=data.get('last_message'),
+            summary=data.get('summary')
+        )
+
+
+@dataclass(slots=True)
 class Conversation:
     """Represents a complete conversation with multiple messages."""
     conversation_id: str  # Unique conversation identifier
     user_id: str
     thread_id: str
-    messages: List[Message]
+    messages: List[Message]  # A LazyMessageList when loaded from MongoDB
     created_at: datetime
     updated_at: datetime
     metadata: Optional[Dict[str, Any]] = None
+    summary: Optional[str] = None  # Rolling summary of the oldest messages
+    summarized_count: int = 0  # How many of the oldest messages the summary covers
 
     def to_dict(self) -> dict:
         """Convert Conversation object to dictionary for MongoDB storage."""
-        data = asdict(self)
-        # Convert messages to dict format
-        data['messages'] = [msg.to_dict() for msg in self.messages]
-        return data
+        if isinstance(self.messages, LazyMessageList):
+            messages = self.messages.to_dicts()
+        else:
+            messages = [msg.to_dict() for msg in self.messages]
+        return {
+            "conversation_id": self.conversation_id,
+            "user_id": self.user_id,
+            "thread_id": self.thread_id,
+            "messages": messages,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "metadata": self.metadata,
+            "summary": self.summary,
+            "summarized_count": self.summarized_count
+        }
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Conversation":
-        """Create Conversation object from dictionary."""
-        # Convert message dicts back to Message objects
-        messages = []
-        for msg_data in data.get('messages', []):
-            # Handle datetime conversion if needed
-            if 'timestamp' in msg_data and isinstance(msg_data['timestamp'], str):
-                msg_data['timestamp'] = datetime.fromisoformat(msg_data['timestamp'])
-            messages.append(Message(**msg_data))
-        
-        # Handle datetime conversion for conversation timestamps
-        if 'created_at' in data and isinstance(data['created_at'], str):
-            data['created_at'] = datetime.fromisoformat(data['created_at'])
-        if 'updated_at' in data and isinstance(data['updated_at'], str):
-            data['updated_at'] = datetime.fromisoformat(data['updated_at'])
-            
+        """Create Conversation object from dictionary; messages are decoded lazily."""
         return cls(
             conversation_id=data['conversation_id'],
             user_id=data['user_id'],
             thread_id=data['thread_id'],
-            messages=messages,
-            created_at=data['created_at'],
-            updated_at=data['updated_at'],
-            metadata=data.get('metadata')
+            messages=LazyMessageList(data.get('messages') or []),
+            created_at=_parse_timestamp(data['created_at']),
+            updated_at=_parse_timestamp(data['updated_at']),
+            metadata=data.get('metadata'),
+            summary=data.get('summary'),
+            summarized_count=data.get('summarized_count', 0)
         )
 
 
+def _unless_stored(query: Dict[str, Any], message_id: Optional[str]) -> Dict[str, Any]:
+    """``query`` guarded to stop matching once the message with ``message_id`` is stored in the document."""
+    return query if message_id is None else {**query, "messages.id": {"$ne": message_id}}
+
+
+def _stored_query(query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """For a query built by _unless_stored, the query matching the document once that message is stored."""
+    guard = query.get("messages.id")
+    return None if guard is None else {**query, "messages.id": guard["$ne"]}
+
+
+def _skip_empty_header(query: Dict[str, Any]) -> Dict[str, Any]:
+    """``query`` made to skip a header get_or_create_conversation stored before the thread's first message.
+
+    An append's upsert then hits the unique (user_id, thread_id) index, and
+    the first append claims the empty header with _claim_update instead.
+    """
+    return {**query, "message_count": {"$ne": 0}}
+
+
+def _claim_update(update: Dict[str, Any]) -> Dict[str, Any]:
+    """An append's update for an empty header: the title it would set on insert is set outright."""
+    return {**update, "$set": {**update["$set"], "title": update["$setOnInsert"]["title"]}}
+
+
+def _reservation_push(count: int, message_id: Optional[str] = None) -> Dict[str, Any]:
+    """``$push`` logging a reservation of ``count`` sequence numbers on a bucketed header."""
+    entry: Dict[str, Any] = {"n": count}
+    if message_id is not None:
+        entry["id"] = message_id
+    return {"reservations": {"$each": [entry], "$slice": -RESERVATION_LOG}}
+
+
+def _reserved_header(header: Dict[str, Any], message_id: str) -> Dict[str, Any]:
+    """The header as it was right after the logged reservation for ``message_id``.
+
+    Every reservation is logged with its $inc, so the ones after it account
+    for the rest of ``message_count``.
+    """
+    entries = header.get("reservations") or []
+    index = max(i for i, entry in enumerate(entries) if entry.get("id") == message_id)
+    later = sum(entry["n"] for entry in entries[index + 1:])
+    return {"conversation_id": header["conversation_id"], "message_count": header["message_count"] - later}
+
+
 class MongoDBMemory:
-    def __init__(self, connection_string: str = "mongodb://localhost:27017/"):
-        self.client = MongoClient(connection_string)
-        self.db = self.client.memories
-        self.collection = self.db.conversations
-        
-        # Create indexes for better performance
-        self._create_indexes()
+    def __init__(self, connection_string: str = "mongodb://localhost:27017/",
+                 database_name: str = "memories", collection_name: str = "conversations",
+                 storage_mode: str = EMBEDDED_STORAGE, bucket_size: int = 100,
+                 max_pool_size: Optional[int] = None, min_pool_size: Optional[int] = None,
+                 auto_setup: bool = True, codec: Optional[ContentCodec] = DEFAULT_CODEC):
+        if storage_mode not in (EMBEDDED_STORAGE, BUCKETED_STORAGE):
+            raise ValueError(f"Unknown storage mode: {storage_mode}")
+        if bucket_size < 1:
+            raise ValueError("bucket_size must be a positive integer")
+
+        # Shared per process; constructing a memory no longer opens a new connection pool
+        self.client = get_mongo_client(connection_string, max_pool_size, min_pool_size)
+        self.db = self.client[database_name]
+        self.collection = self.db[collection_name]
+        # Message buckets, used when storage_mode is BUCKETED_STORAGE
+        self.buckets = self.db[f"{collection_name}_buckets"]
+        self.storage_mode = storage_mode
+        self.bucket_size = bucket_size
+        # Compresses large message content on write; None stores plain strings
+        self.codec = codec
+        # Kept so async twins (AsyncMongoDBMemory) can open the same collections
+        self.connection_string = connection_string
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
 
-    def _create_indexes(self):
+        # Index creation and legacy cleanup are admin work: run them once per
+        # process (or explicitly via setup_database) rather than per instance
+        if auto_setup:
+            run_once(
+                (connection_string, database_name, collection_name, storage_mode),
+                self._create_indexes
+            )
+
+    def setup_database(self) -> None:
+        """Create indexes and clean up legacy documents unconditionally.
+
+        Also makes the (user_id, thread_id) index unique on deployments created
+        before it was, merging duplicate conversations first. Errors are raised.
+        """
+        self._create_indexes(upgrade=True)
+
+    def _create_indexes(self, upgrade: bool = False):
         """Create indexes for better query performance."""
-        try:
-            # First, clean up any documents without conversation_id
-            self._cleanup_legacy_data()
-            
-            # Index on user_id and thread_id for faster lookups
-            self.collection.create_index([("user_id", 1), ("thread_id", 1)])
+        # First, clean up any documents without conversation_id
+        self._cleanup_legacy_data()
+        if upgrade:
+            self._ensure_unique_thread_index(upgrade)
+        else:
+            try:
+                self._ensure_unique_thread_index(upgrade)
+            except Exception as e:
+                print(f"Warning: Could not check the (user_id, thread_id) index: {e}")
+
+        indexes = [
             # Index on conversation_id for unique lookups (only for non-null values)
-            self.collection.create_index("conversation_id", unique=True, sparse=True)
+            ("conversation_id", {"unique": True, "sparse": True}),
             # Index on updated_at for recent conversations
-            self.collection.create_index([("updated_at", -1)])
-        except Exception as e:
-            print(f"Warning: Could not create indexes: {e}")
+            ([("updated_at", -1)], {}),
+            # A user's conversations newest first, with a unique tie-break for listing cursors
+            ([("user_id", 1), ("updated_at", -1), ("conversation_id", -1)], {}),
+        ]
+        for keys, options in indexes:
+            try:
+                self.collection.create_index(keys, **options)
+            except Exception as e:
+                print(f"Warning: Could not create index {keys}: {e}")
+
+        if self.storage_mode == BUCKETED_STORAGE:
+            bucket_indexes = [
+                # One document per (conversation, bucket number)
+                ([("conversation_id", 1), ("bucket", 1)], {"unique": True}),
+                # Newest-bucket-first reads for a thread
+                ([("user_id", 1), ("thread_id", 1), ("bucket", -1)], {}),
+            ]
+            for keys, options in bucket_indexes:
+                try:
+                    self.buckets.create_index(keys, **options)
+                except Exception as e:
+                    print(f"Warning: Could not create bucket index {keys}: {e}")
+
+    def _ensure_unique_thread_index(self, upgrade: bool) -> None:
+        """Make (user_id, thread_id) unique, so concurrent first turns cannot create duplicate conversations.
+
+        Deployments from before this carry a non-unique index on the same keys,
+        which MongoDB will not redefine in place. Only ``upgrade`` (the admin
+        setup) merges duplicates and replaces that index; otherwise a warning
+        says to run it.
+        """
+        keys = [("user_id", 1), ("thread_id", 1)]
+        indexes = self.collection.index_information()
+        existing = next((name for name, info in indexes.items()
+                         if [(field, int(order)) for field, order in info["key"]] == keys), None)
+        if existing is not None and indexes[existing].get("unique"):
+            return
+        if not upgrade:
+            if existing is None:
+                try:
+                    self.collection.create_index(keys, unique=True)
+                    return
+                except Exception as e:
+                    print(f"Warning: Could not create unique index {keys}: {e}")
+            print("Warning: conversations are not unique per (user_id, thread_id) yet, so concurrent first turns "
+                  "can create duplicates; run python -m memories.admin setup")
+            return
+
+        merged = self._merge_duplicate_threads()
+        if merged > 0:
+            print(f"Merged {merged} duplicate conversations")
+        if existing is not None:
+            self.collection.drop_index(existing)
+        self.collection.create_index(keys, unique=True)
+
+    def _merge_duplicate_threads(self) -> int:
+        """Fold conversations sharing a (user_id, thread_id) into the oldest one; returns how many were removed.
+
+        Their messages are appended to the kept conversation (in timestamp
+        order for embedded storage) before the duplicates are deleted, so a run
+        that stops halfway loses nothing.
+        """
+        groups = self.collection.aggregate([
+            {"$group": {"_id": {"user_id": "$user_id", "thread_id": "$thread_id"},
+                        "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ], allowDiskUse=True)
+        removed = 0
+        for group in groups:
+            docs = sorted(self.collection.find({"_id": {"$in": group["ids"]}}),
+                          key=lambda doc: (doc.get("created_at") or datetime.min, str(doc["_id"])))
+            kept, duplicates = docs[0], docs[1:]
+            user_id, thread_id = group["_id"]["user_id"], group["_id"]["thread_id"]
+            for duplicate in duplicates:
+                message_docs = self._stored_message_docs(duplicate)
+                if message_docs and kept.get("storage") == BUCKETED_STORAGE:
+                    header = self.collection.find_one_and_update(
+                        {"_id": kept["_id"]},
+                        {"$inc": {"message_count": len(message_docs)}, "$push": _reservation_push(len(message_docs))},
+                        projection=HEADER_COUNT_PROJECTION, return_document=ReturnDocument.AFTER
+                    )
+                    for query, update in self._bucket_pushes(header, user_id, thread_id, message_docs):
+                        self.buckets.update_one(query, update, upsert=True)
+                elif message_docs:
+                    self.collection.update_one(
+                        {"_id": kept["_id"]},
+                        {"$push": {"messages": {"$each": message_docs, "$sort": {"timestamp": 1}}},
+                         "$inc": {"message_count": len(message_docs)}}
+                    )
+                self.collection.delete_one({"_id": duplicate["_id"]})
+                self.buckets.delete_many({"conversation_id": duplicate["conversation_id"]})
+                removed += 1
+        return removed
+
+    def _stored_message_docs(self, conversation_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """A conversation's message documents as stored, oldest first, from its array or its buckets."""
+        if conversation_doc.get("storage") != BUCKETED_STORAGE:
+            return list(conversation_doc.get("messages") or [])
+        bucket_docs = self.buckets.find({"conversation_id": conversation_doc["conversation_id"]})
+        message_docs = [msg_data for bucket_doc in bucket_docs for msg_data in bucket_doc.get("messages") or []]
+        message_docs.sort(key=lambda msg_data: msg_data.get("seq", 0))
+        return [{key: value for key, value in msg_data.items() if key != "seq"} for msg_data in message_docs]
 
     def _cleanup_legacy_data(self):
         """Clean up legacy data that doesn't fit the new structure."""
@@ -109,6 +552,7 @@ class MongoDBMemory:
         except Exception as e:
             print(f"Warning: Could not cleanup legacy data: {e}")
 
+    @tracing.traced("memory.get_or_create_conversation")
     def get_or_create_conversation(self, user_id: str, thread_id: str) -> Conversation:
         """Get existing conversation or create a new one."""
         conversation_doc = self.collection.find_one({
@@ -117,11 +561,10 @@ class MongoDBMemory:
         })
         
         if conversation_doc:
-            conversation_doc.pop("_id", None)
-            return Conversation.from_dict(conversation_doc)
+            return self._conversation_from_doc(conversation_doc)
         else:
             # Create new conversation
-            conversation_id = f"{user_id}_{thread_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            conversation_id = self._new_conversation_id(user_id, thread_id, datetime.now())
             new_conversation = Conversation(
                 conversation_id=conversation_id,
                 user_id=user_id,
@@ -130,38 +573,274 @@ class MongoDBMemory:
                 created_at=datetime.now(),
                 updated_at=datetime.now()
             )
-            self.collection.insert_one(new_conversation.to_dict())
+            conversation_doc = new_conversation.to_dict()
+            conversation_doc["message_count"] = 0
+            if self.storage_mode == BUCKETED_STORAGE:
+                del conversation_doc["messages"]
+                conversation_doc["storage"] = BUCKETED_STORAGE
+            try:
+                self.collection.insert_one(conversation_doc)
+            except DuplicateKeyError:
+                # A concurrent first turn created the thread; use its document
+                return self._conversation_from_doc(
+                    self.collection.find_one({"user_id": user_id, "thread_id": thread_id})
+                )
             return new_conversation
 
+    @staticmethod
+    def _new_conversation_id(user_id: str, thread_id: str, created_at: datetime) -> str:
+        """Build the conversation identifier assigned when a thread is first stored."""
+        return f"{user_id}_{thread_id}_{created_at.strftime('%Y%m%d_%H%M%S')}"
+
+    @tracing.traced("memory.add_message")
     def add_message(self, user_id: str, thread_id: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Add a message to the conversation."""
-        conversation = self.get_or_create_conversation(user_id, thread_id)
-        
-        # Create new message
+        """Add a message to the conversation.
+
+        Uses a single upserting ``$push`` so the cost does not depend on the
+        thread length and concurrent writers never overwrite each other.
+        """
+        now = datetime.now()
         new_message = Message(
             role=role,
             content=content,
-            timestamp=datetime.now(),
+            timestamp=now,
             metadata=metadata
         )
-        
-        # Add message to conversation
-        conversation.messages.append(new_message)
-        conversation.updated_at = datetime.now()
-        
-        # Update in database
-        self.collection.update_one(
-            {"conversation_id": conversation.conversation_id},
-            {
-                "$set": {
-                    "messages": [msg.to_dict() for msg in conversation.messages],
-                    "updated_at": conversation.updated_at
-                }
-            }
+        return self.append_message(user_id, thread_id, new_message)
+
+    @tracing.traced("memory.append_message")
+    def append_message(self, user_id: str, thread_id: str, message: Message) -> str:
+        """Append an already-built message; returns the conversation id."""
+        if self.storage_mode == BUCKETED_STORAGE:
+            return self._add_bucketed_message(user_id, thread_id, message)
+
+        conversation_doc = self._append(
+            {"user_id": user_id, "thread_id": thread_id},
+            self._embedded_append_update(user_id, thread_id, [message])
         )
-        
-        return conversation.conversation_id
+        return conversation_doc["conversation_id"]
+
+    @tracing.traced("memory.add_messages_bulk")
+    def add_messages_bulk(self, batches: Dict[Tuple[str, str], List[Message]]) -> Dict[Tuple[str, str], str]:
+        """Append already-built messages to many threads in as few round trips as possible.
+
+        Each thread's messages are written, in order, by a single operation and
+        all threads share one ``bulk_write``. In bucketed mode every header
+        still needs its own ``find_one_and_update`` to reserve sequence numbers;
+        the bucket pushes are then batched.
+
+        Returns the threads whose messages were rejected, with the error; every
+        other thread's messages were written. Connection failures are raised,
+        since it is then unknown which writes landed. Messages with an ``id``
+        can be passed again after that: a thread whose first message is
+        already stored is not appended to twice, and its reserved sequence
+        numbers are reused.
+        """
+        failed: Dict[Tuple[str, str], str] = {}
+        requests = []
+        queries: List[Dict[str, Any]] = []
+        # Embedded appends, to claim an empty header with if their upsert fails
+        claims: List[Optional[Dict[str, Any]]] = []
+        request_keys: List[Tuple[str, str]] = []
+        if self.storage_mode == BUCKETED_STORAGE:
+            collection = self.buckets
+            for (user_id, thread_id), messages in batches.items():
+                try:
+                    header = self._reserve_sequence_numbers(user_id, thread_id, messages)
+                except ConnectionFailure:
+                    raise
+                except Exception as e:
+                    failed[(user_id, thread_id)] = str(e)
+                    continue
+                for query, update in self._bucket_appends(header, user_id, thread_id, messages):
+                    requests.append(UpdateOne(query, update, upsert=True))
+                    queries.append(query)
+                    claims.append(None)
+                    request_keys.append((user_id, thread_id))
+        else:
+            collection = self.collection
+            for (user_id, thread_id), messages in batches.items():
+                query = _unless_stored(_skip_empty_header({"user_id": user_id, "thread_id": thread_id}),
+                                       messages[0].id)
+                update = self._embedded_append_update(user_id, thread_id, messages)
+                requests.append(UpdateOne(query, update, upsert=True))
+                queries.append(query)
+                claims.append(update)
+                request_keys.append((user_id, thread_id))
+        for index, error in self._bulk_upsert(collection, requests).items():
+            if claims[index] is not None and collection.update_one(
+                {**queries[index], "message_count": 0}, _claim_update(claims[index])
+            ).modified_count:
+                continue
+            # A guarded append that already landed no longer matches, so its upsert hits a unique index
+            landed = _stored_query(queries[index])
+            if landed is None or not collection.count_documents(landed, limit=1):
+                failed[request_keys[index]] = error
+        return failed
+
+    @staticmethod
+    def _bulk_upsert(collection: Collection, requests: List[UpdateOne]) -> Dict[int, str]:
+        """Run upserts unordered, retrying the ones that lost a document-creation race.
+
+        Returns the error of every request that still failed, by index in
+        ``requests``; all the others were applied.
+        """
+        if not requests:
+            return {}
+        try:
+            collection.bulk_write(requests, ordered=False)
+            return {}
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+
+        failed = {error["index"]: error.get("errmsg", "write error") for error in errors if error.get("code") != 11000}
+        raced = [error["index"] for error in errors if error.get("code") == 11000]
+        if raced:
+            # The retry matches the document the other writer created
+            try:
+                collection.bulk_write([requests[index] for index in raced], ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    failed[raced[error["index"]]] = error.get("errmsg", "write error")
+        return failed
+
+    def _header_update(self, user_id: str, thread_id: str, messages: List[Message]) -> Dict[str, Any]:
+        """Upserting update keeping the listing fields of a conversation header current for appended messages."""
+        return {
+            "$inc": {"message_count": len(messages)},
+            "$set": {
+                "updated_at": messages[-1].timestamp,
+                "last_message": {"role": messages[-1].role, "preview": _preview(messages[-1].content)},
+                "writer_id": WRITER_ID
+            },
+            "$setOnInsert": {
+                "conversation_id": self._new_conversation_id(user_id, thread_id, messages[0].timestamp),
+                "created_at": messages[0].timestamp,
+                "title": _preview(messages[0].content)
+            }
+        }
+
+    def _message_doc(self, message: Message) -> Dict[str, Any]:
+        """Stored form of a message, with its content compressed when a codec is configured."""
+        message_doc = message.to_dict()
+        if self.codec is not None:
+            message_doc["content"] = self.codec.encode(message.content)
+        tracing.add("bytes_written", len(message_doc["content"]))
+        return message_doc
+
+    def _embedded_append_update(self, user_id: str, thread_id: str, messages: List[Message]) -> Dict[str, Any]:
+        """Upserting update that pushes messages, in order, onto an embedded conversation."""
+        update = self._header_update(user_id, thread_id, messages)
+        update["$push"] = {"messages": {"$each": [self._message_doc(message) for message in messages]}}
+        return update
+
+    def _bucketed_header_update(self, user_id: str, thread_id: str, messages: List[Message]) -> Dict[str, Any]:
+        """Upserting update that reserves the next ``len(messages)`` sequence numbers on a bucketed header."""
+        update = self._header_update(user_id, thread_id, messages)
+        update["$setOnInsert"]["storage"] = BUCKETED_STORAGE
+        update["$push"] = _reservation_push(len(messages), messages[0].id)
+        return update
+
+    def _reserve_sequence_numbers(self, user_id: str, thread_id: str, messages: List[Message]) -> Dict[str, Any]:
+        """Reserve sequence numbers for ``messages`` on the thread's bucketed header; returns the header.
+
+        A thread whose messages are still embedded does not match the header
+        query, so the upsert hits the unique (user_id, thread_id) index; it is
+        migrated to buckets first, since new messages would otherwise be
+        numbered from the start and hide the embedded history. Messages with
+        an ``id`` whose numbers are still in the header's reservation log get
+        those numbers back instead of new ones.
+        """
+        first_id = messages[0].id
+        query = {"user_id": user_id, "thread_id": thread_id, **BUCKETED_HEADER_MATCH}
+        if first_id is not None:
+            # A retried write keeps the numbers it reserved before
+            query["reservations.id"] = {"$ne": first_id}
+        update = self._bucketed_header_update(user_id, thread_id, messages)
+        try:
+            return self._append(query, update, projection=HEADER_COUNT_PROJECTION)
+        except DuplicateKeyError:
+            if first_id is not None:
+                header = self.collection.find_one(
+                    {"user_id": user_id, "thread_id": thread_id, "reservations.id": first_id}, RESERVATION_PROJECTION
+                )
+                if header is not None:
+                    return _reserved_header(header, first_id)
+            if not self._migrate_thread(user_id, thread_id):
+                raise ValueError(f"Thread {thread_id} of {user_id} is stored embedded and could not be migrated "
+                                 f"to buckets; run migrate_legacy_data")
+            return self._append(query, update, projection=HEADER_COUNT_PROJECTION)
+
+    def _bucket_appends(self, header: Dict[str, Any], user_id: str, thread_id: str,
+                        messages: List[Message]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(query, update) pairs pushing messages into the buckets their sequence numbers fall in.
+
+        ``header`` is the header after reserving ``len(messages)`` sequence
+        numbers, so the first message gets ``message_count - len(messages)``.
+        """
+        return self._bucket_pushes(header, user_id, thread_id, [self._message_doc(message) for message in messages])
+
+    def _bucket_pushes(self, header: Dict[str, Any], user_id: str, thread_id: str,
+                       message_docs: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """_bucket_appends for message documents already in their stored form."""
+        first_seq = header["message_count"] - len(message_docs)
+        by_bucket: Dict[int, List[Dict[str, Any]]] = {}
+        for offset, message_doc in enumerate(message_docs):
+            message_doc = {**message_doc, "seq": first_seq + offset}
+            by_bucket.setdefault(message_doc["seq"] // self.bucket_size, []).append(message_doc)
+        return [
+            (
+                _unless_stored({"conversation_id": header["conversation_id"], "bucket": bucket}, docs[0].get("id")),
+                {"$push": {"messages": {"$each": docs}}, "$setOnInsert": {"user_id": user_id, "thread_id": thread_id}}
+            )
+            for bucket, docs in by_bucket.items()
+        ]
+
+    def _add_bucketed_message(self, user_id: str, thread_id: str, message: Message) -> str:
+        """Append a message to the newest bucket of a bucketed conversation.
+
+        The header's ``message_count`` is incremented atomically first; the
+        returned count gives the message its sequence number and therefore its
+        bucket, so concurrent writers never race for the same slot.
+        """
+        header = self._reserve_sequence_numbers(user_id, thread_id, [message])
+
+        [(bucket_query, bucket_update)] = self._bucket_appends(header, user_id, thread_id, [message])
+        try:
+            self.buckets.update_one(bucket_query, bucket_update, upsert=True)
+        except DuplicateKeyError:
+            self.buckets.update_one(bucket_query, bucket_update, upsert=True)
+
+        return header["conversation_id"]
 
+    def _append(self, query: Dict[str, Any], update: Dict[str, Any],
+                projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Apply an upserting update and return the projected conversation document."""
+        query = _skip_empty_header(query)
+
+        def apply():
+            return self.collection.find_one_and_update(
+                query,
+                update,
+                projection=projection or CONVERSATION_ID_PROJECTION,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+
+        try:
+            return apply()
+        except DuplicateKeyError:
+            claimed = self.collection.find_one_and_update(
+                {**query, "message_count": 0}, _claim_update(update),
+                projection=projection or CONVERSATION_ID_PROJECTION, return_document=ReturnDocument.AFTER
+            )
+            if claimed is not None:
+                return claimed
+            # Another writer created the conversation between our match and insert;
+            # the retry matches the existing document and updates it.
+            return apply()
+
+    @tracing.traced("memory.get_conversation")
     def get_conversation(self, user_id: str, thread_id: str) -> Optional[Conversation]:
         """Get a specific conversation."""
         conversation_doc = self.collection.find_one({
@@ -170,30 +849,388 @@ class MongoDBMemory:
         })
         
         if conversation_doc:
-            conversation_doc.pop("_id", None)
-            return Conversation.from_dict(conversation_doc)
+            return self._conversation_from_doc(conversation_doc)
         return None
 
-    def get_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None) -> List[Message]:
-        """Get messages from a conversation."""
-        conversation = self.get_conversation(user_id, thread_id)
-        if not conversation:
-            return []
-        
-        messages = conversation.messages
+    def _conversation_from_doc(self, conversation_doc: Dict[str, Any]) -> Conversation:
+        """Build a Conversation, loading its buckets when storage is bucketed."""
+        conversation_doc.pop("_id", None)
+        _record_read(conversation_doc.get("messages") or [])
+        conversation = Conversation.from_dict(conversation_doc)
+        if self.storage_mode == BUCKETED_STORAGE and (
+            conversation_doc.get("storage") == BUCKETED_STORAGE
+            or self._migrate_thread(conversation.user_id, conversation.thread_id)
+        ):
+            conversation.messages = LazyMessageList(
+                self._bucketed_message_docs({"conversation_id": conversation.conversation_id})
+            )
+        return conversation
+
+    @tracing.traced("memory.get_conversation_messages")
+    def get_conversation_messages(self, user_id: str, thread_id: str, limit: Optional[int] = None,
+                                  include_metadata: bool = True) -> List[Message]:
+        """Get messages from a conversation.
+
+        The ``limit`` window is applied server-side with ``$slice`` so only the
+        last N messages are read and decoded. With ``include_metadata=False``
+        each message is projected down to role, content, timestamp and its
+        cached token count.
+        """
+        pipeline = self._messages_pipeline({"user_id": user_id, "thread_id": thread_id}, limit, include_metadata)
+        return self._read_messages(user_id, thread_id, pipeline)
+
+    @tracing.traced("memory.get_messages_by_role")
+    def get_messages_by_role(self, user_id: str, thread_id: str, role: str, limit: Optional[int] = None,
+                             include_metadata: bool = True) -> List[Message]:
+        """Get the last ``limit`` messages with the given role, filtered server-side."""
+        pipeline = self._messages_pipeline({"user_id": user_id, "thread_id": thread_id}, limit, include_metadata, role)
+        return self._read_messages(user_id, thread_id, pipeline)
+
+    def _read_messages(self, user_id: str, thread_id: str, pipeline: List[Dict[str, Any]]) -> List[Message]:
+        """Run a _messages_pipeline; a bucketed read finding nothing migrates a thread still stored embedded."""
+        docs = list(self._messages_source().aggregate(pipeline, allowDiskUse=True))
+        if not docs and self.storage_mode == BUCKETED_STORAGE and self._migrate_thread(user_id, thread_id):
+            docs = list(self.buckets.aggregate(pipeline, allowDiskUse=True))
+        return self._messages_from_docs(docs)
+
+    def _messages_source(self) -> Collection:
+        """Collection that message read pipelines run against."""
+        return self.buckets if self.storage_mode == BUCKETED_STORAGE else self.collection
+
+    def _messages_pipeline(self, match: Dict[str, Any], limit: Optional[int] = None,
+                           include_metadata: bool = True, role: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Aggregation reading the last ``limit`` messages (of ``role``, if given) of one thread."""
+        if self.storage_mode == BUCKETED_STORAGE:
+            return self._bucketed_pipeline(match, limit, include_metadata, role)
+        return [
+            {"$match": match},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "messages": self._messages_projection(limit, include_metadata, role)}}
+        ]
+
+    def _messages_from_docs(self, docs: List[Dict[str, Any]]) -> List[Message]:
+        """Decode the output of a _messages_pipeline aggregation."""
+        if self.storage_mode == BUCKETED_STORAGE:
+            # Bucketed pipelines emit one document per message, newest first
+            _record_read(docs)
+            return [Message.from_dict(msg_data) for msg_data in reversed(docs)]
+        for doc in docs:
+            _record_read(doc.get("messages") or [])
+            return [Message.from_dict(msg_data) for msg_data in doc.get("messages") or []]
+        return []
+
+    @tracing.traced("memory.get_messages_by_role_bulk")
+    def get_messages_by_role_bulk(self, role: str, user_id: Optional[str] = None,
+                                  thread_ids: Optional[List[str]] = None, limit: Optional[int] = None,
+                                  include_metadata: bool = True) -> Dict[Tuple[str, str], List[Message]]:
+        """Get messages with the given role across many conversations in one query.
+
+        Results are keyed by ``(user_id, thread_id)``. Conversations without a
+        message of that role are skipped by the match stage.
+        """
+        match: Dict[str, Any] = {"messages.role": role}
+        if user_id is not None:
+            match["user_id"] = user_id
+        if thread_ids is not None:
+            match["thread_id"] = {"$in": list(thread_ids)}
+
+        if self.storage_mode == BUCKETED_STORAGE:
+            collection = self.buckets
+            pipeline = [
+                {"$match": match},
+                {"$unwind": "$messages"},
+                {"$match": {"messages.role": role}},
+                {"$sort": {"user_id": ASCENDING, "thread_id": ASCENDING, "messages.seq": ASCENDING}},
+                {"$group": {
+                    "_id": {"user_id": "$user_id", "thread_id": "$thread_id"},
+                    "messages": {"$push": "$messages"}
+                }},
+                {"$project": {
+                    "_id": 0,
+                    "user_id": "$_id.user_id",
+                    "thread_id": "$_id.thread_id",
+                    "messages": self._messages_projection(limit, include_metadata)
+                }}
+            ]
+        else:
+            collection = self.collection
+            pipeline = [
+                {"$match": match},
+                {"$project": {
+                    "_id": 0,
+                    "user_id": 1,
+                    "thread_id": 1,
+                    "messages": self._messages_projection(limit, include_metadata, role)
+                }}
+            ]
+        results: Dict[Tuple[str, str], List[Message]] = {}
+        for doc in collection.aggregate(pipeline, allowDiskUse=True):
+            key = (doc["user_id"], doc["thread_id"])
+            results[key] = [Message.from_dict(msg_data) for msg_data in doc.get("messages") or []]
+        return results
+
+    @staticmethod
+    def _messages_projection(limit: Optional[int] = None, include_metadata: bool = True,
+                             role: Optional[str] = None) -> Any:
+        """Build the aggregation expression selecting the last ``limit`` messages (of ``role``, if given)."""
+        messages: Any = {"$ifNull": ["$messages", []]}
+        if role:
+            messages = {"$filter": {"input": messages, "as": "m", "cond": {"$eq": ["$$m.role", role]}}}
         if limit:
-            messages = messages[-limit:]  # Get last N messages
+            messages = {"$slice": [messages, -limit]}
+        if not include_metadata:
+            messages = {
+                "$map": {
+                    "input": messages,
+                    "as": "m",
+                    "in": LEAN_MESSAGE_EXPRESSION
+                }
+            }
         return messages
 
+    def _bucketed_messages(self, match: Dict[str, Any], limit: Optional[int] = None,
+                           include_metadata: bool = True, role: Optional[str] = None) -> List[Message]:
+        """Read the last ``limit`` messages (of ``role``, if given) from message buckets."""
+        return [Message.from_dict(msg_data) for msg_data in self._bucketed_message_docs(match, limit, include_metadata, role)]
+
+    def _bucketed_message_docs(self, match: Dict[str, Any], limit: Optional[int] = None,
+                               include_metadata: bool = True, role: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Undecoded message documents for _bucketed_messages, oldest first."""
+        pipeline = self._bucketed_pipeline(match, limit, include_metadata, role)
+        docs = list(self.buckets.aggregate(pipeline, allowDiskUse=True))
+        _record_read(docs)
+        docs.reverse()
+        return docs
+
+    def _bucketed_pipeline(self, match: Dict[str, Any], limit: Optional[int] = None,
+                           include_metadata: bool = True, role: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Aggregation over message buckets emitting matching messages newest first."""
+        pipeline: List[Dict[str, Any]] = [{"$match": match}]
+        if limit and not role:
+            # Only the newest buckets can hold the last `limit` messages
+            pipeline += [
+                {"$sort": {"bucket": DESCENDING}},
+                {"$limit": limit // self.bucket_size + 2}
+            ]
+        pipeline.append({"$unwind": "$messages"})
+        if role:
+            pipeline.append({"$match": {"messages.role": role}})
+        pipeline.append({"$sort": {"messages.seq": DESCENDING}})
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline.append({"$replaceRoot": {"newRoot": "$messages"}})
+        if not include_metadata:
+            pipeline.append({"$project": LEAN_MESSAGE_PROJECTION})
+        return pipeline
+
+    @tracing.traced("memory.get_message_page")
+    def get_message_page(self, user_id: str, thread_id: str, before_bucket: Optional[int] = None,
+                         include_metadata: bool = True) -> Tuple[List[Message], Optional[int]]:
+        """Page backwards through a bucketed conversation, newest bucket first.
+
+        Returns the messages of one bucket and the cursor to pass as
+        ``before_bucket`` for the next (older) page, or None once the first
+        bucket has been returned.
+        """
+        if self.storage_mode != BUCKETED_STORAGE:
+            raise ValueError("get_message_page requires bucketed storage")
+
+        query: Dict[str, Any] = {"user_id": user_id, "thread_id": thread_id}
+        if before_bucket is not None:
+            query["bucket"] = {"$lt": before_bucket}
+        if include_metadata:
+            projection = {"_id": 0, "bucket": 1, "messages": 1}
+        else:
+            projection = {"_id": 0, "bucket": 1, "messages.role": 1, "messages.content": 1,
+                          "messages.timestamp": 1, "messages.seq": 1, "messages.metadata.token_count": 1}
+
+        bucket_doc = self.buckets.find_one(query, projection, sort=[("bucket", DESCENDING)])
+        if not bucket_doc and before_bucket is None and self._migrate_thread(user_id, thread_id):
+            bucket_doc = self.buckets.find_one(query, projection, sort=[("bucket", DESCENDING)])
+        if not bucket_doc:
+            return [], None
+
+        # Concurrent appends may land slightly out of order within a bucket
+        messages = sorted(bucket_doc.get("messages") or [], key=lambda msg: msg.get("seq", 0))
+        next_cursor = bucket_doc["bucket"] if bucket_doc["bucket"] > 0 else None
+        return [Message.from_dict(msg_data) for msg_data in messages], next_cursor
+
+    @tracing.traced("memory.get_unsummarized_messages")
+    def get_unsummarized_messages(self, user_id: str, thread_id: str) -> Tuple[Optional[str], int, List[Message]]:
+        """Return the rolling summary, how many messages it covers, and the messages after those.
+
+        Only the tail that the summary does not cover yet is read, projected
+        down to role, content, timestamp and cached token count.
+        """
+        match = {"user_id": user_id, "thread_id": thread_id}
+        if self.storage_mode == BUCKETED_STORAGE:
+            header = self.collection.find_one(match, SUMMARY_PROJECTION)
+            if header is None:
+                return None, 0, []
+            if header.get("storage") != BUCKETED_STORAGE and self._migrate_thread(user_id, thread_id):
+                header = self.collection.find_one(match, SUMMARY_PROJECTION)
+            summarized_count = header.get("summarized_count", 0)
+            docs = list(self.buckets.aggregate(self._unsummarized_bucket_pipeline(match, summarized_count)))
+            _record_read(docs)
+            return header.get("summary"), summarized_count, [Message.from_dict(msg_data) for msg_data in docs]
+
+        docs = list(self.collection.aggregate(self._unsummarized_pipeline(match)))
+        if not docs:
+            return None, 0, []
+        doc = docs[0]
+        _record_read(doc["messages"])
+        return doc.get("summary"), doc["summarized_count"], [Message.from_dict(msg_data) for msg_data in doc["messages"]]
+
+    @tracing.traced("memory.get_thread_state")
+    def get_thread_state(self, user_id: str, thread_id: str,
+                         limit: Optional[int] = None) -> Tuple[Optional[str], int, int, List[Message]]:
+        """Return the rolling summary, how many messages it covers, the thread length and its last ``limit`` messages.
+
+        Everything a turn reads about a thread, in one query for embedded
+        storage (header plus buckets for bucketed storage).
+        """
+        match = {"user_id": user_id, "thread_id": thread_id}
+        if self.storage_mode == BUCKETED_STORAGE:
+            header = self.collection.find_one(match, THREAD_STATE_PROJECTION)
+            if header is None:
+                return None, 0, 0, []
+            if header.get("storage") != BUCKETED_STORAGE and self._migrate_thread(user_id, thread_id):
+                header = self.collection.find_one(match, THREAD_STATE_PROJECTION)
+            messages = self._bucketed_messages(match, limit)
+            return header.get("summary"), header.get("summarized_count", 0), header.get("message_count", 0), messages
+
+        docs = list(self.collection.aggregate(self._thread_state_pipeline(match, limit)))
+        if not docs:
+            return None, 0, 0, []
+        doc = docs[0]
+        _record_read(doc["messages"])
+        messages = [Message.from_dict(msg_data) for msg_data in doc["messages"]]
+        return doc.get("summary"), doc["summarized_count"], doc["total"], messages
+
+    def _thread_state_pipeline(self, match: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Aggregation returning an embedded conversation's summary fields, length and last messages."""
+        return [
+            {"$match": match},
+            {"$limit": 1},
+            {"$project": {
+                "_id": 0,
+                "summary": 1,
+                "summarized_count": {"$ifNull": ["$summarized_count", 0]},
+                "total": {"$size": {"$ifNull": ["$messages", []]}},
+                "messages": self._messages_projection(limit)
+            }}
+        ]
+
+    @staticmethod
+    def _unsummarized_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Aggregation returning an embedded conversation's summary and the messages it does not cover."""
+        summarized_count = {"$ifNull": ["$summarized_count", 0]}
+        messages = {"$ifNull": ["$messages", []]}
+        return [
+            {"$match": match},
+            {"$limit": 1},
+            {"$project": {
+                "_id": 0,
+                "summary": 1,
+                "summarized_count": summarized_count,
+                "messages": {
+                    "$map": {
+                        "input": {"$slice": [messages, summarized_count, {"$max": [1, {"$size": messages}]}]},
+                        "as": "m",
+                        "in": LEAN_MESSAGE_EXPRESSION
+                    }
+                }
+            }}
+        ]
+
+    def _unsummarized_bucket_pipeline(self, match: Dict[str, Any], summarized_count: int) -> List[Dict[str, Any]]:
+        """Aggregation over message buckets emitting messages with ``seq >= summarized_count``, oldest first."""
+        return [
+            {"$match": {**match, "bucket": {"$gte": summarized_count // self.bucket_size}}},
+            {"$unwind": "$messages"},
+            {"$match": {"messages.seq": {"$gte": summarized_count}}},
+            {"$sort": {"messages.seq": ASCENDING}},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+            {"$project": LEAN_MESSAGE_PROJECTION}
+        ]
+
+    @tracing.traced("memory.update_summary")
+    def update_summary(self, user_id: str, thread_id: str, summary: str, summarized_count: int) -> bool:
+        """Store a rolling summary covering the first ``summarized_count`` messages.
+
+        Ignored when the stored summary already covers as many messages, so a
+        slower concurrent summarizer cannot roll it back.
+        """
+        try:
+            query, update = self._summary_update(user_id, thread_id, summary, summarized_count)
+            result = self.collection.update_one(query, update)
+            return result.modified_count > 0
+        except Exception as e:
+            print(f"Error updating summary: {e}")
+            return False
+
+    @staticmethod
+    def _summary_update(user_id: str, thread_id: str, summary: str,
+                        summarized_count: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(query, update) advancing a conversation's rolling summary."""
+        query = {
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "summarized_count": {"$not": {"$gte": summarized_count}}
+        }
+        update = {"$set": {
+            "summary": summary,
+            "summarized_count": summarized_count,
+            "summary_updated_at": datetime.now(),
+            "writer_id": WRITER_ID
+        }}
+        return query, update
+
+    @tracing.traced("memory.get_user_conversations")
     def get_user_conversations(self, user_id: str, limit: int = 10) -> List[Conversation]:
-        """Get all conversations for a user."""
+        """Get all conversations for a user, with every message (see list_conversations for listings)."""
         cursor = self.collection.find({"user_id": user_id}).sort("updated_at", DESCENDING).limit(limit)
-        conversations = []
-        for doc in cursor:
-            doc.pop("_id", None)
-            conversations.append(Conversation.from_dict(doc))
-        return conversations
+        return [self._conversation_from_doc(doc) for doc in cursor]
+
+    @tracing.traced("memory.list_conversations")
+    def list_conversations(self, user_id: str, limit: int = 20,
+                           cursor: Optional[str] = None) -> Tuple[List[ConversationHeader], Optional[str]]:
+        """List a user's conversations, most recently updated first, without reading any messages.
 
+        Returns one page of headers and the cursor for the next page (None
+        after the last one). Pages follow the (user_id, updated_at,
+        conversation_id) index, so each costs the same however deep it is.
+        """
+        docs = list(
+            self.collection.find(self._list_query(user_id, cursor), HEADER_LIST_PROJECTION)
+            .sort(LIST_SORT)
+            .limit(limit + 1)
+        )
+        return self._list_page(docs, limit)
+
+    @staticmethod
+    def _list_query(user_id: str, cursor: Optional[str]) -> Dict[str, Any]:
+        """Filter for the listing page that starts after ``cursor``."""
+        query: Dict[str, Any] = {"user_id": user_id}
+        if cursor:
+            updated_at, conversation_id = cursor.split("|", 1)
+            updated_at = datetime.fromisoformat(updated_at)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "conversation_id": {"$lt": conversation_id}}
+            ]
+        return query
+
+    @staticmethod
+    def _list_page(docs: List[Dict[str, Any]], limit: int) -> Tuple[List[ConversationHeader], Optional[str]]:
+        """Headers of one listing page and the cursor after it; ``docs`` holds up to ``limit + 1`` documents."""
+        headers = [ConversationHeader.from_dict(doc) for doc in docs[:limit]]
+        if len(docs) <= limit or not headers:
+            return headers, None
+        last = headers[-1]
+        return headers, f"{last.updated_at.isoformat()}|{last.conversation_id}"
+
+    @tracing.traced("memory.delete_conversation")
     def delete_conversation(self, user_id: str, thread_id: str) -> bool:
         """Delete a specific conversation."""
         try:
@@ -201,41 +1238,199 @@ class MongoDBMemory:
                 "user_id": user_id,
                 "thread_id": thread_id
             })
+            self.buckets.delete_many({"user_id": user_id, "thread_id": thread_id})
             return result.deleted_count > 0
         except Exception:
             return False
 
+    @tracing.traced("memory.clear_user_conversations")
     def clear_user_conversations(self, user_id: str) -> bool:
         """Clear all conversations for a user."""
         try:
             self.collection.delete_many({"user_id": user_id})
+            self.buckets.delete_many({"user_id": user_id})
             return True
         except Exception:
             return False
 
+    @tracing.traced("memory.get_conversation_by_id")
     def get_conversation_by_id(self, conversation_id: str) -> Optional[Conversation]:
         """Get conversation by its unique ID."""
         conversation_doc = self.collection.find_one({"conversation_id": conversation_id})
         if conversation_doc:
-            conversation_doc.pop("_id", None)
-            return Conversation.from_dict(conversation_doc)
+            return self._conversation_from_doc(conversation_doc)
         return None
 
+    @tracing.traced("memory.clear_all_conversations")
     def clear_all_conversations(self) -> bool:
         """Clear all conversations from the database."""
         try:
             self.collection.delete_many({})
+            self.buckets.delete_many({})
             return True
         except Exception:
             return False
 
+    @tracing.traced("memory.migrate_legacy_data")
     def migrate_legacy_data(self) -> bool:
-        """Migrate legacy individual message documents to conversation format."""
+        """Migrate legacy data to the configured storage layout.
+
+        Documents without a conversation_id are cleaned up. In bucketed mode,
+        conversations still using the single-document layout are split into
+        message buckets and reduced to a header document. Embedded
+        conversations written before the listing fields existed get their
+        message count, title and last-message preview computed.
+        """
         try:
-            # This method can be used to migrate old data if needed
-            # For now, we'll just clean up incompatible documents
             self._cleanup_legacy_data()
+            backfilled = self._backfill_header_fields()
+            if backfilled > 0:
+                print(f"Backfilled listing fields on {backfilled} conversations")
+            if self.storage_mode == BUCKETED_STORAGE:
+                migrated = self._migrate_to_buckets()
+                if migrated > 0:
+                    print(f"Migrated {migrated} conversations to bucketed storage")
             return True
         except Exception as e:
             print(f"Error during migration: {e}")
             return False
+
+    def _backfill_header_fields(self) -> int:
+        """Compute listing fields of embedded conversations whose message_count is missing or stale."""
+        messages = {"$ifNull": ["$messages", []]}
+
+        def preview_of(index: int) -> Dict[str, Any]:
+            return {"$let": {
+                "vars": {"m": {"$arrayElemAt": [messages, index]}},
+                "in": {"role": "$$m.role", "preview": {"$cond": [
+                    # Compressed (binary) content has no server-side preview
+                    {"$eq": [{"$type": "$$m.content"}, "string"]},
+                    {"$substrCP": ["$$m.content", 0, PREVIEW_CHARS]},
+                    ""
+                ]}}
+            }}
+
+        has_messages = {"$gt": [{"$size": messages}, 0]}
+        result = self.collection.update_many(
+            {
+                "messages": {"$exists": True},
+                # A header switched to buckets counts bucketed appends too
+                "storage": {"$ne": BUCKETED_STORAGE},
+                "$expr": {"$ne": [{"$ifNull": ["$message_count", -1]}, {"$size": messages}]}
+            },
+            [{"$set": {
+                "message_count": {"$size": messages},
+                "title": {"$ifNull": ["$title", {"$cond": [has_messages, {"$let": {
+                    "vars": {"first": preview_of(0)}, "in": "$$first.preview"
+                }}, None]}]},
+                "last_message": {"$ifNull": ["$last_message", {"$cond": [has_messages, preview_of(-1), None]}]}
+            }}]
+        )
+        return result.modified_count
+
+    def _migrate_to_buckets(self) -> int:
+        """Split embedded message arrays into buckets; returns the number of conversations migrated."""
+        migrated = 0
+        for conversation_doc in self.collection.find({"messages": {"$exists": True}}):
+            if self._migrate_conversation(conversation_doc):
+                migrated += 1
+        return migrated
+
+    def _migrate_conversation(self, conversation_doc: Dict[str, Any]) -> bool:
+        """Move one conversation's embedded messages into buckets; True once its array is removed.
+
+        The header is switched to bucketed storage first, with a compare-and-swap
+        that fails if the thread changed since it was read. Appends made after
+        that go to buckets, after the copied messages. The copy only pushes into
+        buckets that lack its first sequence number, so it never overwrites
+        appended messages and can be re-run after an interruption. The embedded
+        array is removed last, and only once every message is in its bucket.
+        """
+        conversation_id = conversation_doc["conversation_id"]
+        messages = conversation_doc.get("messages") or []
+
+        if conversation_doc.get("storage") != BUCKETED_STORAGE:
+            if self.buckets.count_documents({"conversation_id": conversation_id}, limit=1):
+                # Bucketed writes to a header that was never switched: their sequence numbers overlap the array
+                print(f"Warning: {conversation_id} has bucketed messages written before migration; "
+                      f"repair it before migrating")
+                return False
+            switched = self.collection.update_one(
+                {
+                    "_id": conversation_doc["_id"],
+                    "storage": {"$ne": BUCKETED_STORAGE},
+                    # Conversations from before message_count existed have none yet
+                    "message_count": {"$in": [len(messages), None]},
+                    "messages": {"$size": len(messages)}
+                },
+                {"$set": {"storage": BUCKETED_STORAGE, "message_count": len(messages)}}
+            )
+            if switched.modified_count == 0:
+                print(f"Warning: {conversation_id} changed during migration; run migrate_legacy_data again")
+                return False
+
+        operations = []
+        for start in range(0, len(messages), self.bucket_size):
+            bucket_messages = [
+                {**msg_data, "seq": start + offset}
+                for offset, msg_data in enumerate(messages[start:start + self.bucket_size])
+            ]
+            operations.append(UpdateOne(
+                {"conversation_id": conversation_id, "bucket": start // self.bucket_size,
+                 "messages.seq": {"$ne": start}},
+                {
+                    "$push": {"messages": {"$each": bucket_messages}},
+                    "$setOnInsert": {"user_id": conversation_doc["user_id"],
+                                     "thread_id": conversation_doc["thread_id"]}
+                },
+                upsert=True
+            ))
+        if operations:
+            try:
+                self.buckets.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # A duplicate key means the bucket already holds this chunk (an earlier run copied it)
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        if not self._buckets_hold(conversation_id, messages):
+            print(f"Warning: buckets of {conversation_id} do not match its embedded messages; kept the array")
+            return False
+
+        result = self.collection.update_one(
+            {"_id": conversation_doc["_id"], "messages": {"$size": len(messages)}},
+            {"$unset": {"messages": ""}}
+        )
+        if result.modified_count == 0:
+            print(f"Warning: {conversation_id} got embedded appends during migration; run migrate_legacy_data again")
+            return False
+        return True
+
+    def _buckets_hold(self, conversation_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Whether every embedded message is stored in the buckets under its sequence number."""
+        if not messages:
+            return True
+        stored: Dict[int, Tuple[Any, Any]] = {}
+        for bucket_doc in self.buckets.find(
+            {"conversation_id": conversation_id, "bucket": {"$lte": (len(messages) - 1) // self.bucket_size}},
+            {"_id": 0, "messages.seq": 1, "messages.role": 1, "messages.timestamp": 1}
+        ):
+            for msg_data in bucket_doc.get("messages") or []:
+                stored[msg_data.get("seq")] = (msg_data.get("role"), msg_data.get("timestamp"))
+        return all(stored.get(seq) == (msg_data.get("role"), msg_data.get("timestamp"))
+                   for seq, msg_data in enumerate(messages))
+
+    def _migrate_thread(self, user_id: str, thread_id: str) -> bool:
+        """Migrate a thread whose header is not bucketed yet; True if it was found and is bucketed now.
+
+        Bucketed reads and appends call this when they meet such a thread, so
+        its embedded history is never hidden behind, or numbered over by,
+        bucketed messages.
+        """
+        conversation_doc = self.collection.find_one(
+            {"user_id": user_id, "thread_id": thread_id, "storage": {"$ne": BUCKETED_STORAGE}}
+        )
+        if conversation_doc is None:
+            return False
+        self._migrate_conversation(conversation_doc)
+        return self.collection.count_documents({"_id": conversation_doc["_id"], "storage": BUCKETED_STORAGE},
+                                               limit=1) > 0
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from memories.conversation_cache import CachedThread, ConversationCache
+from memories.mongodb_memories import Message
+
+KEY = ("u", "t")
+
+
+def _message(n: int) -> Message:
+    return Message("user", f"message {n}", datetime.now(), {"token_count": 2, "tags": ["a"]})
+
+
+def _filled_cache() -> ConversationCache:
+    cache = ConversationCache()
+    token = cache.begin_fill(KEY)
+    cache.end_fill(KEY, token, CachedThread([_message(0), _message(1)], 2))
+    return cache
+
+
+def test_mutating_returned_messages_leaves_the_cache_untouched():
+    cache = _filled_cache()
+
+    returned = cache.read(KEY, lambda entry: entry.recent(2))
+    returned[0].content = "changed"
+    returned[0].metadata["tags"].append("b")
+    returned[1].metadata.clear()
+
+    again = cache.read(KEY, lambda entry: entry.recent(2))
+    assert [message.content for message in again] == ["message 0", "message 1"]
+    assert again[0].metadata == {"token_count": 2, "tags": ["a"]}
+    assert again[1].metadata == {"token_count": 2, "tags": ["a"]}
+
+
+def test_filled_and_appended_messages_are_not_shared_with_the_writer():
+    loaded = CachedThread([_message(0)], 1)
+    cache = ConversationCache()
+    token = cache.begin_fill(KEY)
+    cache.end_fill(KEY, token, loaded)
+    saved = _message(1)
+    cache.append(KEY, saved)
+
+    # The loader and the write queue keep using their own objects
+    loaded.messages[0].content = "changed"
+    saved.metadata["token_count"] = 99
+
+    messages = cache.read(KEY, lambda entry: entry.recent(2))
+    assert [message.content for message in messages] == ["message 0", "message 1"]
+    assert messages[1].metadata["token_count"] == 2
+
+
+def _fill_around(cache: ConversationCache, write) -> None:
+    """Load a thread the way a cache miss does, with ``write`` landing mid-read."""
+    token = cache.begin_fill(KEY)
+    write(cache)
+    cache.end_fill(KEY, token, CachedThread([_message(0)], 1))
+
+
+def test_fill_racing_a_write_is_not_stored():
+    for write in (lambda cache: cache.append(KEY, _message(1)),
+                  lambda cache: cache.invalidate(KEY),
+                  lambda cache: cache.set_summary(KEY, "summary", 1),
+                  lambda cache: cache.invalidate_user("u"),
+                  lambda cache: cache.clear()):
+        cache = ConversationCache()
+        _fill_around(cache, write)
+
+        assert cache.read(KEY, lambda entry: entry.recent()) is None
+        assert cache.stats()["entries"] == 0
+
+
+def test_overlapping_fills_are_discarded_after_a_write():
+    cache = ConversationCache()
+    first = cache.begin_fill(KEY)
+    second = cache.begin_fill(KEY)
+    cache.end_fill(KEY, first, CachedThread([_message(0)], 1))
+    cache.append(KEY, _message(1))
+    # Read before the append, finished after it: would hide message 1
+    cache.end_fill(KEY, second, CachedThread([_message(0)], 1))
+
+    messages = cache.read(KEY, lambda entry: entry.recent())
+    assert [message.content for message in messages] == ["message 0", "message 1"]
+
+    third = cache.begin_fill(KEY)
+    cache.end_fill(KEY, third, CachedThread([_message(0), _message(1)], 2))
+    assert cache.read(KEY, lambda entry: entry.total) == 2
+
+
+def test_fill_for_another_thread_survives_a_write():
+    cache = ConversationCache()
+    token = cache.begin_fill(KEY)
+    cache.append(("u", "other"), _message(1))
+    cache.end_fill(KEY, token, CachedThread([_message(0)], 1))
+
+    assert cache.read(KEY, lambda entry: entry.total) == 1
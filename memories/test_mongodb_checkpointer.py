@@ -0,0 +1,99 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+
+from memories.mongodb_checkpointer import MongoDBCheckpointer
+
+
+def _config(thread_id: str = "t", user_id: str = "u", **extra) -> dict:
+    return {"configurable": {"user_id": user_id, "thread_id": thread_id, "checkpoint_ns": "", **extra}}
+
+
+def _put(saver: MongoDBCheckpointer, config: dict, values: dict, versions: dict, step: int) -> dict:
+    """Store the next checkpoint after ``config``, as the graph loop does for one step."""
+    parent = saver.get_tuple(config) if "checkpoint_id" in config["configurable"] else None
+    checkpoint = create_checkpoint(parent.checkpoint, None, step) if parent else empty_checkpoint()
+    checkpoint["channel_values"] = {**checkpoint["channel_values"], **values}
+    checkpoint["channel_versions"] = {**checkpoint["channel_versions"], **versions}
+    return saver.put(config, checkpoint, {"source": "loop", "step": step}, versions)
+
+
+def test_put_and_get_tuple_rebuild_state_from_changed_channels(mongo_uri):
+    saver = MongoDBCheckpointer(mongo_uri)
+    first = _put(saver, _config(), {"messages": ["hi"], "summary": "none"}, {"messages": "1", "summary": "1"}, 0)
+    second = _put(saver, first, {"messages": ["hi", "hello"]}, {"messages": "2"}, 1)
+
+    latest = saver.get_tuple(_config())
+    assert latest.config == second
+    assert latest.parent_config == first
+    assert latest.checkpoint["channel_values"] == {"messages": ["hi", "hello"], "summary": "none"}
+    assert latest.metadata["step"] == 1
+    # The unchanged summary was stored once
+    assert saver.blobs.count_documents({"channel": "summary"}) == 1
+
+    earlier = saver.get_tuple(first)
+    assert earlier.checkpoint["channel_values"] == {"messages": ["hi"], "summary": "none"}
+    assert earlier.parent_config is None
+
+
+def test_pending_writes_are_returned_in_order_and_stored_once(mongo_uri):
+    saver = MongoDBCheckpointer(mongo_uri)
+    config = _put(saver, _config(), {"messages": ["hi"]}, {"messages": "1"}, 0)
+    saver.put_writes(config, [("messages", "a"), ("summary", "b")], task_id="task-2")
+    saver.put_writes(config, [("messages", "c")], task_id="task-1")
+    saver.put_writes(config, [("messages", "replayed")], task_id="task-1")
+
+    assert saver.get_tuple(config).pending_writes == [
+        ("task-1", "messages", "c"), ("task-2", "messages", "a"), ("task-2", "summary", "b")
+    ]
+
+
+def test_list_filters_limits_and_pages_newest_first(mongo_uri):
+    saver = MongoDBCheckpointer(mongo_uri)
+    config = _config()
+    ids = []
+    for step in range(4):
+        config = _put(saver, config, {"messages": [step]}, {"messages": str(step + 1)}, step)
+        ids.append(config["configurable"]["checkpoint_id"])
+
+    listed = [item.config["configurable"]["checkpoint_id"] for item in saver.list(_config())]
+    assert listed == ids[::-1]
+    assert [item.metadata["step"] for item in saver.list(_config(), filter={"step": 2})] == [2]
+    assert len(list(saver.list(_config(), limit=2))) == 2
+    before = [item.metadata["step"] for item in saver.list(_config(), before=_config(checkpoint_id=ids[2]))]
+    assert before == [1, 0]
+
+
+def test_threads_are_separated_by_user_and_deleted_per_user(mongo_uri):
+    saver = MongoDBCheckpointer(mongo_uri)
+    _put(saver, _config(user_id="alice"), {"messages": ["alice"]}, {"messages": "1"}, 0)
+    _put(saver, _config(user_id="bob"), {"messages": ["bob"]}, {"messages": "1"}, 0)
+
+    assert saver.get_tuple(_config(user_id="alice")).checkpoint["channel_values"] == {"messages": ["alice"]}
+
+    saver.delete_thread("t", user_id="alice")
+    assert saver.get_tuple(_config(user_id="alice")) is None
+    assert saver.get_tuple(_config(user_id="bob")).checkpoint["channel_values"] == {"messages": ["bob"]}
+    saver.delete_thread("t")
+    assert saver.get_tuple(_config(user_id="bob")) is None
+    assert saver.blobs.count_documents({}) == 0
+
+
+class CounterState(TypedDict):
+    turns: Annotated[List[str], operator.add]
+
+
+def test_compiled_graph_resumes_thread_state(mongo_uri):
+    builder = StateGraph(CounterState)
+    builder.add_node("answer", lambda state: {"turns": [f"answer {len(state['turns'])}"]})
+    builder.add_edge(START, "answer")
+    builder.add_edge("answer", END)
+    graph = builder.compile(checkpointer=MongoDBCheckpointer(mongo_uri))
+
+    graph.invoke({"turns": ["question"]}, _config())
+    result = graph.invoke({"turns": ["another question"]}, _config())
+
+    assert result["turns"] == ["question", "answer 1", "another question", "answer 3"]
+    assert graph.invoke({"turns": ["hi"]}, _config(thread_id="other"))["turns"] == ["hi", "answer 1"]
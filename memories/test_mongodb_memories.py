@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import Binary
+
+from memories.mongodb_memories import (
+    BUCKETED_STORAGE, EMBEDDED_STORAGE, ContentCodec, Message, MongoDBMemory, decode_content
+)
+
+
+def test_get_or_create_conversation_returns_the_thread_created_concurrently(mongo_uri):
+    memory = MongoDBMemory(mongo_uri)
+    existing_id = memory.add_message("u", "t", "user", "hello")
+
+    # The other first turn inserts between this call's lookup and its insert
+    find_one = memory.collection.find_one
+    lookups = []
+
+    def miss_first_lookup(*args, **kwargs):
+        lookups.append(args)
+        return None if len(lookups) == 1 else find_one(*args, **kwargs)
+
+    memory.collection.find_one = miss_first_lookup
+    conversation = memory.get_or_create_conversation("u", "t")
+
+    assert conversation.conversation_id == existing_id
+    assert [message.content for message in conversation.messages] == ["hello"]
+    assert memory.collection.count_documents({"user_id": "u", "thread_id": "t"}) == 1
+
+
+def _contents(memory: MongoDBMemory, thread_id: str = "t") -> list:
+    return [message.content for message in memory.get_conversation_messages("u", thread_id)]
+
+
+def test_bucketed_appends_span_buckets_in_order(mongo_uri):
+    memory = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+    for n in range(5):
+        memory.add_message("u", "t", "user", f"m{n}")
+
+    assert _contents(memory) == ["m0", "m1", "m2", "m3", "m4"]
+    assert [message.content for message in memory.get_conversation_messages("u", "t", limit=3)] == ["m2", "m3", "m4"]
+    assert memory.buckets.count_documents({}) == 3
+
+
+def test_migration_to_buckets_can_be_re_run(mongo_uri):
+    embedded = MongoDBMemory(mongo_uri)
+    for n in range(5):
+        embedded.add_message("u", "t", "user", f"m{n}")
+    bucketed = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+
+    assert bucketed.migrate_legacy_data()
+    assert bucketed.migrate_legacy_data()
+
+    assert _contents(bucketed) == ["m0", "m1", "m2", "m3", "m4"]
+    header = bucketed.collection.find_one({"thread_id": "t"})
+    assert "messages" not in header
+    assert header["storage"] == BUCKETED_STORAGE and header["message_count"] == 5
+
+
+def test_interrupted_migration_keeps_messages_appended_meanwhile(mongo_uri):
+    embedded = MongoDBMemory(mongo_uri)
+    for n in range(5):
+        embedded.add_message("u", "t", "user", f"m{n}")
+    bucketed = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+    # A run stopped right after switching the header; a live writer then appended seq 5,
+    # into the bucket the copy of m4 goes to
+    bucketed.collection.update_one({"thread_id": "t"}, {"$set": {"storage": BUCKETED_STORAGE}})
+    bucketed.add_message("u", "t", "user", "live")
+
+    assert bucketed.migrate_legacy_data()
+
+    assert _contents(bucketed) == ["m0", "m1", "m2", "m3", "m4", "live"]
+    bucketed.add_message("u", "t", "user", "next")
+    assert _contents(bucketed)[-2:] == ["live", "next"]
+
+
+def test_migration_skips_a_thread_changed_since_it_was_read(mongo_uri):
+    embedded = MongoDBMemory(mongo_uri)
+    for n in range(3):
+        embedded.add_message("u", "t", "user", f"m{n}")
+    bucketed = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+    find = bucketed.collection.find
+
+    def find_then_append(*args, **kwargs):
+        # Both memories share the collection; only the migration's read appends
+        bucketed.collection.find = find
+        docs = list(find(*args, **kwargs))
+        embedded.add_message("u", "t", "user", "m3")
+        return docs
+
+    bucketed.collection.find = find_then_append
+    bucketed._migrate_to_buckets()
+
+    header = embedded.collection.find_one({"thread_id": "t"})
+    assert header.get("storage") != BUCKETED_STORAGE
+    assert [message.content for message in embedded.get_conversation_messages("u", "t")] == ["m0", "m1", "m2", "m3"]
+    assert bucketed.buckets.count_documents({}) == 0
+
+
+LONG_ANSWER = "## Day 1\n- Walk through Alfama and ride tram 28.\n" * 100
+
+
+@pytest.mark.parametrize("algorithm", ["zlib", "zstd"])
+def test_codec_round_trips_long_content_and_keeps_short_content_as_text(algorithm):
+    if algorithm == "zstd":
+        pytest.importorskip("zstandard")
+    codec = ContentCodec(threshold=64, algorithm=algorithm)
+
+    stored = codec.encode(LONG_ANSWER)
+    assert isinstance(stored, Binary) and len(stored) < len(LONG_ANSWER)
+    assert decode_content(stored) == LONG_ANSWER
+    assert codec.encode("short reply") == "short reply"
+    assert decode_content("short reply") == "short reply"
+    assert codec.stats()["compressed_messages"] == 1
+
+
+def test_codec_stores_content_that_does_not_shrink_as_text():
+    codec = ContentCodec(threshold=8)
+
+    # At this size the zlib header and checksum outweigh any saving
+    assert codec.encode("xq7Zk2pW") == "xq7Zk2pW"
+    assert codec.stats()["compressed_messages"] == 0
+
+
+@pytest.mark.parametrize("storage_mode", [EMBEDDED_STORAGE, BUCKETED_STORAGE])
+def test_compressed_and_plain_messages_read_back_together(mongo_uri, storage_mode):
+    plain = MongoDBMemory(mongo_uri, storage_mode=storage_mode, codec=None)
+    compressed = MongoDBMemory(mongo_uri, storage_mode=storage_mode, codec=ContentCodec(threshold=64))
+    plain.add_message("u", "t", "user", LONG_ANSWER)
+    compressed.add_message("u", "t", "user", "thanks")
+    compressed.add_message("u", "t", "assistant", LONG_ANSWER)
+
+    for memory in (plain, compressed):
+        assert _contents(memory) == [LONG_ANSWER, "thanks", LONG_ANSWER]
+    stored = (compressed.buckets if storage_mode == BUCKETED_STORAGE else compressed.collection).find_one(
+        {"thread_id": "t"}, sort=[("bucket", -1)]
+    )["messages"]
+    assert [type(message["content"]) for message in stored[-2:]] == [str, Binary]
+    # Previews on the header are taken from the text, not the stored bytes
+    header = compressed.collection.find_one({"thread_id": "t"})
+    assert header["last_message"]["preview"].startswith("## Day 1")
+
+
+def _legacy_thread(mongo_uri, count: int = 5) -> MongoDBMemory:
+    """A thread as the single-document layout stored it, from before the listing fields existed."""
+    embedded = MongoDBMemory(mongo_uri)
+    for n in range(count):
+        embedded.add_message("u", "t", "user", f"m{n}")
+    embedded.collection.update_one({"thread_id": "t"}, {"$unset": {"message_count": "", "title": "", "last_message": ""}})
+    return embedded
+
+
+def test_bucketed_append_migrates_an_embedded_thread_first(mongo_uri):
+    _legacy_thread(mongo_uri)
+    bucketed = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+
+    bucketed.add_message("u", "t", "user", "new")
+
+    assert _contents(bucketed) == ["m0", "m1", "m2", "m3", "m4", "new"]
+    header = bucketed.collection.find_one({"thread_id": "t"})
+    assert "messages" not in header
+    assert header["storage"] == BUCKETED_STORAGE and header["message_count"] == 6
+    assert bucketed.collection.count_documents({"thread_id": "t"}) == 1
+
+
+def test_bucketed_reads_migrate_an_embedded_thread_first(mongo_uri):
+    _legacy_thread(mongo_uri)
+    bucketed = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+
+    assert _contents(bucketed) == ["m0", "m1", "m2", "m3", "m4"]
+    summary, summarized_count, total, messages = bucketed.get_thread_state("u", "t", limit=2)
+    assert total == 5 and [message.content for message in messages] == ["m3", "m4"]
+
+
+def test_migration_keeps_the_array_when_buckets_do_not_hold_it(mongo_uri):
+    embedded = _legacy_thread(mongo_uri)
+    bucketed = MongoDBMemory(mongo_uri, storage_mode=BUCKETED_STORAGE, bucket_size=2)
+    conversation_id = embedded.collection.find_one({"thread_id": "t"})["conversation_id"]
+    # Left by a bucketed append to a header that was never switched: seq 0 is taken by another message
+    bucketed.buckets.insert_one({"conversation_id": conversation_id, "bucket": 0, "user_id": "u", "thread_id": "t",
+                                 "messages": [{"role": "user", "content": "new", "seq": 0}]})
+
+    assert bucketed._migrate_to_buckets() == 0
+
+    header = embedded.collection.find_one({"thread_id": "t"})
+    assert len(header["messages"]) == 5
+    assert [message.content for message in embedded.get_conversation_messages("u", "t")] == ["m0", "m1", "m2", "m3", "m4"]
+    # Even past the switch, a bucket missing part of the copy leaves the array in place
+    embedded.collection.update_one({"thread_id": "t"}, {"$set": {"storage": BUCKETED_STORAGE, "message_count": 5}})
+    assert bucketed._migrate_to_buckets() == 0
+    assert len(embedded.collection.find_one({"thread_id": "t"})["messages"]) == 5
+
+
+def test_setup_merges_duplicates_and_makes_the_thread_index_unique(mongo_uri, capsys):
+    memory = MongoDBMemory(mongo_uri, auto_setup=False)
+    # As a deployment created before the index was unique, after a first-turn race
+    memory.collection.create_index([("user_id", 1), ("thread_id", 1)])
+    started = datetime(2025, 5, 1, 12, 0)
+    memory.append_message("u", "t", Message("user", "first", started))
+    memory.append_message("u", "t", Message("assistant", "first answer", started + timedelta(seconds=2)))
+    duplicate = memory.collection.find_one({"thread_id": "t"}, {"_id": 0})
+    duplicate.update(conversation_id=duplicate["conversation_id"] + "_race", created_at=started + timedelta(seconds=1),
+                     messages=[Message("user", "raced", started + timedelta(seconds=1)).to_dict()])
+    memory.collection.insert_one(duplicate)
+
+    MongoDBMemory(mongo_uri)._create_indexes()
+    assert "run python -m memories.admin setup" in capsys.readouterr().out
+
+    memory.setup_database()
+
+    assert [info.get("unique") for info in memory.collection.index_information().values()
+            if [field for field, _ in info["key"]] == ["user_id", "thread_id"]] == [True]
+    assert memory.collection.count_documents({"thread_id": "t"}) == 1
+    assert _contents(memory) == ["first", "raced", "first answer"]
+    assert memory.collection.find_one({"thread_id": "t"})["message_count"] == 3
+
+
+@pytest.mark.parametrize("storage_mode", [EMBEDDED_STORAGE, BUCKETED_STORAGE])
+def test_first_append_titles_a_conversation_created_empty(mongo_uri, storage_mode):
+    memory = MongoDBMemory(mongo_uri, storage_mode=storage_mode)
+    created = memory.get_or_create_conversation("u", "single")
+    memory.get_or_create_conversation("u", "bulk")
+
+    memory.add_message("u", "single", "user", "Plan a week in Lisbon")
+    memory.add_message("u", "single", "assistant", "Here is a plan")
+    assert memory.add_messages_bulk({("u", "bulk"): [Message("user", "A weekend in Porto", datetime.now(), id="m0")]}) == {}
+
+    headers = {header.thread_id: header for header in memory.list_conversations("u")[0]}
+    assert headers["single"].conversation_id == created.conversation_id
+    assert (headers["single"].title, headers["single"].message_count) == ("Plan a week in Lisbon", 2)
+    assert (headers["bulk"].title, headers["bulk"].message_count) == ("A weekend in Porto", 1)
+    assert _contents(memory, "single") == ["Plan a week in Lisbon", "Here is a plan"]
+    assert _contents(memory, "bulk") == ["A weekend in Porto"]
@@ -0,0 +1,181 @@
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from memories.memories import MemoryManager
+from memories.mongodb_memories import MongoDBMemory
+from memories.write_behind import WriteBehindQueue, close_write_behind_queues
+
+
+def _reject_thread(memory: MongoDBMemory, thread_id: str, calls: list) -> None:
+    """Make bulk writes reject every update for ``thread_id`` while applying the others."""
+    bulk_write = memory.collection.bulk_write
+
+    def partial_bulk_write(requests, ordered=True):
+        calls.append([request._filter["thread_id"] for request in requests])
+        rejected = [index for index, request in enumerate(requests) if request._filter["thread_id"] == thread_id]
+        accepted = [request for request in requests if request._filter["thread_id"] != thread_id]
+        if accepted:
+            bulk_write(accepted, ordered=False)
+        if rejected:
+            raise BulkWriteError({"writeErrors": [
+                {"index": index, "code": 10334, "errmsg": "document too large"} for index in rejected
+            ]})
+
+    memory.collection.bulk_write = partial_bulk_write
+
+
+def _stored_contents(memory: MongoDBMemory, thread_id: str) -> list:
+    return [message.content for message in memory.get_conversation_messages("u", thread_id)]
+
+
+def test_rejected_thread_is_retried_alone_then_dropped(mongo_uri):
+    memory = MongoDBMemory(mongo_uri)
+    calls = []
+    _reject_thread(memory, "bad", calls)
+    queue = WriteBehindQueue(memory, flush_interval=0.01, max_backoff=0.01, max_attempts=3)
+    try:
+        for thread_id in ("a", "bad", "b"):
+            queue.enqueue("u", thread_id, "user", f"hello {thread_id}")
+        assert queue.flush(timeout=5)
+        queue.enqueue("u", "a", "user", "after")
+        assert queue.flush(timeout=5)
+
+        # Messages that landed with the failed batch are not pushed again
+        assert _stored_contents(memory, "a") == ["hello a", "after"]
+        assert _stored_contents(memory, "b") == ["hello b"]
+        assert _stored_contents(memory, "bad") == []
+        assert calls[0] == ["a", "bad", "b"]
+        assert calls[1:3] == [["bad"], ["bad"]]
+        assert queue.stats()["dropped"] == 1
+    finally:
+        queue.close()
+
+
+def test_connection_failures_are_retried_without_dropping(mongo_uri):
+    memory = MongoDBMemory(mongo_uri)
+    bulk_write = memory.collection.bulk_write
+    failures = []
+
+    def flaky_bulk_write(requests, ordered=True):
+        if len(failures) < 4:
+            failures.append(1)
+            raise AutoReconnect("connection reset")
+        return bulk_write(requests, ordered=ordered)
+
+    memory.collection.bulk_write = flaky_bulk_write
+    queue = WriteBehindQueue(memory, flush_interval=0.01, max_backoff=0.01, max_attempts=2)
+    try:
+        queue.enqueue("u", "t", "user", "hello")
+        assert queue.flush(timeout=5)
+        assert _stored_contents(memory, "t") == ["hello"]
+        assert queue.stats()["dropped"] == 0
+    finally:
+        queue.close()
+
+
+def test_flusher_survives_a_long_outage(mongo_uri):
+    memory = MongoDBMemory(mongo_uri)
+    queue = WriteBehindQueue(memory, flush_interval=0.01, max_backoff=0.01)
+    try:
+        # As after ~1000 consecutive failures; 2 ** failures no longer fits a float
+        queue._failures = 5000
+        memory.collection.bulk_write = lambda *args, **kwargs: (_ for _ in ()).throw(AutoReconnect("down"))
+        queue.enqueue("u", "t", "user", "hello")
+        assert not queue.flush(("u", "t"), timeout=0.2)
+        assert queue._thread.is_alive()
+    finally:
+        queue.close(timeout=0.5)
+
+
+def test_flush_times_out_instead_of_blocking(mongo_uri):
+    manager = MemoryManager(mongo_uri, write_behind=True, flush_timeout=0.1)
+    manager.db.collection.bulk_write = lambda *args, **kwargs: (_ for _ in ()).throw(AutoReconnect("down"))
+    manager.save_message("u", "t", "user", "hello")
+
+    with pytest.raises(TimeoutError):
+        manager.get_conversation("u", "t")
+    manager.write_queue.close(timeout=0.5)
+
+
+def test_queued_messages_are_visible_before_they_are_written(mongo_uri):
+    manager = MemoryManager(mongo_uri, write_behind=True, cache_size=0)
+    try:
+        assert manager.save_message("u", "t", "user", "hello") == ""
+        assert [message.content for message in manager.get_conversation_messages("u", "t")] == ["hello"]
+        manager.flush()
+        assert [message.content for message in manager.db.get_conversation_messages("u", "t")] == ["hello"]
+    finally:
+        manager.write_queue.close()
+
+
+def test_save_message_returns_the_conversation_id_by_default(mongo_uri):
+    manager = MemoryManager(mongo_uri)
+
+    assert manager.write_queue is None
+    conversation_id = manager.save_message("u", "t", "user", "hello")
+    assert conversation_id == manager.get_conversation("u", "t").conversation_id
+
+
+def _lose_reply_once(collection, method: str, calls: list) -> None:
+    """Apply the first ``method`` call, then fail it as if the connection dropped before the reply."""
+    original = getattr(collection, method)
+
+    def applied_then_lost(*args, **kwargs):
+        result = original(*args, **kwargs)
+        if not calls:
+            calls.append(method)
+            raise AutoReconnect("connection reset after the write")
+        return result
+
+    setattr(collection, method, applied_then_lost)
+
+
+@pytest.mark.parametrize("storage_mode, collection, method", [
+    ("embedded", "collection", "bulk_write"),
+    ("bucketed", "collection", "find_one_and_update"),
+    ("bucketed", "buckets", "bulk_write"),
+])
+def test_retry_after_a_lost_reply_stores_each_message_once(mongo_uri, storage_mode, collection, method):
+    memory = MongoDBMemory(mongo_uri, storage_mode=storage_mode, bucket_size=2)
+    memory.add_message("u", "a", "user", "stored before")
+    calls = []
+    _lose_reply_once(getattr(memory, collection), method, calls)
+    queue = WriteBehindQueue(memory, flush_interval=0.01, max_backoff=0.01)
+    try:
+        for thread_id in ("a", "b"):
+            for n in range(3):
+                queue.enqueue("u", thread_id, "user", f"{thread_id}{n}")
+        assert queue.flush(timeout=5)
+        queue.enqueue("u", "a", "user", "after")
+        assert queue.flush(timeout=5)
+    finally:
+        queue.close()
+
+    assert calls == [method]
+    assert _stored_contents(memory, "a") == ["stored before", "a0", "a1", "a2", "after"]
+    assert _stored_contents(memory, "b") == ["b0", "b1", "b2"]
+    assert memory.get_thread_state("u", "a")[2] == 5
+    if storage_mode == "bucketed":
+        seqs = sorted(message["seq"] for bucket in memory.buckets.find({"thread_id": "a"}) for message in bucket["messages"])
+        assert seqs == [0, 1, 2, 3, 4]
+
+
+def test_managers_of_one_collection_share_the_cache_and_the_queue(mongo_uri):
+    queued = MemoryManager(mongo_uri, write_behind=True, cache_size=10)
+    direct = MemoryManager(mongo_uri, write_behind=False, cache_size=1000)
+    uncached = MemoryManager(mongo_uri, write_behind=False, cache_size=0)
+    try:
+        assert queued.cache is direct.cache and queued.cache.max_entries == 1000
+        assert direct.get_conversation_messages("u", "t") == []
+        # Hold the flusher off the thread so the message stays queued
+        queued.write_queue.begin_read(("u", "t"))
+        queued.save_message("u", "t", "user", "queued")
+        assert [message.content for message in direct.get_conversation_messages("u", "t")] == ["queued"]
+        assert [message.content for message in uncached.get_conversation_messages("u", "t")] == ["queued"]
+        queued.write_queue.end_read(("u", "t"))
+
+        # A direct write lands after the messages queued before it
+        uncached.save_message("u", "t", "assistant", "direct")
+        assert _stored_contents(uncached.db, "t") == ["queued", "direct"]
+    finally:
+        close_write_behind_queues()
@@ -0,0 +1,271 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo.errors import ConnectionFailure
+from utils.env import load_environment
+from .mongodb_memories import Message, MongoDBMemory
+
+load_environment()
+
+ThreadKey = Tuple[str, str]
+
+# MemoryManager queues message saves only when enabled (MEMORY_WRITE_BEHIND=1)
+DEFAULT_WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "").strip().lower() in ("1", "true", "yes", "on")
+
+_registry_lock = threading.Lock()
+_queues: Dict[Tuple[Any, ...], "WriteBehindQueue"] = {}
+
+
+class WriteBehindQueue:
+    """Buffers message writes and persists them from a background flusher thread.
+
+    ``enqueue`` only appends to an in-process buffer, so saving a message
+    costs no round trip on the request path. Every ``flush_interval`` seconds
+    the flusher takes whatever is pending across all threads and writes it
+    with ``MongoDBMemory.add_messages_bulk``: one ``bulk_write`` per batch,
+    one ordered ``$push`` per conversation thread.
+
+    Ordering is kept per thread: a thread's messages are never split across
+    two concurrent writes. Only the threads whose writes failed are put back,
+    in front of anything queued since, and retried with backoff. A thread that
+    failed is retried in a batch of its own, so a message Mongo rejects cannot
+    hold up other threads; after ``max_attempts`` rejections its messages are
+    dropped with a warning. Connection failures are retried until they clear;
+    queued messages carry ids, so a retry never stores a message twice.
+    Readers pin a thread with ``begin_read`` so the flusher leaves it alone
+    while they combine the stored messages with ``pending`` ones.
+    """
+
+    def __init__(self, memory: MongoDBMemory, flush_interval: float = 0.05, max_batch: int = 500,
+                 max_backoff: float = 5.0, max_attempts: int = 5):
+        self.memory = memory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._pending: "OrderedDict[ThreadKey, List[Message]]" = OrderedDict()
+        self._inflight: Dict[ThreadKey, int] = {}
+        self._readers: Dict[ThreadKey, int] = {}
+        # Failed writes per thread, counting only errors other than lost connections
+        self._attempts: Dict[ThreadKey, int] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._failures = 0
+        self._written = 0
+        self._batches = 0
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, user_id: str, thread_id: str, role: str, content: str,
+                metadata: Optional[Dict[str, Any]] = None) -> Message:
+        """Queue a message for the thread; it is written by the next flush. Returns the queued message."""
+        message = Message(role=role, content=content, timestamp=datetime.now(), metadata=metadata or {},
+                          id=uuid.uuid4().hex)
+        with self._condition:
+            if not self._closed:
+                self._pending.setdefault((user_id, thread_id), []).append(message)
+                return message
+        # After shutdown there is no flusher left; write through instead
+        failed = self.memory.add_messages_bulk({(user_id, thread_id): [message]})
+        if failed:
+            print(f"Warning: message for thread {(user_id, thread_id)} was not persisted: {failed[(user_id, thread_id)]}")
+        return message
+
+    def pending(self, key: ThreadKey) -> List[Message]:
+        """Messages queued for the thread and not yet persisted, oldest first."""
+        with self._condition:
+            return list(self._pending.get(key, ()))
+
+    def begin_read(self, key: ThreadKey, block: bool = True) -> bool:
+        """Pin the thread for a read: wait out any write in flight and hold off new ones.
+
+        With ``block=False`` returns False instead of waiting (for callers on
+        an event loop). Every successful call must be paired with end_read.
+        """
+        with self._condition:
+            if key in self._inflight:
+                if not block:
+                    return False
+                self._condition.wait_for(lambda: key not in self._inflight)
+            self._readers[key] = self._readers.get(key, 0) + 1
+            return True
+
+    def end_read(self, key: ThreadKey) -> None:
+        """Release a pin taken with begin_read."""
+        with self._condition:
+            remaining = self._readers.get(key, 0) - 1
+            if remaining > 0:
+                self._readers[key] = remaining
+            else:
+                self._readers.pop(key, None)
+            self._condition.notify_all()
+
+    def discard(self, key: ThreadKey) -> int:
+        """Drop the thread's queued messages (its conversation is being deleted); returns how many."""
+        with self._condition:
+            self._attempts.pop(key, None)
+            return len(self._pending.pop(key, ()))
+
+    def flush(self, key: Optional[ThreadKey] = None, timeout: Optional[float] = None) -> bool:
+        """Block until the thread's (or every) queued message is persisted.
+
+        Returns False if ``timeout`` expired first.
+        """
+        def done() -> bool:
+            if key is None:
+                return not self._pending and not self._inflight
+            return key not in self._pending and key not in self._inflight
+
+        with self._condition:
+            self._condition.notify_all()
+            return self._condition.wait_for(done, timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush what is queued and stop the flusher thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        with self._condition:
+            dropped = sum(len(messages) for messages in self._pending.values())
+        if dropped:
+            print(f"Warning: {dropped} queued messages were not persisted before shutdown")
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring: messages queued, in flight, written, dropped and batches flushed."""
+        with self._condition:
+            return {
+                "pending": sum(len(messages) for messages in self._pending.values()),
+                "inflight": sum(self._inflight.values()),
+                "written": self._written,
+                "dropped": self._dropped,
+                "batches": self._batches
+            }
+
+    def _take_batch(self) -> Dict[ThreadKey, List[Message]]:
+        """Pop whole per-thread queues, oldest thread first, skipping pinned threads.
+
+        A thread whose write was rejected before is flushed on its own.
+        """
+        batch: Dict[ThreadKey, List[Message]] = {}
+        size = 0
+        for key in list(self._pending):
+            if size >= self.max_batch:
+                break
+            if self._readers.get(key):
+                continue
+            retrying = key in self._attempts
+            if retrying and batch:
+                continue
+            messages = self._pending.pop(key)
+            batch[key] = messages
+            self._inflight[key] = len(messages)
+            size += len(messages)
+            if retrying:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._closed:
+                    self._condition.wait(self.flush_interval)
+                batch = self._take_batch()
+                if not batch:
+                    if self._closed and not self._pending:
+                        return
+                    if self._closed:
+                        # Only pinned threads are left; let their readers finish
+                        self._condition.wait(self.flush_interval)
+                    continue
+
+            try:
+                failed = self.memory.add_messages_bulk(batch)
+                counted = True
+            except Exception as e:
+                # Which writes landed is unknown: the whole batch is retried, and the message
+                # ids make add_messages_bulk skip the threads whose writes did land
+                failed = {key: str(e) for key in batch}
+                counted = not isinstance(e, ConnectionFailure)
+            if failed:
+                print(f"Warning: write-behind flush failed for {len(failed)} thread(s): "
+                      f"{next(iter(failed.values()))}")
+
+            with self._condition:
+                self._settle(batch, failed, counted)
+                delay = min(self.flush_interval * 2 ** min(self._failures, 16), self.max_backoff)
+            if failed:
+                if self._closed and self._failures > 3:
+                    return
+                time.sleep(delay)
+
+    def _settle(self, batch: Dict[ThreadKey, List[Message]], failed: Dict[ThreadKey, str], counted: bool) -> None:
+        """Record a flushed batch: requeue the failed threads and drop those out of attempts. Caller holds the lock."""
+        for key, messages in batch.items():
+            self._inflight.pop(key, None)
+            if key not in failed:
+                self._attempts.pop(key, None)
+                self._written += len(messages)
+                continue
+            attempts = self._attempts.get(key, 0) + (1 if counted else 0)
+            if attempts >= self.max_attempts:
+                self._attempts.pop(key, None)
+                self._dropped += len(messages)
+                print(f"Warning: dropped {len(messages)} messages for thread {key} "
+                      f"after {attempts} rejected writes: {failed[key]}")
+                continue
+            if attempts:
+                self._attempts[key] = attempts
+            # Failed messages go back ahead of anything queued meanwhile
+            self._pending[key] = messages + self._pending.get(key, [])
+            self._pending.move_to_end(key, last=False)
+        if len(failed) < len(batch):
+            self._batches += 1
+        self._failures = self._failures + 1 if failed else 0
+        self._condition.notify_all()
+
+
+def _queue_key(memory: MongoDBMemory) -> Tuple[Any, ...]:
+    return memory.connection_string, memory.database_name, memory.collection_name, memory.storage_mode
+
+
+def find_write_behind_queue(memory: MongoDBMemory) -> Optional[WriteBehindQueue]:
+    """Return the queue already started for the memory's collections, if any."""
+    return _queues.get(_queue_key(memory))
+
+
+def get_write_behind_queue(memory: MongoDBMemory) -> WriteBehindQueue:
+    """Return the process-wide queue for the memory's collections, starting it on first use.
+
+    One flusher per storage target lets writes from every workflow in the
+    process share batches; the first memory to start it does the writes.
+    """
+    key = _queue_key(memory)
+    queue = _queues.get(key)
+    if queue is not None:
+        return queue
+
+    with _registry_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = WriteBehindQueue(memory)
+            _queues[key] = queue
+        return queue
+
+
+def close_write_behind_queues() -> None:
+    """Flush and stop every registered queue (e.g. before closing Mongo clients)."""
+    with _registry_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.close()
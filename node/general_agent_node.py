@@ -1,16 +1,15 @@
 from state.state import State
-from tools.general_agent import general_agent
-from utils.llm import LLMConfig
-from dotenv import load_dotenv, find_dotenv
-from typing import Dict, Any, List
+from tools.general_agent import stream_general_agent, astream_general_agent
+from utils.streaming import collect_tokens, acollect_tokens
+from utils.context_builder import ContextBuilder
+from utils import tracing
+from typing import Dict, Any, List, Tuple
 
-load_dotenv(find_dotenv())
+context_builder = ContextBuilder.for_agent()
 
-llm_client = LLMConfig.create_fast_config().create_llm()
 
-
-def general_talk(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Perform a general talk with a user using a basic llm model"""
+def _prepare(state: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    """Copy the state and work out which message to answer."""
     
     # Work with a copy to avoid modifying the original
     state_dict = state.copy()
@@ -37,32 +36,34 @@ def general_talk(state: Dict[str, Any]) -> Dict[str, Any]:
     # Fallback to query if still no message
     if not current_message:
         current_message = state_dict.get("query", "")
+
+    return state_dict, messages, current_message
+
+
+def _history(state_dict: Dict[str, Any], messages: List[Dict[str, Any]], current_message: str) -> str:
+    """Token-budgeted history for the prompt, without the message being answered."""
+    prior = messages
+    if prior and prior[-1].get("role") == "user" and prior[-1].get("content") == current_message:
+        prior = prior[:-1]
+    return context_builder.build(prior, current_message, state_dict.get("summary"))
+
+
+def _finish(state_dict: Dict[str, Any], messages: List[Dict[str, Any]], current_message: str,
+            response: str) -> Dict[str, Any]:
+    """Record the exchange in the state copy."""
     
-    # Use general_agent tool to process the message
-    if current_message:
-        response = general_agent(current_message)
-    else:
-        response = "I didn't receive any message to respond to."
-    
-    # Ensure messages list exists
-    if "messages" not in state_dict:
-        state_dict["messages"] = []
-    
-    # Type-safe access to messages list
-    messages_list = state_dict["messages"]
-    if not isinstance(messages_list, list):
-        messages_list = []
-        state_dict["messages"] = messages_list
+    # Extend the normalized copy, never the incoming state's list (it may be a checkpointed value)
+    state_dict["messages"] = messages
     
     # Add user message if it doesn't exist
     if current_message and (not messages or messages[-1].get("role") != "user"):
-        messages_list.append({
+        messages.append({
             "role": "user",
             "content": current_message
         })
     
     # Add assistant response
-    messages_list.append({
+    messages.append({
         "role": "assistant",
         "content": response
     })
@@ -70,4 +71,33 @@ def general_talk(state: Dict[str, Any]) -> Dict[str, Any]:
     # Store the response in state
     state_dict["response"] = response
     
-    return state_dict
\ No newline at end of file
+    return state_dict
+
+
+@tracing.traced("node.general_talk")
+def general_talk(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Perform a general talk with a user using a basic llm model"""
+    state_dict, messages, current_message = _prepare(state)
+    
+    # Stream the answer; tokens reach LangGraphWorkflow.stream() as they arrive
+    if current_message:
+        history = _history(state_dict, messages, current_message)
+        response = collect_tokens(stream_general_agent(current_message, history))
+    else:
+        response = "I didn't receive any message to respond to."
+
+    return _finish(state_dict, messages, current_message, response)
+
+
+@tracing.traced("node.general_talk")
+async def ageneral_talk(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of general_talk for the asyncio workflow path"""
+    state_dict, messages, current_message = _prepare(state)
+
+    if current_message:
+        history = _history(state_dict, messages, current_message)
+        response = await acollect_tokens(astream_general_agent(current_message, history))
+    else:
+        response = "I didn't receive any message to respond to."
+
+    return _finish(state_dict, messages, current_message, response)
@@ -1,32 +1,53 @@
-from tools.internet_search_agent import search
+from tools.internet_search_agent import stream_search, astream_search
 from state.state import State
+from utils.streaming import collect_tokens, acollect_tokens
+from utils import tracing
 from typing import Union
 
 
 
-def internet_search(state: Union[State, dict]) -> dict:
-    """Perform a general talk with a user using a basic llm model"""
-
+def _prepare(state: Union[State, dict]) -> dict:
     # Convert to dict - State is already dict-like (TypedDict)
     if hasattr(state, 'get'):
-        state_dict = dict(state)
-    else:
-        state_dict = state
+        return dict(state)
+    return state
 
-    # Get the current message
-    messages = state_dict.get("messages", [])
-    current_message = messages[-1]["content"] if messages else ""
 
-    # Use general_agent tool to process the message
-    response = search(current_message)
+def _current_message(state_dict: dict) -> str:
+    # Prefer the question being answered; history loaded by the workflow may end with an assistant reply
+    if state_dict.get("user_question"):
+        return state_dict["user_question"]
+    messages = state_dict.get("messages", [])
+    return messages[-1]["content"] if messages else ""
 
-    # Add the response to messages
-    if "message" not in state_dict:
-        state_dict["messages"] = []
 
-    state_dict["messages"].append({
+def _finish(state_dict: dict, response: str) -> dict:
+    # Add the response to a new messages list; the incoming one belongs to the caller's state
+    state_dict["messages"] = [*state_dict.get("messages", []), {
         "role": "assistant",
         "content": response
-    })
+    }]
+
+    # Store the response in state so it is persisted like general answers
+    state_dict["response"] = response
 
     return state_dict
+
+
+@tracing.traced("node.internet_search")
+def internet_search(state: Union[State, dict]) -> dict:
+    """Perform a general talk with a user using a basic llm model"""
+    state_dict = _prepare(state)
+
+    # Stream the Perplexity answer; tokens reach LangGraphWorkflow.stream() as they arrive
+    response = collect_tokens(stream_search(_current_message(state_dict)))
+
+    return _finish(state_dict, response)
+
+
+@tracing.traced("node.internet_search")
+async def ainternet_search(state: Union[State, dict]) -> dict:
+    """Async variant of internet_search that does not block the event loop"""
+    state_dict = _prepare(state)
+    response = await acollect_tokens(astream_search(_current_message(state_dict)))
+    return _finish(state_dict, response)
@@ -1,6 +1,3 @@
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
-
 GENERAL_AGENT_PROMPT = """
                         You are a highly intelligent and capable AI agent designed to assist users with a wide range of tasks. 
                         You have access to various tools and resources to help you achieve your goals effectively.
@@ -14,13 +11,18 @@ GENERAL_AGENT_PROMPT = """
                         """
 
 
-general_agent_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", GENERAL_AGENT_PROMPT),
-        ("user", "{query}"),
-        MessagesPlaceholder(variable_name="messages"),
-        ("assistant", "{response}"),
-    ]
-)
-
+def __getattr__(name: str):
+    # Built on first access so importing the prompt text does not import langchain_core.prompts
+    if name == "general_agent_prompt":
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+        globals()[name] = ChatPromptTemplate.from_messages(
+            [
+                ("system", GENERAL_AGENT_PROMPT),
+                ("user", "{query}"),
+                MessagesPlaceholder(variable_name="messages"),
+                ("assistant", "{response}"),
+            ]
+        )
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
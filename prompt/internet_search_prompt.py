@@ -1,5 +1,3 @@
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
 INTERNET_SEARCH_PROMPT = """
 You are an expert travel planning assistant. Create comprehensive travel plans with detailed budgets and itineraries.
 
@@ -18,11 +16,18 @@ Provide current 2025 prices and requirements. Include location-specific details
 Format your response with clear sections and specific cost estimates.
 """
 
-internet_search_agent = ChatPromptTemplate.from_messages(
-    [
-        ("system", INTERNET_SEARCH_PROMPT),
-        ("user", "{query}"),
-        MessagesPlaceholder(variable_name="messages"),
-        ("assistant", "{response}"),
-    ]
-)
\ No newline at end of file
+def __getattr__(name: str):
+    # Built on first access so importing the prompt text does not import langchain_core.prompts
+    if name == "internet_search_agent":
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+        globals()[name] = ChatPromptTemplate.from_messages(
+            [
+                ("system", INTERNET_SEARCH_PROMPT),
+                ("user", "{query}"),
+                MessagesPlaceholder(variable_name="messages"),
+                ("assistant", "{response}"),
+            ]
+        )
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
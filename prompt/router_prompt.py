@@ -0,0 +1,10 @@
+ROUTER_PROMPT = """Given the user's question and conversation history, determine which agent would be most appropriate to handle it:
+        - Use 'general' for general conversation, basic questions, or tasks not requiring external data
+        - Use 'internet_search' if the question requires current information, fact checking, or web search
+
+        Conversation History:
+        {history_context}
+
+        Current Question: {current_question}
+
+        Respond with just the agent type: either 'general' or 'internet_search'"""
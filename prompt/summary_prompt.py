@@ -0,0 +1,12 @@
+SUMMARY_PROMPT = """Update the running summary of a travel-planning conversation with the new messages below.
+        Keep every fact the assistant will need later: destinations, dates and trip length, budget, travellers,
+        preferences, bookings or decisions made, and open questions. Drop greetings and repetition.
+        Write at most {max_words} words of plain prose.
+
+        Current Summary:
+        {summary}
+
+        New Messages:
+        {messages}
+
+        Respond with just the updated summary."""
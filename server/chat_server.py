@@ -0,0 +1,340 @@
+"""Multi-session chat server: many (user_id, thread_id) conversations in one process.
+
+HTTP:
+    POST /chat     {"user_id": ..., "thread_id": ..., "message": ...} -> {"response": ...}
+    GET  /health   session, turn and speculation counters
+    GET  /metrics  Prometheus text, when METRICS_PORT tracing is enabled
+WebSocket:
+    /ws?user_id=...&thread_id=...  send {"message": ...}; receive {"type": "token", "text": ...}
+                                   events, then {"type": "done", "response": ...}
+
+A session turn that would exceed the limits is rejected with HTTP 429 (or a
+WebSocket {"type": "error", "error": "overloaded"} event).
+
+Usage:
+    python -m server.chat_server --port 8000 --max-concurrent-turns 64
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from memories.memories import MemoryManager
+from utils import tracing
+from utils.conversion_summarizer import ConversationSummarizer
+from utils.env import load_environment
+from workflow.agent_router import get_default_router
+from workflow.langgraph_workflow import LangGraphWorkflow
+from workflow.speculation import DEFAULT_SPECULATION, SpeculationPolicy, get_speculator
+
+load_environment()
+
+SessionKey = Tuple[str, str]
+
+
+class Overloaded(Exception):
+    """The turn was not queued because the server or the session is at capacity."""
+
+
+class TurnLimiter:
+    """Runs at most ``max_concurrent`` turns at once; rejects a turn when ``max_pending`` are already waiting."""
+
+    def __init__(self, max_concurrent: int = 64, max_pending: int = 256):
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(f"{self.waiting} turns already waiting")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+
+@dataclass
+class Session:
+    """One conversation's workflow; its turns run one at a time, in arrival order."""
+    workflow: Any
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+    # Turns running or queued on this session; it is never evicted while non-zero
+    active: int = 0
+    turns: int = 0
+
+
+class SessionManager:
+    """Per-(user_id, thread_id) sessions, evicted when idle or when over ``max_sessions``.
+
+    Conversation history lives in MongoDB, so an evicted session is simply
+    rebuilt by ``factory`` on its next turn. Everything runs on the event loop
+    thread, so no locking is needed.
+    """
+
+    def __init__(self, factory: Callable[[str, str], Any], max_sessions: int = 10000,
+                 idle_timeout: float = 900.0, max_queued_per_session: int = 4):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_queued_per_session = max_queued_per_session
+        self._sessions: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: str, thread_id: str) -> Session:
+        key = (user_id, thread_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = Session(self.factory(user_id, thread_id))
+            self._sessions[key] = session
+            self.created += 1
+            self._evict_over_capacity()
+        else:
+            self._sessions.move_to_end(key)
+        return session
+
+    @asynccontextmanager
+    async def turn(self, user_id: str, thread_id: str) -> AsyncIterator[Any]:
+        """Hold the session for one turn, yielding its workflow."""
+        session = self.get(user_id, thread_id)
+        if session.active >= self.max_queued_per_session:
+            raise Overloaded(f"{session.active} turns already queued for this session")
+        session.active += 1
+        try:
+            async with session.lock:
+                yield session.workflow
+                session.turns += 1
+        finally:
+            session.active -= 1
+            session.last_used = time.monotonic()
+
+    def _evict_over_capacity(self) -> None:
+        # Least recently used first; busy sessions are skipped, so the limit can be exceeded briefly
+        for key in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                return
+            if not self._sessions[key].active:
+                del self._sessions[key]
+                self.evicted += 1
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop sessions unused for ``idle_timeout`` seconds; returns how many were dropped."""
+        cutoff = (time.monotonic() if now is None else now) - self.idle_timeout
+        idle = [key for key, session in self._sessions.items() if not session.active and session.last_used < cutoff]
+        for key in idle:
+            del self._sessions[key]
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def sweep(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "created": self.created, "evicted": self.evicted}
+
+
+class ChatServer:
+    """Serves workflow turns for many sessions over one set of shared clients.
+
+    The memory manager (MongoDB pool, conversation cache, optional write-behind queue),
+    router, summarizer and semantic cache are shared by every session; pass
+    stand-ins to load test without OpenAI, Perplexity or MongoDB.
+    """
+
+    def __init__(self, memory_manager=None, router=None, summarizer=None, semantic_cache=None, checkpointer=None,
+                 max_sessions: int = 10000, idle_timeout: float = 900.0, max_concurrent_turns: int = 64,
+                 max_pending_turns: int = 256, max_queued_per_session: int = 4,
+                 speculation: Optional[SpeculationPolicy] = DEFAULT_SPECULATION):
+        self.memory_manager = memory_manager or MemoryManager(os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+        self.router = router or get_default_router()
+        self.summarizer = summarizer or ConversationSummarizer()
+        self.semantic_cache = semantic_cache
+        # Optional LangGraph checkpointer; sessions then resume their graph state from it
+        self.checkpointer = checkpointer
+        # Optional: sessions start the likely agent while the LLM router is still deciding
+        self.speculation = speculation
+        self.sessions = SessionManager(self._new_workflow, max_sessions, idle_timeout, max_queued_per_session)
+        self.limiter = TurnLimiter(max_concurrent_turns, max_pending_turns)
+
+    def _new_workflow(self, user_id: str, thread_id: str) -> LangGraphWorkflow:
+        return LangGraphWorkflow(user_id, thread_id, memory_manager=self.memory_manager, router=self.router,
+                                 semantic_cache=self.semantic_cache, summarizer=self.summarizer,
+                                 checkpointer=self.checkpointer, speculation=self.speculation)
+
+    async def run_turn(self, user_id: str, thread_id: str, message: str) -> Dict[str, Any]:
+        """Answer one message; raises Overloaded instead of queueing past the limits."""
+        # Waiting behind the session's previous turn does not hold one of the global slots
+        async with self.sessions.turn(user_id, thread_id) as workflow:
+            async with self.limiter.slot():
+                return await workflow.arun({"user_question": message})
+
+    async def stream_turn(self, user_id: str, thread_id: str, message: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Like run_turn, yielding ("token", text) pairs and finally ("result", state)."""
+        async with self.sessions.turn(user_id, thread_id) as workflow:
+            async with self.limiter.slot():
+                async for event in workflow.astream({"user_question": message}):
+                    yield event
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            **self.sessions.stats(),
+            "running": self.limiter.running,
+            "waiting": self.limiter.waiting,
+            "rejected": self.limiter.rejected,
+        }
+        if self.speculation is not None:
+            stats["speculation"] = get_speculator(self.speculation).stats()
+        return stats
+
+    async def chat(self, request: Request) -> Response:
+        try:
+            body = await request.json()
+            user_id, thread_id, message = str(body["user_id"]), str(body["thread_id"]), str(body["message"])
+        except (ValueError, KeyError, TypeError):
+            return JSONResponse({"error": "expected JSON with user_id, thread_id and message"}, status_code=400)
+        try:
+            result = await self.run_turn(user_id, thread_id, message)
+        except Overloaded as e:
+            return JSONResponse({"error": "overloaded", "detail": str(e)}, status_code=429,
+                                headers={"Retry-After": "1"})
+        except Exception as e:
+            print(f"Error serving turn for {user_id}/{thread_id}: {e}")
+            return JSONResponse({"error": "turn failed"}, status_code=500)
+        return JSONResponse({"user_id": user_id, "thread_id": thread_id, "response": result.get("response", "")})
+
+    async def websocket(self, websocket: WebSocket) -> None:
+        user_id = websocket.query_params.get("user_id")
+        thread_id = websocket.query_params.get("thread_id")
+        if not user_id or not thread_id:
+            await websocket.close(code=1008, reason="user_id and thread_id query parameters are required")
+            return
+        await websocket.accept()
+        try:
+            while True:
+                data = await websocket.receive_json()
+                message = data.get("message") if isinstance(data, dict) else None
+                if not message:
+                    await websocket.send_json({"type": "error", "error": "expected {\"message\": ...}"})
+                    continue
+                try:
+                    # Closed explicitly so a disconnect releases the session right away
+                    async with aclosing(self.stream_turn(user_id, thread_id, str(message))) as events:
+                        async for kind, value in events:
+                            if kind == "token":
+                                await websocket.send_json({"type": "token", "text": value})
+                            else:
+                                await websocket.send_json({"type": "done", "response": value.get("response", "")})
+                except Overloaded as e:
+                    await websocket.send_json({"type": "error", "error": "overloaded", "detail": str(e)})
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    print(f"Error serving turn for {user_id}/{thread_id}: {e}")
+                    await websocket.send_json({"type": "error", "error": "turn failed"})
+        except WebSocketDisconnect:
+            pass
+
+    async def health(self, request: Request) -> Response:
+        return JSONResponse(self.stats())
+
+    async def metrics(self, request: Request) -> Response:
+        for exporter in tracing.tracer.exporters:
+            if isinstance(exporter, tracing.PrometheusMetrics):
+                return PlainTextResponse(exporter.render(), media_type="text/plain; version=0.0.4")
+        return PlainTextResponse("tracing metrics are disabled; set METRICS_PORT\n", status_code=404)
+
+    def app(self, sweep_interval: float = 30.0) -> Starlette:
+        """ASGI application serving this server's routes."""
+        @asynccontextmanager
+        async def lifespan(app: Starlette):
+            sweeper = asyncio.create_task(self.sessions.sweep(sweep_interval))
+            try:
+                yield
+            finally:
+                sweeper.cancel()
+                # Persist queued messages before the process exits
+                flush = getattr(self.memory_manager, "aflush", None)
+                if flush is not None:
+                    await flush()
+
+        return Starlette(
+            routes=[
+                Route("/chat", self.chat, methods=["POST"]),
+                Route("/health", self.health, methods=["GET"]),
+                Route("/metrics", self.metrics, methods=["GET"]),
+                WebSocketRoute("/ws", self.websocket),
+            ],
+            lifespan=lifespan
+        )
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("CHAT_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("CHAT_SERVER_PORT", "8000")))
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--idle-timeout", type=float, default=900.0, help="seconds before an unused session is dropped")
+    parser.add_argument("--max-concurrent-turns", type=int, default=64)
+    parser.add_argument("--max-pending-turns", type=int, default=256, help="waiting turns before new ones get 429")
+    parser.add_argument("--max-queued-per-session", type=int, default=4)
+    parser.add_argument("--checkpoints", action="store_true",
+                        help="keep each session's graph state in MongoDB (MongoDBCheckpointer)")
+    parser.add_argument("--speculation", choices=["off", "likely", "both"],
+                        help="start agents while the LLM router decides (default: SPECULATION)")
+    args = parser.parse_args()
+
+    speculation = DEFAULT_SPECULATION
+    if args.speculation is not None:
+        speculation = SpeculationPolicy(args.speculation) if args.speculation != "off" else None
+
+    checkpointer = None
+    if args.checkpoints:
+        from memories.mongodb_checkpointer import MongoDBCheckpointer
+
+        checkpointer = MongoDBCheckpointer(os.getenv("MONGODB_URI", "mongodb://localhost:27017/"))
+
+    server = ChatServer(
+        checkpointer=checkpointer,
+        speculation=speculation,
+        max_sessions=args.max_sessions,
+        idle_timeout=args.idle_timeout,
+        max_concurrent_turns=args.max_concurrent_turns,
+        max_pending_turns=args.max_pending_turns,
+        max_queued_per_session=args.max_queued_per_session
+    )
+    tracing.serve_metrics()
+    uvicorn.run(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
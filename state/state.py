@@ -11,4 +11,5 @@ class State(TypedDict, total=False):
     response: Optional[str]
     search_results: Optional[List[Dict[str, Any]]]
     timestamp: Optional[str]
-    user_question: Optional[str]
\ No newline at end of file
+    user_question: Optional[str]
+    summary: Optional[str]  # Rolling summary of turns no longer carried in messages
@@ -1,21 +1,16 @@
-from langchain.tools import tool
-from utils.llm import LLMConfig
-from typing import Annotated
-from dotenv import load_dotenv, find_dotenv
+from utils.llm import LLMConfig, get_llm
+from utils import tracing
+from typing import Annotated, AsyncIterator, Iterator, Optional
 
-load_dotenv(find_dotenv())
+# Replaces the shared fast client when set (benchmarks inject a fake model here)
+llm_client = None
 
-llm_client = LLMConfig.create_fast_config().create_llm()
 
-@tool
-def general_agent(query: Annotated[str, "The search query"]) -> str:
-    """Perform a general talk with a user using a basic llm model"""
+def _llm():
+    return llm_client if llm_client is not None else get_llm(LLMConfig.create_fast_config())
 
-    print("[General Agent] Processing query...")
 
-    # Use LLM to generate a response
-    response = llm_client.invoke(input=query)
-    print(f"Passing query to GENERAL AGENT: {response.content}")
+def _response_text(response) -> str:
     # Ensure the return value is always a string
     if isinstance(response.content, str):
         return response.content
@@ -23,4 +18,65 @@ def general_agent(query: Annotated[str, "The search query"]) -> str:
         # Join list items as string or extract string if possible
         return " ".join(str(item) for item in response.content)
     else:
-        return str(response.content)
\ No newline at end of file
+        return str(response.content)
+
+
+def _general_agent(query: Annotated[str, "The search query"]) -> str:
+    """Perform a general talk with a user using a basic llm model"""
+
+    print("[General Agent] Processing query...")
+
+    # Use LLM to generate a response
+    response = _llm().invoke(input=query)
+    _record_usage(response)
+    print(f"Passing query to GENERAL AGENT: {response.content}")
+    return _response_text(response)
+
+
+def _record_usage(response) -> None:
+    # Token counts arrive on the final chunk when the model is created with stream_usage
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        tracing.add("prompt_tokens", usage.get("input_tokens", 0))
+        tracing.add("completion_tokens", usage.get("output_tokens", 0))
+
+
+def _with_history(query: str, history: Optional[str]):
+    # Prior turns go in a system message so the question itself stays the last user turn
+    if not history:
+        return query
+    return [("system", f"Relevant conversation so far:\n{history}"), ("user", query)]
+
+
+def stream_general_agent(query: str, history: Optional[str] = None) -> Iterator[str]:
+    """Yield the general LLM's answer token by token as it is generated"""
+
+    record = tracing.enabled()
+    for chunk in _llm().stream(input=_with_history(query, history)):
+        if record:
+            _record_usage(chunk)
+        text = _response_text(chunk)
+        if text:
+            yield text
+
+
+async def astream_general_agent(query: str, history: Optional[str] = None) -> AsyncIterator[str]:
+    """Async variant of stream_general_agent"""
+
+    record = tracing.enabled()
+    async for chunk in _llm().astream(input=_with_history(query, history)):
+        if record:
+            _record_usage(chunk)
+        text = _response_text(chunk)
+        if text:
+            yield text
+
+
+def __getattr__(name: str):
+    # The LangChain tool wrapper imports langchain.tools (about a second); build it on first access
+    if name == "general_agent":
+        from langchain.tools import tool
+
+        globals()["general_agent"] = tool("general_agent")(_general_agent)
+        return globals()["general_agent"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
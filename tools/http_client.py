@@ -0,0 +1,230 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class LatencyMetrics:
+    """Per-call latency and outcome counters for an HTTP client."""
+
+    def __init__(self, window: int = 1000):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms: float, retried: bool = False, error: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            self._samples.append(elapsed_ms)
+            if retried:
+                self.retries += 1
+            if error:
+                self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "errors": self.errors,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99)
+        }
+
+
+class _RetryingClient:
+    """Retry, backoff and metrics configuration shared by the sync and async clients."""
+
+    def __init__(self, base_url: str, connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 pool_maxsize: int = 10, retry_statuses: Iterable[int] = RETRY_STATUSES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+        self.retry_statuses = frozenset(retry_statuses)
+        self.metrics = LatencyMetrics()
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Client for the Perplexity API configured from PERPLEXITY_* variables."""
+        options = {
+            "base_url": os.getenv("PERPLEXITY_API_URL", "https://api.perplexity.ai"),
+            "connect_timeout": float(os.getenv("PERPLEXITY_CONNECT_TIMEOUT", "5")),
+            "read_timeout": float(os.getenv("PERPLEXITY_READ_TIMEOUT", "60")),
+            "max_retries": int(os.getenv("PERPLEXITY_MAX_RETRIES", "3")),
+            **overrides
+        }
+        return cls(**options)
+
+
+class HTTPClient(_RetryingClient):
+    """Keep-alive HTTP client with connect/read timeouts and jittered retries.
+
+    One ``requests.Session`` is shared by every call, so connections (and
+    their TLS handshakes) are pooled and reused across queries.
+    """
+
+    def __init__(self, base_url: str, **options):
+        super().__init__(base_url, **options)
+        self.session = requests.Session()
+        # Retries are handled here so they can be jittered and measured
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post_json(self, path: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                  stream: bool = False) -> requests.Response:
+        """POST a JSON body, retrying connection errors, timeouts and retryable statuses.
+
+        Returns the last response (which may still be an error status once
+        retries are exhausted); raises the last exception if no response was
+        ever received.
+        """
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                self.metrics.record((time.perf_counter() - start) * 1000, retried=not last_attempt, error=True)
+                if last_attempt:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            retryable = response.status_code in self.retry_statuses
+            self.metrics.record(
+                (time.perf_counter() - start) * 1000,
+                retried=retryable and not last_attempt,
+                error=response.status_code >= 400
+            )
+            if retryable and not last_attempt:
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                response.close()
+                time.sleep(delay)
+                continue
+            return response
+
+        raise RuntimeError("unreachable")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncHTTPClient(_RetryingClient):
+    """asyncio counterpart of HTTPClient on a pooled ``httpx.AsyncClient``."""
+
+    def __init__(self, base_url: str, **options):
+        super().__init__(base_url, **options)
+        connect_timeout, read_timeout = self.timeout
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+        )
+
+    async def post_json(self, path: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                        stream: bool = False) -> httpx.Response:
+        """POST a JSON body with the same retry semantics as HTTPClient.post_json.
+
+        With ``stream=True`` the body is left unread; the caller must close the response.
+        """
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                request = self.client.build_request("POST", path, json=payload, headers=headers)
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError:
+                self.metrics.record((time.perf_counter() - start) * 1000, retried=not last_attempt, error=True)
+                if last_attempt:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            retryable = response.status_code in self.retry_statuses
+            self.metrics.record(
+                (time.perf_counter() - start) * 1000,
+                retried=retryable and not last_attempt,
+                error=response.status_code >= 400
+            )
+            if retryable and not last_attempt:
+                await response.aclose()
+                await asyncio.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+                continue
+            return response
+
+        raise RuntimeError("unreachable")
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_search_client: Optional[HTTPClient] = None
+_search_client_lock = threading.Lock()
+
+
+def get_search_http_client() -> HTTPClient:
+    """Process-wide client for the Perplexity API.
+
+    PERPLEXITY_API_URL points it elsewhere (e.g. a local stub server);
+    timeouts and retries are tunable through PERPLEXITY_* variables.
+    """
+    global _search_client
+    if _search_client is None:
+        with _search_client_lock:
+            if _search_client is None:
+                _search_client = HTTPClient.from_env()
+    return _search_client
+
+
+# httpx connections belong to the event loop that opened them, so keep one client per loop
+_async_search_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHTTPClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_search_http_client() -> AsyncHTTPClient:
+    """Async client for the Perplexity API, shared by every task on the running loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_search_clients.get(loop)
+    if client is None:
+        client = AsyncHTTPClient.from_env(pool_maxsize=int(os.getenv("PERPLEXITY_ASYNC_POOL_SIZE", "100")))
+        _async_search_clients[loop] = client
+    return client
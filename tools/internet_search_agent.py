@@ -1,6 +1,11 @@
 import requests
 import os
+import json
 from prompt.internet_search_prompt import INTERNET_SEARCH_PROMPT
+from tools.search_cache import get_search_cache, cache_key, ttl_for_recency
+from tools.http_client import get_search_http_client, get_async_search_http_client
+from utils import tracing
+import httpx
 
 # Fetch the Perplexity API key from environment variables
 def _fetch_perpexity_api_key():
@@ -9,14 +14,9 @@ def _fetch_perpexity_api_key():
         raise Exception("PERPLEXITY_API_KEY is not set")
     return API
 
-# Search the web using the Perplexity API
-def search(query):
-    API_KEY = _fetch_perpexity_api_key()
-    if API_KEY is None:
-        raise ValueError("PERPLEXITY_API_KEY environment variable is not set.")
-
-    # Prepare the API request payload
-    payload = {
+# Build the Perplexity chat completions payload for a query
+def _build_payload(query):
+    return {
         "model": "sonar",
         "messages": [
             {
@@ -36,15 +36,65 @@ def search(query):
         "search_recency_filter": "month" # Filter search results by recency
     }
 
-    # Set up headers for the API request
-    headers = {
+# Set up headers for the API request
+def _build_headers():
+    API_KEY = _fetch_perpexity_api_key()
+    if API_KEY is None:
+        raise ValueError("PERPLEXITY_API_KEY environment variable is not set.")
+
+    return {
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type": "application/json"
     }
 
+# Parse one Server-Sent Events line from the streaming API into its content delta
+def _sse_delta(line):
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return ""
+    try:
+        return json.loads(data)["choices"][0].get("delta", {}).get("content") or ""
+    except (ValueError, KeyError, IndexError) as e:
+        raise Exception(f"Unexpected response format: {str(e)}")
+
+# Parse the token usage Perplexity reports on the last data event of a stream
+def _sse_usage(line):
+    if not line.startswith("data:"):
+        return None
+    try:
+        return json.loads(line[len("data:"):].strip()).get("usage")
+    except ValueError:
+        return None
+
+# Attach a response's token usage to the current trace span
+def _record_usage(usage):
+    if usage:
+        tracing.add("prompt_tokens", usage.get("prompt_tokens", 0))
+        tracing.add("completion_tokens", usage.get("completion_tokens", 0))
+
+# Search the web using the Perplexity API
+@tracing.traced("tools.search")
+def search(query, use_cache=True):
+    # Prepare the API request payload
+    payload = _build_payload(query)
+
+    # Serve repeated queries from the cache instead of calling the API
+    cache = get_search_cache()
+    key = cache_key(query, payload)
+    if use_cache:
+        cached_response = cache.get(key)
+        tracing.add("cache_hits" if cached_response is not None else "cache_misses")
+        if cached_response is not None:
+            return cached_response
+
+    headers = _build_headers()
+
     # Make the API request
     try:
-        response = requests.post("https://api.perplexity.ai/chat/completions", json=payload, headers=headers)
+        # Pooled keep-alive session with timeouts and retries on 429/5xx
+        response = get_search_http_client().post_json("/chat/completions", payload, headers)
 
         # Check for API errors
         if response.status_code != 200:
@@ -53,8 +103,115 @@ def search(query):
 
         # Parse the successful response
         response_json = response.json()
-        return response_json["choices"][0]["message"]["content"]
+        content = response_json["choices"][0]["message"]["content"]
+        tracing.add("bytes_read", len(response.content))
+        _record_usage(response_json.get("usage"))
+        if content:
+            cache.set(key, content, ttl_for_recency(payload.get("search_recency_filter")))
+        return content
    
     # Handle unexpected response format
     except (KeyError, IndexError) as e:
-        raise Exception(f"Unexpected response format: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Unexpected response format: {str(e)}")
+
+    # Handle timeouts and connection failures that outlasted the retries
+    except (requests.Timeout, requests.ConnectionError) as e:
+        raise Exception(f"API request failed: {str(e)}")
+
+# Stream the answer to a query token by token using the API's SSE mode
+@tracing.traced("tools.search")
+def stream_search(query, use_cache=True):
+    payload = _build_payload(query)
+
+    # Cached answers are complete already; emit them as one chunk
+    cache = get_search_cache()
+    key = cache_key(query, payload)
+    if use_cache:
+        cached_response = cache.get(key)
+        tracing.add("cache_hits" if cached_response is not None else "cache_misses")
+        if cached_response is not None:
+            yield cached_response
+            return
+
+    headers = _build_headers()
+
+    try:
+        response = get_search_http_client().post_json(
+            "/chat/completions", {**payload, "stream": True}, headers, stream=True
+        )
+
+        if response.status_code != 200:
+            print(f"API Error: {response.status_code} - {response.text}")
+            raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+
+        parts = []
+        last_event = ""
+        with response:
+            for line in response.iter_lines():
+                line = line.decode("utf-8")
+                delta = _sse_delta(line)
+                if line.startswith("data:") and not line.endswith("[DONE]"):
+                    last_event = line
+                if delta:
+                    parts.append(delta)
+                    yield delta
+
+        if tracing.enabled():
+            tracing.add("bytes_read", sum(len(part.encode("utf-8")) for part in parts))
+            _record_usage(_sse_usage(last_event))
+
+        # Only a fully received, non-empty answer is cached
+        if parts:
+            cache.set(key, "".join(parts), ttl_for_recency(payload.get("search_recency_filter")))
+
+    except (requests.Timeout, requests.ConnectionError) as e:
+        raise Exception(f"API request failed: {str(e)}")
+
+# Async variant of stream_search()
+@tracing.traced("tools.search")
+async def astream_search(query, use_cache=True):
+    payload = _build_payload(query)
+
+    cache = get_search_cache()
+    key = cache_key(query, payload)
+    if use_cache:
+        cached_response = cache.get(key)
+        tracing.add("cache_hits" if cached_response is not None else "cache_misses")
+        if cached_response is not None:
+            yield cached_response
+            return
+
+    headers = _build_headers()
+
+    try:
+        response = await get_async_search_http_client().post_json(
+            "/chat/completions", {**payload, "stream": True}, headers, stream=True
+        )
+
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                print(f"API Error: {response.status_code} - {response.text}")
+                raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+
+            parts = []
+            last_event = ""
+            async for line in response.aiter_lines():
+                delta = _sse_delta(line)
+                if line.startswith("data:") and not line.endswith("[DONE]"):
+                    last_event = line
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await response.aclose()
+
+        if tracing.enabled():
+            tracing.add("bytes_read", sum(len(part.encode("utf-8")) for part in parts))
+            _record_usage(_sse_usage(last_event))
+
+        if parts:
+            cache.set(key, "".join(parts), ttl_for_recency(payload.get("search_recency_filter")))
+
+    except httpx.TransportError as e:
+        raise Exception(f"API request failed: {str(e)}")
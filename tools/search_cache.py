@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+# Cached answers must not outlive the freshness the search asked for
+RECENCY_TTL_SECONDS = {
+    "hour": 10 * 60,
+    "day": 60 * 60,
+    "week": 6 * 60 * 60,
+    "month": 24 * 60 * 60,
+    "year": 7 * 24 * 60 * 60,
+}
+DEFAULT_TTL_SECONDS = 60 * 60
+
+
+def _utcnow() -> datetime:
+    # pymongo returns naive UTC datetimes, so compare against the same
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ttl_for_recency(search_recency_filter: Optional[str]) -> int:
+    """TTL for a response fetched with the given search_recency_filter."""
+    return RECENCY_TTL_SECONDS.get(search_recency_filter or "", DEFAULT_TTL_SECONDS)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def cache_key(query: str, payload: Dict[str, Any]) -> str:
+    """Key on the normalized query plus every payload parameter that changes the answer."""
+    params = {k: v for k, v in payload.items() if k != "messages"}
+    # The system prompt is part of the request too; hash it so prompt edits invalidate entries
+    system_prompt = "".join(m["content"] for m in payload.get("messages", []) if m.get("role") == "system")
+    material = json.dumps(
+        {
+            "query": normalize_query(query),
+            "params": params,
+            "system": hashlib.sha256(system_prompt.encode()).hexdigest()
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class SearchCache:
+    """Two-tier TTL cache for search responses: in-process LRU plus optional shared MongoDB tier."""
+
+    def __init__(self, max_entries: int = 1024, mongo_collection=None):
+        self.max_entries = max_entries
+        self.mongo_collection = mongo_collection
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+        if mongo_collection is not None:
+            try:
+                # Let MongoDB expire entries on its own
+                mongo_collection.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as e:
+                print(f"Warning: Could not create search cache TTL index: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.mongo_collection is not None:
+            try:
+                # The TTL monitor runs about once a minute, so check expiry explicitly
+                doc = self.mongo_collection.find_one({"_id": key, "expires_at": {"$gt": _utcnow()}})
+            except Exception as e:
+                print(f"Warning: Search cache lookup failed: {e}")
+                doc = None
+            if doc:
+                ttl = (doc["expires_at"] - _utcnow()).total_seconds()
+                self._store_local(key, doc["response"], ttl)
+                with self._lock:
+                    self.shared_hits += 1
+                return doc["response"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str, ttl_seconds: int) -> None:
+        """Store a response in both tiers."""
+        self._store_local(key, value, ttl_seconds)
+        if self.mongo_collection is not None:
+            try:
+                self.mongo_collection.replace_one(
+                    {"_id": key},
+                    {"response": value, "expires_at": _utcnow() + timedelta(seconds=ttl_seconds)},
+                    upsert=True
+                )
+            except Exception as e:
+                print(f"Warning: Could not write search cache entry: {e}")
+
+    def _store_local(self, key: str, value: str, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the in-process tier and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries)
+            }
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Process-wide search cache.
+
+    The shared MongoDB tier is enabled when SEARCH_CACHE_MONGODB_URI is set.
+    """
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                collection = None
+                uri = os.getenv("SEARCH_CACHE_MONGODB_URI")
+                if uri:
+                    from memories.mongodb_client import get_mongo_client
+                    collection = get_mongo_client(uri).memories.search_cache
+                _search_cache = SearchCache(
+                    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")),
+                    mongo_collection=collection
+                )
+    return _search_cache
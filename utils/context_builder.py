@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set
+from utils.env import load_environment
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+load_environment()
+
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-4o-mini")
+TOKEN_COUNT_KEY = "token_count"
+
+_encoder = None
+_encoder_failed = False
+_encoder_lock = threading.Lock()
+
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9'-]+")
+HEADING_PATTERN = re.compile(r"^\s*(#{1,6}\s|\*\*[^*]+\*\*|\d+\.\s)")
+OMITTED_MARKER = "[...]"
+
+
+def _get_encoder():
+    """tiktoken encoding for TOKENIZER_MODEL, or None if it is unavailable.
+
+    A failed load (package missing, encoding file not downloadable) is
+    remembered so it is not retried on every call.
+    """
+    global _encoder, _encoder_failed
+    if _encoder is None and not _encoder_failed and tiktoken is not None:
+        with _encoder_lock:
+            if _encoder is None and not _encoder_failed:
+                try:
+                    _encoder = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                except Exception as e:
+                    print(f"Warning: tiktoken unavailable, estimating token counts: {e}")
+                    _encoder_failed = True
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` for the chat model; about four characters per token without tiktoken."""
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """First ``max_tokens`` tokens of ``text``."""
+    encoder = _get_encoder()
+    if encoder is not None:
+        return encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def _fields(message: Any) -> tuple:
+    """(role, content, metadata dict) of a Message or a message dict; the dict is created if missing."""
+    if isinstance(message, dict):
+        metadata = message.get("metadata")
+        if not isinstance(metadata, dict):
+            metadata = message["metadata"] = {}
+        return message.get("role", ""), str(message.get("content", "")), metadata
+    if message.metadata is None:
+        message.metadata = {}
+    return message.role, str(message.content), message.metadata
+
+
+def message_tokens(message: Any) -> int:
+    """Token count of a message, read from (or cached into) its metadata."""
+    _, content, metadata = _fields(message)
+    if TOKEN_COUNT_KEY not in metadata:
+        metadata[TOKEN_COUNT_KEY] = count_tokens(content)
+    return metadata[TOKEN_COUNT_KEY]
+
+
+def excerpt(content: str, max_tokens: int) -> str:
+    """Shorten a long message to fit ``max_tokens``.
+
+    Structured answers such as itineraries keep their opening line and
+    section headings (the outline of the plan); anything else keeps its
+    beginning.
+    """
+    if count_tokens(content) <= max_tokens:
+        return content
+    # Leave room for the omission marker
+    budget = max_tokens - count_tokens(OMITTED_MARKER)
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    headings = [line for line in lines[1:] if HEADING_PATTERN.match(line)]
+    if len(headings) >= 2:
+        outline = [lines[0]]
+        used = count_tokens(lines[0])
+        for heading in headings:
+            used += count_tokens(heading) + 1
+            if used > budget:
+                break
+            outline.append(heading)
+        if len(outline) > 1:
+            return "\n".join(outline) + "\n" + OMITTED_MARKER
+    return truncate_to_tokens(content, budget).rstrip() + " " + OMITTED_MARKER
+
+
+@dataclass
+class ContextBuilder:
+    """Fills a per-call token budget with the most relevant recent history.
+
+    Candidates are the last ``window`` messages. Each is scored by recency
+    plus word overlap with the current question, excerpted to at most
+    ``max_message_tokens``, and taken greedily by score until
+    ``token_budget`` is spent; the chosen messages keep their original
+    order. A rolling summary, when given, is always included first.
+    """
+    token_budget: int = 1000
+    max_message_tokens: int = 250
+    window: int = 20
+
+    @classmethod
+    def for_router(cls) -> "ContextBuilder":
+        return cls(token_budget=300, max_message_tokens=80, window=6)
+
+    @classmethod
+    def for_agent(cls) -> "ContextBuilder":
+        return cls(token_budget=1500, max_message_tokens=400, window=20)
+
+    @staticmethod
+    def _words(text: str) -> Set[str]:
+        return set(WORD_PATTERN.findall(text.lower()))
+
+    def select(self, messages: Sequence[Any], query: str = "") -> List[Dict[str, str]]:
+        """Pick and excerpt messages within the budget; returns role/content dicts in chronological order."""
+        candidates = list(messages)[-self.window:]
+        query_words = self._words(query)
+
+        scored = []
+        for age, message in enumerate(reversed(candidates)):
+            role, content, _ = _fields(message)
+            recency = 1.0 / (age + 1)
+            overlap = len(query_words & self._words(content)) / len(query_words) if query_words else 0.0
+            scored.append((recency + overlap, len(candidates) - 1 - age, role, content, message_tokens(message)))
+
+        chosen = []
+        remaining = self.token_budget
+        for _, position, role, content, tokens in sorted(scored, key=lambda item: item[0], reverse=True):
+            if tokens > self.max_message_tokens:
+                content = excerpt(content, self.max_message_tokens)
+                tokens = count_tokens(content)
+            if tokens > remaining:
+                continue
+            remaining -= tokens
+            chosen.append((position, {"role": role, "content": content}))
+        return [message for _, message in sorted(chosen, key=lambda item: item[0])]
+
+    def build(self, messages: Sequence[Any], query: str = "", summary: Optional[str] = None) -> str:
+        """History text for a prompt: the summary (if any) followed by the selected messages."""
+        parts = []
+        budget = self.token_budget
+        if summary:
+            summary = excerpt(summary, self.token_budget // 2)
+            parts.append(f"Summary of earlier conversation: {summary}")
+            budget -= count_tokens(summary)
+        selector = ContextBuilder(max(0, budget), self.max_message_tokens, self.window)
+        parts.extend(f"{msg['role']}: {msg['content']}" for msg in selector.select(messages, query))
+        return "\n".join(parts)
@@ -0,0 +1,107 @@
+import threading
+from typing import Any, Dict, Optional, Sequence
+from prompt.summary_prompt import SUMMARY_PROMPT
+from utils.context_builder import message_tokens
+from utils.llm import LLMConfig, get_llm
+
+
+def _role_and_content(message: Any) -> tuple:
+    if isinstance(message, dict):
+        return message.get("role", ""), str(message.get("content", ""))
+    return message.role, str(message.content)
+
+
+class ConversationSummarizer:
+    """Folds older turns of a thread into a rolling summary stored on its Conversation.
+
+    Messages past ``summarized_count`` are kept verbatim until their token
+    count crosses ``token_threshold``; then everything except the last
+    ``keep_recent`` messages is merged into the summary with one LLM call.
+    Prompts built from summary + unsummarized tail therefore stay bounded
+    however long the thread gets.
+    """
+
+    def __init__(self, llm_config: Optional[LLMConfig] = None, token_threshold: int = 1500,
+                 keep_recent: int = 6, max_summary_words: int = 200):
+        self.llm_config = llm_config or LLMConfig.create_summary_config()
+        self.token_threshold = token_threshold
+        self.keep_recent = keep_recent
+        self.max_summary_words = max_summary_words
+        self._llm = None
+        self._lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = get_llm(self.llm_config)
+        return self._llm
+
+    def messages_to_fold(self, messages: Sequence[Any]) -> int:
+        """How many of the oldest unsummarized messages to fold now; 0 while under the threshold."""
+        tokens = sum(message_tokens(message) for message in messages)
+        if tokens <= self.token_threshold:
+            return 0
+        return max(0, len(messages) - self.keep_recent)
+
+    def _prompt(self, summary: Optional[str], messages: Sequence[Any]) -> str:
+        lines = [f"{role}: {content}" for role, content in map(_role_and_content, messages)]
+        return SUMMARY_PROMPT.format(
+            max_words=self.max_summary_words,
+            summary=summary or "(none yet)",
+            messages="\n".join(lines)
+        )
+
+    def summarize(self, summary: Optional[str], messages: Sequence[Any]) -> str:
+        """Merge ``messages`` into ``summary`` and return the new summary."""
+        return str(self.llm.invoke(self._prompt(summary, messages)).content).strip()
+
+    async def asummarize(self, summary: Optional[str], messages: Sequence[Any]) -> str:
+        """Async variant of summarize."""
+        response = await self.llm.ainvoke(self._prompt(summary, messages))
+        return str(response.content).strip()
+
+    def update(self, memory_manager, user_id: str, thread_id: str) -> Optional[str]:
+        """Re-summarize the thread if its unsummarized tail crossed the threshold.
+
+        Returns the current summary (new or unchanged), or None if there is none.
+        """
+        try:
+            summary, summarized_count, messages = memory_manager.get_unsummarized_messages(user_id, thread_id)
+            fold = self.messages_to_fold(messages)
+            if not fold:
+                return summary
+            new_summary = self.summarize(summary, messages[:fold])
+            memory_manager.update_summary(user_id, thread_id, new_summary, summarized_count + fold)
+            return new_summary
+        except Exception as e:
+            print(f"Warning: Could not update conversation summary: {e}")
+            return None
+
+    async def aupdate(self, memory_manager, user_id: str, thread_id: str) -> Optional[str]:
+        """Async variant of update."""
+        try:
+            summary, summarized_count, messages = await memory_manager.aget_unsummarized_messages(user_id, thread_id)
+            fold = self.messages_to_fold(messages)
+            if not fold:
+                return summary
+            new_summary = await self.asummarize(summary, messages[:fold])
+            await memory_manager.aupdate_summary(user_id, thread_id, new_summary, summarized_count + fold)
+            return new_summary
+        except Exception as e:
+            print(f"Warning: Could not update conversation summary: {e}")
+            return None
+
+    def bound_updates(self, state: Dict[str, Any], summary: Optional[str]) -> Dict[str, Any]:
+        """State updates trimming the in-graph message list to the recent window and carrying the summary.
+
+        Only changed keys are returned, so an unchanged summary is not checkpointed again.
+        """
+        messages: Sequence[Any] = state.get("messages") or []
+        updates: Dict[str, Any] = {}
+        if len(messages) > self.keep_recent:
+            updates["messages"] = messages[-self.keep_recent:] if self.keep_recent else []
+        if summary and summary != state.get("summary"):
+            updates["summary"] = summary
+        return updates
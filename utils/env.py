@@ -0,0 +1,22 @@
+import threading
+
+_lock = threading.Lock()
+_loaded = False
+
+
+def load_environment() -> None:
+    """Load the nearest .env file into os.environ once per process; later calls return at once.
+
+    Call it before reading configuration from the environment, at import time
+    or in a lazy getter; whichever caller runs first does the load.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if _loaded:
+            return
+        from dotenv import load_dotenv, find_dotenv
+
+        load_dotenv(find_dotenv())
+        _loaded = True
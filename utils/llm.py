@@ -1,9 +1,16 @@
-from langchain_openai import ChatOpenAI
+import threading
 from dataclasses import dataclass
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, Optional
+from utils.env import load_environment
 
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
-@dataclass
+_registry_lock = threading.Lock()
+_clients: Dict["LLMConfig", "ChatOpenAI"] = {}
+
+
+@dataclass(frozen=True)
 class LLMConfig:
     model_name: str
     temperature: float
@@ -29,10 +36,44 @@ class LLMConfig:
             request_timeout=15
         )
 
-    def create_llm(self) -> ChatOpenAI:
+    @classmethod
+    def create_summary_config(cls) -> 'LLMConfig':
+        return cls(
+            model_name="gpt-4o-mini",
+            temperature=0.2,
+            max_tokens=300,
+            request_timeout=30,
+            streaming=False
+        )
+
+    def create_llm(self) -> "ChatOpenAI":
+        # Deferred: importing langchain_openai (and the openai SDK) takes most of a second
+        from langchain_openai import ChatOpenAI
+
+        load_environment()
         return ChatOpenAI(
             model_name=self.model_name,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
-            request_timeout=self.request_timeout
+            request_timeout=self.request_timeout,
+            streaming=self.streaming,
+            # Report token usage on streamed answers too, for tracing
+            stream_usage=self.streaming
         )
+
+
+def get_llm(config: LLMConfig) -> "ChatOpenAI":
+    """Return the process-wide client for ``config``, built on first use.
+
+    Callers with equal configs share one client (and its connection pool).
+    """
+    client = _clients.get(config)
+    if client is not None:
+        return client
+
+    with _registry_lock:
+        client = _clients.get(config)
+        if client is None:
+            client = config.create_llm()
+            _clients[config] = client
+        return client
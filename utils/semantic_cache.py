@@ -0,0 +1,238 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Words that carry no meaning for matching travel requests
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "from", "with", "by", "about",
+    "me", "my", "i", "we", "our", "us", "you", "your", "can", "could", "would", "please", "some",
+    "is", "are", "be", "what", "which", "how", "give", "make", "want", "need", "like", "this", "that",
+    "plan", "planning", "trip", "travel", "itinerary", "vacation", "holiday", "visit", "suggest",
+}
+
+# Paraphrases folded onto one canonical token before matching
+BUDGET_TIERS = {
+    "budget": "budget", "cheap": "budget", "cheapest": "budget", "affordable": "budget",
+    "inexpensive": "budget", "economical": "budget", "backpacking": "budget", "low-cost": "budget",
+    "mid-range": "midrange", "midrange": "midrange", "moderate": "midrange",
+    "luxury": "luxury", "luxurious": "luxury", "high-end": "luxury", "premium": "luxury", "5-star": "luxury",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fourteen": 14,
+}
+
+DURATION_PATTERN = re.compile(
+    r"\b(\d+|a|an|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|fourteen)"
+    r"[- ]?(day|days|night|nights|week|weeks)\b"
+)
+DESTINATION_PATTERN = re.compile(
+    r"\b(?:in|to|for|visit(?:ing)?|around|across|through)\s+([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)*)"
+)
+CAPITALIZED_PATTERN = re.compile(r"(?<!^)(?<![.!?]\s)\b([A-Z][a-z][\w'-]+(?:\s+[A-Z][\w'-]+)*)")
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+
+@dataclass
+class QuerySlots:
+    """Structured parts of a travel request that must agree for a cached answer to apply."""
+    destination: Optional[str] = None
+    duration_days: Optional[int] = None
+    budget: Optional[str] = None
+
+    def present(self) -> Dict[str, Any]:
+        return {k: v for k, v in vars(self).items() if v is not None}
+
+
+def extract_slots(query: str) -> QuerySlots:
+    """Pull destination, trip length in days and budget tier out of a query."""
+    lowered = query.lower()
+    slots = QuerySlots()
+
+    match = DESTINATION_PATTERN.search(query) or CAPITALIZED_PATTERN.search(query)
+    if match:
+        slots.destination = match.group(1).strip().lower()
+
+    if "fortnight" in lowered:
+        slots.duration_days = 14
+    elif "weekend" in lowered:
+        slots.duration_days = 2
+    else:
+        match = DURATION_PATTERN.search(lowered)
+        if match:
+            amount = int(match.group(1)) if match.group(1).isdigit() else NUMBER_WORDS[match.group(1)]
+            slots.duration_days = amount * 7 if match.group(2).startswith("week") else amount
+
+    for word in TOKEN_PATTERN.findall(lowered):
+        if word in BUDGET_TIERS:
+            slots.budget = BUDGET_TIERS[word]
+            break
+    return slots
+
+
+def normalize_tokens(query: str, slots: Optional[QuerySlots] = None) -> Counter:
+    """Bag of canonical content tokens; slot values are replaced by their normalized form."""
+    slots = slots or extract_slots(query)
+    lowered = DURATION_PATTERN.sub(" ", query.lower())
+    lowered = re.sub(r"\b(fortnight|weekend)\b", " ", lowered)
+
+    tokens = Counter()
+    for word in TOKEN_PATTERN.findall(lowered):
+        if word in STOP_WORDS or word in BUDGET_TIERS:
+            continue
+        tokens[word] += 1
+    if slots.duration_days is not None:
+        tokens[f"{slots.duration_days}d"] += 1
+    if slots.budget is not None:
+        tokens[f"tier:{slots.budget}"] += 1
+    return tokens
+
+
+def cosine_similarity(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[token] for token, count in a.items())
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+
+@dataclass
+class SemanticCacheEntry:
+    query: str
+    agent_type: str
+    response: str
+    slots: QuerySlots
+    tokens: Counter
+    cached_at: datetime = field(default_factory=datetime.now)
+    expires_at: float = 0.0
+
+
+@dataclass
+class SemanticCacheHit:
+    """A cached response plus where it came from."""
+    response: str
+    similarity: float
+    source_query: str
+    cached_at: datetime
+
+    def provenance(self) -> Dict[str, Any]:
+        """Metadata recorded on the saved assistant message."""
+        return {
+            "hit": True,
+            "type": "semantic",
+            "similarity": round(self.similarity, 4),
+            "source_query": self.source_query,
+            "cached_at": self.cached_at.isoformat()
+        }
+
+
+class SemanticCache:
+    """Near-duplicate response cache for agent answers.
+
+    Entries are blocked by (agent_type, destination) so a lookup only compares
+    against plans for the same place. A candidate matches when every slot
+    present on both sides agrees and the combined slot/token similarity
+    reaches ``threshold``.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 2048,
+                 ttl_seconds: int = 24 * 60 * 60, min_tokens: int = 2):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._blocks: Dict[tuple, "OrderedDict[str, SemanticCacheEntry]"] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def similarity(query_slots: QuerySlots, query_tokens: Counter, entry: SemanticCacheEntry) -> float:
+        """Score in [0, 1]; zero when a slot present on both sides disagrees."""
+        mine, theirs = query_slots.present(), entry.slots.present()
+        for name in mine.keys() & theirs.keys():
+            if mine[name] != theirs[name]:
+                return 0.0
+
+        text_score = cosine_similarity(query_tokens, entry.tokens)
+        slot_names = mine.keys() | theirs.keys()
+        if not slot_names:
+            return text_score
+        slot_score = len(mine.keys() & theirs.keys()) / len(slot_names)
+        return 0.6 * slot_score + 0.4 * text_score
+
+    def lookup(self, query: str, agent_type: str) -> Optional[SemanticCacheHit]:
+        """Return the best cached response for a paraphrase of ``query``, if any passes the threshold."""
+        slots = extract_slots(query)
+        tokens = normalize_tokens(query, slots)
+        if sum(tokens.values()) < self.min_tokens:
+            return None
+
+        now = time.time()
+        best: Optional[SemanticCacheEntry] = None
+        best_score = 0.0
+        with self._lock:
+            block = self._blocks.get((agent_type, slots.destination), {})
+            for key, entry in list(block.items()):
+                if entry.expires_at <= now:
+                    del block[key]
+                    self._size -= 1
+                    continue
+                score = self.similarity(slots, tokens, entry)
+                if score > best_score:
+                    best, best_score = entry, score
+
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            block.move_to_end(best.query)
+            self.hits += 1
+        return SemanticCacheHit(best.response, best_score, best.query, best.cached_at)
+
+    def add(self, query: str, agent_type: str, response: str) -> None:
+        """Cache a response for later paraphrases of ``query``."""
+        slots = extract_slots(query)
+        tokens = normalize_tokens(query, slots)
+        if sum(tokens.values()) < self.min_tokens or not response:
+            return
+
+        entry = SemanticCacheEntry(query, agent_type, response, slots, tokens,
+                                   expires_at=time.time() + self.ttl_seconds)
+        with self._lock:
+            block = self._blocks.setdefault((agent_type, slots.destination), OrderedDict())
+            if query not in block:
+                self._size += 1
+            block[query] = entry
+            block.move_to_end(query)
+            while self._size > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        oldest_key, oldest_time = None, None
+        for key, block in self._blocks.items():
+            if block:
+                entry = next(iter(block.values()))
+                if oldest_time is None or entry.cached_at < oldest_time:
+                    oldest_key, oldest_time = key, entry.cached_at
+        if oldest_key is None:
+            self._size = 0
+            return
+        self._blocks[oldest_key].popitem(last=False)
+        self._size -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": self._size
+            }
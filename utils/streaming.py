@@ -0,0 +1,98 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, Callable, Iterable, Iterator, List, Optional
+
+# Set by redirect_tokens; takes precedence over the graph's stream writer
+_writer_override: contextvars.ContextVar[Optional[Callable[[Any], None]]] = contextvars.ContextVar(
+    "token_writer_override", default=None
+)
+
+
+class BranchDiscarded(Exception):
+    """Raised in a speculative branch that writes a token after it was discarded."""
+
+
+class TokenGate:
+    """Token writer for a branch whose answer may not be used.
+
+    Tokens are held until ``commit`` forwards them, and every later one, to
+    ``writer``. After ``discard`` the next token raises BranchDiscarded, which
+    stops the branch's model or search stream. ``tokens`` counts the tokens
+    written before either happened or since.
+    """
+
+    def __init__(self, writer: Callable[[Any], None], committed: bool = False):
+        self.writer = writer
+        self.committed = committed
+        self.discarded = False
+        self.tokens = 0
+        self._held: List[Any] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk: Any) -> None:
+        # Held under the lock so a commit from another thread cannot reorder tokens
+        with self._lock:
+            if self.discarded:
+                raise BranchDiscarded()
+            self.tokens += 1
+            if self.committed:
+                self.writer(chunk)
+            else:
+                self._held.append(chunk)
+
+    def commit(self) -> None:
+        with self._lock:
+            self.committed = True
+            for chunk in self._held:
+                self.writer(chunk)
+            self._held.clear()
+
+    def discard(self) -> None:
+        with self._lock:
+            self.discarded = True
+            self._held.clear()
+
+
+@contextmanager
+def redirect_tokens(writer: Callable[[Any], None]) -> Iterator[None]:
+    """Send tokens written in this context, and in tasks or threads started from it, to ``writer``."""
+    token = _writer_override.set(writer)
+    try:
+        yield
+    finally:
+        _writer_override.reset(token)
+
+
+def token_writer() -> Callable[[Any], None]:
+    """Writer for the graph's custom stream; a no-op when called outside a graph run."""
+    override = _writer_override.get()
+    if override is not None:
+        return override
+
+    from langgraph.config import get_stream_writer
+
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda chunk: None
+
+
+def collect_tokens(tokens: Iterable[str]) -> str:
+    """Forward each token to the custom stream as it arrives and return the joined text."""
+    write = token_writer()
+    parts: List[str] = []
+    for token in tokens:
+        write({"token": token})
+        parts.append(token)
+    return "".join(parts)
+
+
+async def acollect_tokens(tokens: AsyncIterable[str]) -> str:
+    """Async variant of collect_tokens."""
+    write = token_writer()
+    parts: List[str] = []
+    async for token in tokens:
+        write({"token": token})
+        parts.append(token)
+    return "".join(parts)
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from utils.streaming import BranchDiscarded, TokenGate, collect_tokens, redirect_tokens
+
+
+def test_gate_holds_tokens_until_commit_then_forwards_in_order():
+    written = []
+    gate = TokenGate(written.append)
+
+    gate("a")
+    gate("b")
+    assert written == []
+
+    gate.commit()
+    gate("c")
+    assert written == ["a", "b", "c"]
+    assert gate.tokens == 3
+
+
+def test_discarded_gate_drops_held_tokens_and_stops_the_branch():
+    written = []
+    gate = TokenGate(written.append)
+    gate("a")
+
+    gate.discard()
+    with pytest.raises(BranchDiscarded):
+        gate("b")
+    assert written == []
+    assert gate.tokens == 1
+
+
+def test_commit_from_another_thread_keeps_token_order():
+    written = []
+    gate = TokenGate(written.append)
+    producer = threading.Thread(target=lambda: [gate(n) for n in range(10000)])
+    producer.start()
+    gate.commit()
+    producer.join()
+
+    assert written == list(range(10000))
+
+
+def test_redirect_tokens_applies_to_the_context_only():
+    gate = TokenGate(lambda chunk: None)
+    with redirect_tokens(gate):
+        assert collect_tokens(["Hel", "lo"]) == "Hello"
+    # Outside a graph run and without a redirect, tokens go nowhere
+    assert collect_tokens(["x"]) == "x"
+    assert gate.tokens == 2
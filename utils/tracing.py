@@ -0,0 +1,339 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.env import load_environment
+
+# Numeric span attributes that are summed into Prometheus counters
+COUNTED_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "bytes_read", "bytes_written", "cache_hits", "cache_misses",
+                      "speculation_hits", "speculation_misses", "speculation_saved_seconds",
+                      "speculation_wasted_seconds", "speculation_wasted_tokens")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = "travel_planner"
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation; attributes hold tokens, bytes, cache hits and other details."""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes",
+                 "error", "_started", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = ""
+        self.parent_id: Optional[str] = None
+        self.start = 0.0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._started
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Generators may finish in another context than they started in
+            _current.set(None)
+        self.tracer.finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled; every method does nothing."""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonLinesExporter:
+    """Appends every finished span to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class PrometheusMetrics:
+    """Aggregates spans into per-name duration histograms and attribute counters.
+
+    ``render`` returns the Prometheus text exposition format; ``serve``
+    exposes it at ``/metrics`` from a daemon thread.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        # span name -> [bucket counts..., count, sum]
+        self._durations: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            histogram = self._durations.setdefault(span.name, [0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            for key in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if value:
+                    self._counters[(key, span.name)] = self._counters.get((key, span.name), 0) + value
+
+    def render(self) -> str:
+        name = f"{METRIC_PREFIX}_span_duration_seconds"
+        lines = [f"# HELP {name} Wall time of traced operations.", f"# TYPE {name} histogram"]
+        with self._lock:
+            for span_name, histogram in sorted(self._durations.items()):
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f'{name}_bucket{{span="{span_name}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{span="{span_name}",le="+Inf"}} {histogram[-2]}')
+                lines.append(f'{name}_count{{span="{span_name}"}} {histogram[-2]}')
+                lines.append(f'{name}_sum{{span="{span_name}"}} {histogram[-1]}')
+
+            name = f"{METRIC_PREFIX}_span_errors_total"
+            lines += [f"# HELP {name} Traced operations that raised.", f"# TYPE {name} counter"]
+            for span_name, count in sorted(self._errors.items()):
+                lines.append(f'{name}{{span="{span_name}"}} {count}')
+
+            for key in COUNTED_ATTRIBUTES:
+                name = f"{METRIC_PREFIX}_{key}_total"
+                lines += [f"# HELP {name} Sum of the {key} span attribute.", f"# TYPE {name} counter"]
+                for (counted, span_name), value in sorted(self._counters.items()):
+                    if counted == key:
+                        lines.append(f'{name}{{span="{span_name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> None:
+        """Serve ``render()`` at http://host:port/metrics."""
+        if self._server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to its exporters.
+
+    With no exporter the tracer is disabled: ``span`` returns a shared no-op
+    object, so instrumented code pays one attribute check per call.
+    """
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters: List[Any] = list(exporters or [])
+        self.enabled = bool(self.exporters)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """Tracer configured by TRACE_JSONL (span log path) and METRICS_PORT (Prometheus metrics)."""
+        load_environment()
+        tracer = cls()
+        path = os.getenv("TRACE_JSONL")
+        if path:
+            tracer.add_exporter(JsonLinesExporter(path))
+        if os.getenv("METRICS_PORT"):
+            # Aggregated from import on; the endpoint is only started by serve_metrics()
+            tracer.add_exporter(PrometheusMetrics())
+        return tracer
+
+    def add_exporter(self, exporter: Any) -> None:
+        self.exporters.append(exporter)
+        self.enabled = True
+
+    def span(self, name: str, **attributes: Any):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def finish(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Warning: could not export span {span.name}: {e}")
+
+
+tracer = Tracer.from_env()
+
+
+def enabled() -> bool:
+    return tracer.enabled
+
+
+def serve_metrics(host: str = "0.0.0.0") -> Optional[PrometheusMetrics]:
+    """Serve the Prometheus metrics on METRICS_PORT; called by entry points, never on import.
+
+    Returns the exporter, or None if METRICS_PORT is unset or the port is taken.
+    """
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    for exporter in tracer.exporters:
+        if isinstance(exporter, PrometheusMetrics):
+            try:
+                exporter.serve(int(port), host)
+            except OSError as e:
+                print(f"Warning: could not serve metrics on port {port}: {e}")
+                return None
+            return exporter
+    return None
+
+
+def span(name: str, **attributes: Any):
+    """Context manager timing the enclosed block as a span named ``name``."""
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return Span(tracer, name, attributes)
+
+
+def current_span():
+    """The innermost open span, or the no-op span."""
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return _current.get() or NOOP_SPAN
+
+
+def add(key: str, amount: float = 1) -> None:
+    """Add ``amount`` to a numeric attribute of the innermost open span."""
+    if tracer.enabled:
+        current = _current.get()
+        if current is not None:
+            current.add(key, amount)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute on the innermost open span."""
+    if tracer.enabled:
+        current = _current.get()
+        if current is not None:
+            current.set(key, value)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording each call as a span; handles coroutines and (async) generators."""
+    def decorator(func: Callable) -> Callable:
+        if inspect.isasyncgenfunction(func):
+            async def spanned_async_gen(*args, **kwargs):
+                with Span(tracer, name, {}):
+                    async for item in func(*args, **kwargs):
+                        yield item
+
+            @functools.wraps(func)
+            def traced_async_gen(*args, **kwargs):
+                # Disabled: hand back the undecorated generator, no per-item cost
+                if not tracer.enabled:
+                    return func(*args, **kwargs)
+                return spanned_async_gen(*args, **kwargs)
+            return traced_async_gen
+
+        if inspect.isgeneratorfunction(func):
+            def spanned_gen(*args, **kwargs):
+                with Span(tracer, name, {}):
+                    return (yield from func(*args, **kwargs))
+
+            @functools.wraps(func)
+            def traced_gen(*args, **kwargs):
+                if not tracer.enabled:
+                    return func(*args, **kwargs)
+                return spanned_gen(*args, **kwargs)
+            return traced_gen
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def traced_async(*args, **kwargs):
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with Span(tracer, name, {}):
+                    return await func(*args, **kwargs)
+            return traced_async
+
+        @functools.wraps(func)
+        def traced_call(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with Span(tracer, name, {}):
+                return func(*args, **kwargs)
+        return traced_call
+    return decorator
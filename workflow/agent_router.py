@@ -0,0 +1,166 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Pattern, Tuple
+from prompt.router_prompt import ROUTER_PROMPT
+from utils.json_types import AgentType
+from utils.llm import LLMConfig, get_llm
+
+# Supplies the conversation history text; only called by stages that need it
+HistoryProvider = Callable[[], str]
+AsyncHistoryProvider = Callable[[], Awaitable[str]]
+
+
+@dataclass
+class RoutingDecision:
+    """Which agent should handle a question, and how sure the router is."""
+    agent_type: str
+    confidence: float
+    source: str  # 'rules', 'llm'
+
+
+def _compile(patterns: List[Tuple[str, float]]) -> List[Tuple[Pattern[str], float]]:
+    return [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in patterns]
+
+
+# Travel and freshness intents that need live data from the search agent
+SEARCH_RULES = _compile([
+    (r"\b(itinerar(y|ies)|trip|travel(l?ing)?|vacation|holiday|getaway|honeymoon)\b", 1.0),
+    (r"\b(flights?|airfare|airlines?|airports?|hotels?|hostels?|resorts?|accommodations?|airbnb)\b", 1.0),
+    (r"\b(visa|passport|entry requirements?)\b", 1.0),
+    (r"\b\d+[- ]?(day|night|week)s?\b", 1.0),
+    (r"\b(things to do|places to (visit|see|stay)|must[- ]see|sightseeing|attractions?|best time to visit)\b", 1.0),
+    (r"\b(restaurants?|where to eat|street food|cafes?)\b", 0.5),
+    (r"\b(budget|cost|costs|price|prices|fares?|how much|cheap|cheapest|expensive)\b", 0.5),
+    (r"\b(weather|forecast|temperature|rain(y)?|season)\b", 0.5),
+    (r"\b(trains?|rail pass|metro|buses|ferry|car rental|transfer)\b", 0.5),
+    (r"\b(latest|current(ly)?|today|tonight|this (week|month|year)|news|open now|20\d\d)\b", 0.5),
+    (r"\b(plan|book|booking)\b", 0.5),
+])
+
+# Small talk and self-contained tasks the general agent answers without search
+GENERAL_RULES = _compile([
+    (r"^\s*(hi|hello|hey|yo|good (morning|afternoon|evening)|thanks?|thank you|bye|goodbye|ok(ay)?|cool)\b", 1.5),
+    (r"\b(who are you|what can you do|your name|how are you|help me understand)\b", 1.5),
+    (r"\b(translate|define|definition|explain|summari[sz]e|rewrite|rephrase|poem|joke|story)\b", 1.0),
+    (r"^[\d\s+\-*/().%^=]+$", 1.5),
+])
+
+
+class KeywordRouter:
+    """Local first-stage router using weighted regex rules for travel intents."""
+
+    def __init__(self, search_rules: Optional[List[Tuple[Pattern[str], float]]] = None,
+                 general_rules: Optional[List[Tuple[Pattern[str], float]]] = None):
+        self.search_rules = search_rules if search_rules is not None else SEARCH_RULES
+        self.general_rules = general_rules if general_rules is not None else GENERAL_RULES
+
+    @staticmethod
+    def _score(question: str, rules: List[Tuple[Pattern[str], float]]) -> float:
+        return sum(weight for pattern, weight in rules if pattern.search(question))
+
+    def route(self, question: str, history: Optional[HistoryProvider] = None) -> RoutingDecision:
+        """Score the question against both rule sets; confidence grows with the margin."""
+        search_score = self._score(question, self.search_rules)
+        general_score = self._score(question, self.general_rules)
+        margin = search_score - general_score
+
+        if margin > 0:
+            agent_type = AgentType.INTERNET_SEARCH.value
+        elif margin < 0:
+            agent_type = AgentType.GENERAL.value
+        else:
+            # No signal either way: defer to the next stage
+            return RoutingDecision(AgentType.GENERAL.value, 0.0, "rules")
+
+        confidence = min(0.95, 0.5 + 0.25 * abs(margin))
+        return RoutingDecision(agent_type, confidence, "rules")
+
+    async def aroute(self, question: str, history: Optional[AsyncHistoryProvider] = None) -> RoutingDecision:
+        # Pure CPU work; no need to leave the event loop
+        return self.route(question)
+
+
+class LLMRouter:
+    """Routes with a single LLM call; the client is built once and reused."""
+
+    def __init__(self, llm_config: Optional[LLMConfig] = None):
+        self.llm_config = llm_config or LLMConfig.create_fast_config()
+        self._llm = None
+        self._lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = get_llm(self.llm_config)
+        return self._llm
+
+    def route(self, question: str, history: Optional[HistoryProvider] = None) -> RoutingDecision:
+        prompt = ROUTER_PROMPT.format(
+            history_context=history() if history else "",
+            current_question=question
+        )
+        return self._parse(self.llm.invoke(prompt))
+
+    async def aroute(self, question: str, history: Optional[AsyncHistoryProvider] = None) -> RoutingDecision:
+        prompt = ROUTER_PROMPT.format(
+            history_context=await history() if history else "",
+            current_question=question
+        )
+        return self._parse(await self.llm.ainvoke(prompt))
+
+    @staticmethod
+    def _parse(response) -> RoutingDecision:
+        # Parse LLM response and return agent type
+        response_content = response.content
+        if isinstance(response_content, list):
+            agent_decision_str = str(response_content[0]).strip().lower()
+        else:
+            agent_decision_str = str(response_content).strip().lower()
+
+        if "internet_search" in agent_decision_str:
+            return RoutingDecision(AgentType.INTERNET_SEARCH.value, 1.0, "llm")
+        return RoutingDecision(AgentType.GENERAL.value, 1.0, "llm")
+
+
+class HybridRouter:
+    """Answers from the local router when it is confident, otherwise asks the LLM."""
+
+    def __init__(self, local_router: Optional[KeywordRouter] = None,
+                 fallback_router: Optional[LLMRouter] = None,
+                 confidence_threshold: float = 0.75):
+        self.local_router = local_router or KeywordRouter()
+        self.fallback_router = fallback_router or LLMRouter()
+        self.confidence_threshold = confidence_threshold
+
+    def route(self, question: str, history: Optional[HistoryProvider] = None) -> RoutingDecision:
+        decision = self.local_router.route(question, history)
+        if decision.confidence >= self.confidence_threshold:
+            return decision
+        return self.fallback_router.route(question, history)
+
+    async def aroute(self, question: str, history: Optional[AsyncHistoryProvider] = None) -> RoutingDecision:
+        decision = self.local_router.route(question)
+        if decision.confidence >= self.confidence_threshold:
+            return decision
+        return await self.fallback_router.aroute(question, history)
+
+    def guess(self, question: str) -> Optional[RoutingDecision]:
+        """The local router's lean when the LLM will have to decide; None when routing is local."""
+        decision = self.local_router.route(question)
+        if decision.confidence >= self.confidence_threshold:
+            return None
+        return decision
+
+
+_default_router: Optional[HybridRouter] = None
+
+
+def get_default_router() -> HybridRouter:
+    """Process-wide router shared by workflows that do not supply their own."""
+    global _default_router
+    if _default_router is None:
+        _default_router = HybridRouter()
+    return _default_router
@@ -1,78 +1,271 @@
-from node.general_agent_node import general_talk
-from node.internet_search_node import internet_search
-from langgraph.graph import StateGraph
-from typing import Dict, Any, cast, Optional
+from node.general_agent_node import general_talk, ageneral_talk
+from node.internet_search_node import internet_search, ainternet_search
+from typing import TYPE_CHECKING, Dict, Any, AsyncIterator, Iterator, Tuple, cast, Optional
 from state.state import State
 from utils.llm import LLMConfig
-from dotenv import load_dotenv, find_dotenv
+from utils.env import load_environment
 from utils.json_types import AgentType
 from memories.memories import MemoryManager
+from workflow.agent_router import HybridRouter, get_default_router
+from workflow.speculation import DEFAULT_SPECULATION, SpeculationPolicy, get_speculator
+from utils.semantic_cache import SemanticCache
+from utils.streaming import token_writer
+from utils import tracing
+from utils.conversion_summarizer import ConversationSummarizer
+from utils.context_builder import ContextBuilder, TOKEN_COUNT_KEY, count_tokens
 from datetime import datetime
+import threading
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+    from langgraph.graph.state import CompiledStateGraph
+
+load_environment()
+
+# Agents whose answers the semantic cache shares across users: search answers depend on the
+# question alone, while general talk answers are built from the thread's own history
+SEMANTIC_CACHE_AGENTS = frozenset({AgentType.INTERNET_SEARCH.value})
+
+_graph_lock = threading.Lock()
+# One compiled graph per checkpointer (None: no checkpointing)
+_compiled_graphs: Dict[Any, "CompiledStateGraph"] = {}
+
+
+def _session(config: Dict[str, Any]) -> Tuple["LangGraphWorkflow", str, str]:
+    configurable = config["configurable"]
+    return configurable["workflow"], configurable["user_id"], configurable["thread_id"]
+
+
+def _answer(state: State, config: Dict[str, Any]) -> State:
+    workflow, _, _ = _session(config)
+    return workflow.answer_turn(state)
+
+
+async def _aanswer(state: State, config: Dict[str, Any]) -> State:
+    workflow, _, _ = _session(config)
+    return await workflow.aanswer_turn(state)
+
+
+def _summarize(state: State, config: Dict[str, Any]) -> State:
+    workflow, user_id, thread_id = _session(config)
+    summary = workflow.summarizer.update(workflow.memory_manager, user_id, thread_id)
+    return cast(State, workflow.summarizer.bound_updates(state, summary))
+
+
+async def _asummarize(state: State, config: Dict[str, Any]) -> State:
+    workflow, user_id, thread_id = _session(config)
+    summary = await workflow.summarizer.aupdate(workflow.memory_manager, user_id, thread_id)
+    return cast(State, workflow.summarizer.bound_updates(state, summary))
+
+
+def get_compiled_graph(checkpointer: Optional["BaseCheckpointSaver"] = None) -> "CompiledStateGraph":
+    """Return the workflow graph, compiled on first use and shared by every LangGraphWorkflow.
+
+    Nothing session-specific is captured: each run passes
+    ``configurable.user_id``, ``thread_id`` and the ``workflow`` holding its
+    memory manager, router, caches and agents. Workflows using the same
+    checkpointer share one graph compiled with it.
+    """
+    graph = _compiled_graphs.get(checkpointer)
+    if graph is not None:
+        return graph
+
+    with _graph_lock:
+        graph = _compiled_graphs.get(checkpointer)
+        if graph is None:
+            graph = _build_graph(checkpointer)
+            _compiled_graphs[checkpointer] = graph
+        return graph
+
+
+def _build_graph(checkpointer: Optional["BaseCheckpointSaver"]) -> "CompiledStateGraph":
+    # langgraph is imported with the first workflow, not with this module
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph
+
+    # invoke() runs the sync function, ainvoke() the coroutine
+    answer = tracing.traced("workflow.agent_decider")
+    summarize = tracing.traced("workflow.summarize")
+    graph = StateGraph(State)
+    graph.add_node("agent_decider", RunnableLambda(answer(_answer), afunc=answer(_aanswer)))
+    graph.add_node("summarize", RunnableLambda(summarize(_summarize), afunc=summarize(_asummarize)))
+    # Nodes return only the channels they change, so a checkpointer stores just those
+    graph.add_node("end", lambda state: {})
+    graph.add_edge("agent_decider", "summarize")
+    graph.add_edge("summarize", "end")
+    graph.set_entry_point("agent_decider")
+    return graph.compile(checkpointer=checkpointer)
 
-load_dotenv(find_dotenv())
 
 class LangGraphWorkflow:
-    def __init__(self, user_id, thread_id, connection_string: str = "mongodb://localhost:27017/"):
+    def __init__(self, user_id, thread_id, connection_string: str = "mongodb://localhost:27017/",
+                 memory_manager: Optional[MemoryManager] = None, router: Optional[HybridRouter] = None,
+                 semantic_cache: Optional[SemanticCache] = None,
+                 summarizer: Optional[ConversationSummarizer] = None,
+                 checkpointer: Optional["BaseCheckpointSaver"] = None,
+                 speculation: Optional[SpeculationPolicy] = DEFAULT_SPECULATION):
         self.user_id = user_id
         self.thread_id = thread_id
-        self.memory_manager = MemoryManager(connection_string)
+        # Cheap to construct: the Mongo client and index setup are shared per process
+        self.memory_manager = memory_manager or MemoryManager(connection_string)
+        # Any object with route(question, history) -> RoutingDecision can be plugged in
+        self.router = router or get_default_router()
+        # Optional near-duplicate answer cache in front of the search agent
+        self.semantic_cache = semantic_cache
+        # Keeps history in state and prompts bounded by folding old turns into a summary
+        self.summarizer = summarizer or ConversationSummarizer()
+        # Token budget for the history shown to the LLM router
+        self.router_context = ContextBuilder.for_router()
+        # Optional LangGraph checkpointer (e.g. MongoDBCheckpointer); the graph then restores
+        # the thread's state itself instead of reloading history every turn
+        self.checkpointer = checkpointer
+        # Optional: start the likely agent while the LLM router is still deciding
+        self.speculator = get_speculator(speculation) if speculation is not None else None
         self._setup()
         self.AgentType = AgentType
         self.LLMConfig = LLMConfig
 
     def _setup(self):
         self._init_nodes()
-        self._init_graph()
         self._init_config()
+        # Compiled once per process; nodes read the session from the run's config
+        self.compiled_graph = get_compiled_graph(self.checkpointer)
+        # A checkpointed turn is saved once, when it finishes, rather than after every step
+        self.run_options: Dict[str, Any] = {"durability": "exit"} if self.checkpointer is not None else {}
 
     def _init_nodes(self):
         self.general_talk_node = general_talk
         self.internet_search_node = internet_search
+        self.ageneral_talk_node = ageneral_talk
+        self.ainternet_search_node = ainternet_search
 
     def _init_config(self):
+        # Passed to every graph run: the shared graph finds this session's identity and services here
         self.config = {
-            "user_id": self.user_id,
-            "thread_id": self.thread_id
+            "configurable": {
+                "user_id": self.user_id,
+                "thread_id": self.thread_id,
+                "workflow": self
+            }
         }
 
+    @tracing.traced("workflow.load_history")
     def load_conversation_history(self, limit: int = 10) -> list:
         """Load recent conversation history from memory."""
         try:
-            messages = self.memory_manager.get_conversation_messages(self.user_id, self.thread_id, limit)
-            return [
-                {
-                    "role": message.role,
-                    "content": message.content,
-                    "timestamp": message.timestamp.isoformat() if message.timestamp else None
-                }
-                for message in messages
-            ]
+            messages = self.memory_manager.get_conversation_messages(
+                self.user_id, self.thread_id, limit, include_metadata=False
+            )
+            return self._history_dicts(messages)
         except Exception as e:
             print(f"Error loading conversation history: {e}")
             return []
 
+    @tracing.traced("workflow.load_history")
+    async def aload_conversation_history(self, limit: int = 10) -> list:
+        """Load recent conversation history from memory without blocking the event loop."""
+        try:
+            messages = await self.memory_manager.aget_conversation_messages(
+                self.user_id, self.thread_id, limit, include_metadata=False
+            )
+            return self._history_dicts(messages)
+        except Exception as e:
+            print(f"Error loading conversation history: {e}")
+            return []
+
+    @tracing.traced("workflow.load_history")
+    def load_thread_context(self, limit: int = 10) -> Tuple[list, Optional[str]]:
+        """Stored context of a turn that starts without state: recent unsummarized messages and the rolling summary."""
+        try:
+            summary, _, messages = self.memory_manager.get_unsummarized_messages(self.user_id, self.thread_id)
+            return self._history_dicts(messages[-limit:]), summary
+        except Exception as e:
+            print(f"Error loading conversation history: {e}")
+            return [], None
+
+    @tracing.traced("workflow.load_history")
+    async def aload_thread_context(self, limit: int = 10) -> Tuple[list, Optional[str]]:
+        """Async variant of load_thread_context."""
+        try:
+            summary, _, messages = await self.memory_manager.aget_unsummarized_messages(self.user_id, self.thread_id)
+            return self._history_dicts(messages[-limit:]), summary
+        except Exception as e:
+            print(f"Error loading conversation history: {e}")
+            return [], None
+
+    @staticmethod
+    def _history_dicts(messages) -> list:
+        history = []
+        for message in messages:
+            entry = {
+                "role": message.role,
+                "content": message.content,
+                "timestamp": message.timestamp.isoformat() if message.timestamp else None
+            }
+            # Keep the stored token count so prompt building never re-tokenizes history
+            if message.metadata and TOKEN_COUNT_KEY in message.metadata:
+                entry["metadata"] = {TOKEN_COUNT_KEY: message.metadata[TOKEN_COUNT_KEY]}
+            history.append(entry)
+        return history
+
+    @staticmethod
+    def _with_token_count(content: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Message metadata carrying the content's token count, computed once at save time."""
+        return {**(metadata or {}), TOKEN_COUNT_KEY: count_tokens(content)}
+
+    @tracing.traced("workflow.save_user_message")
     def save_user_message(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
         """Save user message to memory."""
         try:
-            return self.memory_manager.save_message(self.user_id, self.thread_id, "user", content, metadata)
+            return self.memory_manager.save_message(
+                self.user_id, self.thread_id, "user", content, self._with_token_count(content, metadata)
+            )
+        except Exception as e:
+            print(f"Error saving user message: {e}")
+            return ""
+
+    @tracing.traced("workflow.save_user_message")
+    async def asave_user_message(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Save user message to memory without blocking the event loop."""
+        try:
+            return await self.memory_manager.asave_message(
+                self.user_id, self.thread_id, "user", content, self._with_token_count(content, metadata)
+            )
         except Exception as e:
             print(f"Error saving user message: {e}")
             return ""
 
+    @tracing.traced("workflow.save_assistant_response")
     def save_assistant_response(self, content: str, agent_type: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> str:
         """Save assistant response to memory."""
         try:
-            memory_metadata = {
+            memory_metadata = self._with_token_count(content, {
                 "agent_type": agent_type,
                 **(metadata or {})
-            }
+            })
             return self.memory_manager.save_message(self.user_id, self.thread_id, "assistant", content, memory_metadata)
         except Exception as e:
             print(f"Error saving assistant response: {e}")
             return ""
 
+    @tracing.traced("workflow.save_assistant_response")
+    async def asave_assistant_response(self, content: str, agent_type: Optional[str] = None,
+                                       metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Save assistant response to memory without blocking the event loop."""
+        try:
+            memory_metadata = self._with_token_count(content, {
+                "agent_type": agent_type,
+                **(metadata or {})
+            })
+            return await self.memory_manager.asave_message(self.user_id, self.thread_id, "assistant", content, memory_metadata)
+        except Exception as e:
+            print(f"Error saving assistant response: {e}")
+            return ""
+
     def clear_conversation_history(self) -> bool:
         """Clear conversation history for this specific thread."""
+        if self.checkpointer is not None:
+            self.checkpointer.delete_thread(self.thread_id, user_id=self.user_id)
         return self.memory_manager.delete_conversation(self.user_id, self.thread_id)
 
     def get_thread_memories(self, limit: int = 50) -> list:
@@ -92,7 +285,8 @@ class LangGraphWorkflow:
             print(f"Error getting thread memories: {e}")
             return []
 
-    def decide_agent(self, state: State) -> str:
+    @staticmethod
+    def _current_question(state: State) -> str:
         # Get user's input from state to decide agent
         messages = state.get('messages', [])
         current_question = state.get('user_question', '')
@@ -102,89 +296,208 @@ class LangGraphWorkflow:
             last_msg = messages[-1]
             if isinstance(last_msg, dict) and last_msg.get("role") == "user":
                 current_question = last_msg.get("content", "")
+        return current_question
+
+    @tracing.traced("workflow.route")
+    def decide_agent(self, state: State) -> str:
+        question = self._current_question(state)
+        # History is only loaded if the question falls through to the LLM router
+        decision = self.router.route(
+            question, history=lambda: self._history_context(question, state.get("summary"))
+        )
+        tracing.set_attribute("agent_type", decision.agent_type)
+        return decision.agent_type
+
+    @tracing.traced("workflow.route")
+    async def adecide_agent(self, state: State) -> str:
+        question = self._current_question(state)
+        decision = await self.router.aroute(
+            question, history=lambda: self._ahistory_context(question, state.get("summary"))
+        )
+        tracing.set_attribute("agent_type", decision.agent_type)
+        return decision.agent_type
+
+    def _history_context(self, question: str, summary: Optional[str] = None) -> str:
+        """Routing context: recent messages relevant to the question, within the router's token budget."""
+        history = self.load_conversation_history(self.router_context.window)
+        return self.router_context.build(history, question, summary)
+
+    async def _ahistory_context(self, question: str, summary: Optional[str] = None) -> str:
+        history = await self.aload_conversation_history(self.router_context.window)
+        return self.router_context.build(history, question, summary)
+
+    def answer_turn(self, state: State) -> State:
+        """Graph step for one turn: save the question, route, answer and save the answer.
+
+        Returns only the updated messages and response.
+        """
+        # A thread without messages in its state (new, or not checkpointed yet) starts from stored history,
+        # with the summary of the turns before it
+        if not state.get('messages'):
+            messages, summary = self.load_thread_context(10)
+            state = cast(State, {**state, 'messages': messages, 'summary': state.get('summary') or summary})
+
+        # Save user message to memory first
+        current_question = state.get('user_question', '')
+        if current_question:
+            self.save_user_message(current_question)
+
+        if self.speculator is not None:
+            agent_type, cache_hit, result_dict = self.speculator.answer(self, state, current_question)
+        else:
+            agent_type, cache_hit, result_dict = self._route_and_answer(state, current_question)
+
+        # Save assistant response to memory
+        response = result_dict.get('response', '')
+        if response:
+            self.save_assistant_response(
+                str(response),
+                agent_type,
+                self._response_metadata(current_question, agent_type, str(response), cache_hit)
+            )
+
+        return self._turn_updates(result_dict)
+
+    async def aanswer_turn(self, state: State) -> State:
+        """Same steps as answer_turn, awaiting every model, search and Mongo call."""
+        if not state.get('messages'):
+            messages, summary = await self.aload_thread_context(10)
+            state = cast(State, {**state, 'messages': messages, 'summary': state.get('summary') or summary})
+
+        current_question = state.get('user_question', '')
+        if current_question:
+            await self.asave_user_message(current_question)
+
+        if self.speculator is not None:
+            agent_type, cache_hit, result_dict = await self.speculator.aanswer(self, state, current_question)
+        else:
+            agent_type, cache_hit, result_dict = await self._aroute_and_answer(state, current_question)
 
-        # Load conversation history for context
-        conversation_history = self.load_conversation_history(5)  # Last 5 messages
-        history_context = ""
-        if conversation_history:
-            history_context = "\n".join([
-                f"{msg['role']}: {msg['content']}" 
-                for msg in conversation_history[-3:]  # Last 3 for context
-            ])
+        response = result_dict.get('response', '')
+        if response:
+            await self.asave_assistant_response(
+                str(response),
+                agent_type,
+                self._response_metadata(current_question, agent_type, str(response), cache_hit)
+            )
+        return self._turn_updates(result_dict)
 
-        # Call LLM to decide which agent to use
-        prompt = f"""Given the user's question and conversation history, determine which agent would be most appropriate to handle it:
-        - Use 'general' for general conversation, basic questions, or tasks not requiring external data
-        - Use 'internet_search' if the question requires current information, fact checking, or web search
+    def _route_and_answer(self, state: State, current_question: str) -> Tuple[str, Any, Dict[str, Any]]:
+        """Route the question, then answer it from the semantic cache or the routed agent."""
+        agent_type = self.decide_agent(state)
 
-        Conversation History:
-        {history_context}
+        # Convert State to Dict for node functions, then back to State
+        state_dict = dict(state)
 
-        Current Question: {current_question}
+        cache_hit = self._cache_lookup(current_question, agent_type)
 
-        Respond with just the agent type: either 'general' or 'internet_search'"""
+        if cache_hit is not None:
+            token_writer()({"token": cache_hit.response})
+            result_dict = self._cached_result(state_dict, cache_hit.response)
+        else:
+            result_dict = self._run_agent(agent_type, state_dict)
+        return agent_type, cache_hit, result_dict
 
-        response = LLMConfig.create_fast_config().create_llm().invoke(prompt)
+    async def _aroute_and_answer(self, state: State, current_question: str) -> Tuple[str, Any, Dict[str, Any]]:
+        agent_type = await self.adecide_agent(state)
+        state_dict = dict(state)
+        cache_hit = self._cache_lookup(current_question, agent_type)
 
-        # Parse LLM response and return agent type
-        response_content = response.content
-        if isinstance(response_content, list):
-            agent_decision_str = str(response_content[0]).strip().lower()
+        if cache_hit is not None:
+            token_writer()({"token": cache_hit.response})
+            result_dict = self._cached_result(state_dict, cache_hit.response)
         else:
-            agent_decision_str = str(response_content).strip().lower()
-            
-        if "internet_search" in agent_decision_str:
-            return self.AgentType.INTERNET_SEARCH.value
-        return self.AgentType.GENERAL.value
-
-    def _agent_decider_node(self):
-        def decider_node(state: State, config=None) -> State:
-            # Save user message to memory first
-            current_question = state.get('user_question', '')
-            if current_question:
-                self.save_user_message(current_question)
-            
-            agent_type = self.decide_agent(state)
-            
-            # Convert State to Dict for node functions, then back to State
-            state_dict = dict(state)
-            
-            if agent_type == self.AgentType.GENERAL.value:
-                result_dict = self.general_talk_node(state_dict)
-            elif agent_type == self.AgentType.INTERNET_SEARCH.value:
-                result_dict = self.internet_search_node(state_dict)
-            else:
-                result_dict = state_dict
-            
-            # Save assistant response to memory
-            response = result_dict.get('response', '')
-            if response:
-                self.save_assistant_response(
-                    str(response), 
-                    agent_type, 
-                    {"processing_timestamp": datetime.now().isoformat()}
-                )
-            
-            # Convert back to State - TypedDict can be created from dict
-            return cast(State, result_dict)
-
-        return decider_node
-
-    def _init_graph(self) -> StateGraph:
-        self.graph = StateGraph(State)
-        self.graph.add_node("agent_decider", self._agent_decider_node())
-        self.graph.add_node("end", lambda state: state)
-        self.graph.add_edge("agent_decider", "end")
-        self.graph.set_entry_point("agent_decider")
-        self.compiled_graph = self.graph.compile()
-        return self.graph
+            result_dict = await self._arun_agent(agent_type, state_dict)
+        return agent_type, cache_hit, result_dict
+
+    def _run_agent(self, agent_type: str, state_dict: Dict[str, Any]) -> Dict[str, Any]:
+        if agent_type == self.AgentType.GENERAL.value:
+            return self.general_talk_node(state_dict)
+        if agent_type == self.AgentType.INTERNET_SEARCH.value:
+            return self.internet_search_node(state_dict)
+        return {**state_dict, 'response': None}
+
+    async def _arun_agent(self, agent_type: str, state_dict: Dict[str, Any]) -> Dict[str, Any]:
+        if agent_type == self.AgentType.GENERAL.value:
+            return await self.ageneral_talk_node(state_dict)
+        if agent_type == self.AgentType.INTERNET_SEARCH.value:
+            return await self.ainternet_search_node(state_dict)
+        return {**state_dict, 'response': None}
+
+    @staticmethod
+    def _turn_updates(result_dict: Dict[str, Any]) -> State:
+        return cast(State, {'messages': result_dict.get('messages') or [], 'response': result_dict.get('response')})
+
+    def _cache_lookup(self, current_question: str, agent_type: str):
+        if self.semantic_cache is not None and current_question and agent_type in SEMANTIC_CACHE_AGENTS:
+            hit = self.semantic_cache.lookup(current_question, agent_type)
+            tracing.add("cache_hits" if hit is not None else "cache_misses")
+            return hit
+        return None
+
+    def _response_metadata(self, current_question: str, agent_type: str, response: str, cache_hit) -> Dict[str, Any]:
+        """Metadata for the saved assistant message; fresh answers are offered to the semantic cache."""
+        metadata: Dict[str, Any] = {"processing_timestamp": datetime.now().isoformat()}
+        if cache_hit is not None:
+            metadata["cache"] = cache_hit.provenance()
+        elif self.semantic_cache is not None and current_question and agent_type in SEMANTIC_CACHE_AGENTS:
+            self.semantic_cache.add(current_question, agent_type, response)
+        return metadata
+
+    @staticmethod
+    def _cached_result(state_dict: Dict[str, Any], response: str) -> Dict[str, Any]:
+        """Build the node result for an answer served from the semantic cache."""
+        messages = list(state_dict.get("messages") or [])
+        messages.append({"role": "assistant", "content": response})
+        return {**state_dict, "messages": messages, "response": response}
 
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        # Load conversation history and add to messages if not already present
-        if not state.get("messages"):
-            conversation_history = self.load_conversation_history(10)
-            state["messages"] = conversation_history
+        # Conversation history is loaded by the graph when the state has none
+        with tracing.span("workflow.turn", user_id=self.user_id, thread_id=self.thread_id):
+            result = self.compiled_graph.invoke(self._initial_state(state), self.config, **self.run_options)
         
+        if isinstance(result, str):
+            return {"response": result}
+        return dict(result)
+
+    async def arun(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of run(); many conversations can be in flight on one event loop."""
+        with tracing.span("workflow.turn", user_id=self.user_id, thread_id=self.thread_id):
+            result = await self.compiled_graph.ainvoke(self._initial_state(state), self.config, **self.run_options)
+
+        if isinstance(result, str):
+            return {"response": result}
+        return dict(result)
+
+    def stream(self, state: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        """Run one turn, yielding ("token", text) as the answer is generated and finally ("result", state).
+
+        The assistant message is persisted once the answer is complete, before the result is yielded.
+        """
+        with tracing.span("workflow.turn", user_id=self.user_id, thread_id=self.thread_id):
+            result: Dict[str, Any] = {}
+            for mode, chunk in self.compiled_graph.stream(self._initial_state(state), self.config,
+                                                          stream_mode=["custom", "values"], **self.run_options):
+                if mode == "custom":
+                    yield "token", chunk["token"]
+                else:
+                    result = dict(chunk)
+        yield "result", result
+
+    async def astream(self, state: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """Async counterpart of stream()."""
+        with tracing.span("workflow.turn", user_id=self.user_id, thread_id=self.thread_id):
+            result: Dict[str, Any] = {}
+            async for mode, chunk in self.compiled_graph.astream(self._initial_state(state), self.config,
+                                                                 stream_mode=["custom", "values"],
+                                                                 **self.run_options):
+                if mode == "custom":
+                    yield "token", chunk["token"]
+                else:
+                    result = dict(chunk)
+        yield "result", result
+
+    def _initial_state(self, state: Dict[str, Any]) -> State:
         # Convert input dict to State for graph processing
         state_obj: State = cast(State, {
             "messages": state.get("messages", []),
@@ -194,14 +507,14 @@ class LangGraphWorkflow:
             "response": state.get("response"),
             "search_results": state.get("search_results"),
             "timestamp": state.get("timestamp"),
-            "created_at": state.get("created_at")
+            "created_at": state.get("created_at"),
+            "summary": state.get("summary")
         })
         
+        if self.checkpointer is not None:
+            # Only what the caller sent: the rest is restored from the thread's checkpoint,
+            # and channels left unwritten are not stored again
+            return cast(State, {k: v for k, v in state_obj.items() if k in state and v is not None})
+
         # Remove None values to keep State clean
-        state_obj = cast(State, {k: v for k, v in state_obj.items() if v is not None})
-        
-        result = self.compiled_graph.invoke(state_obj)
-        
-        if isinstance(result, str):
-            return {"response": result}
-        return dict(result)
\ No newline at end of file
+        return cast(State, {k: v for k, v in state_obj.items() if v is not None})
\ No newline at end of file
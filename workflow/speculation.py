@@ -0,0 +1,294 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from utils import tracing
+from utils.env import load_environment
+from utils.json_types import AgentType
+from utils.streaming import TokenGate, redirect_tokens, token_writer
+
+if TYPE_CHECKING:
+    from workflow.langgraph_workflow import LangGraphWorkflow
+
+load_environment()
+
+SPECULATION_MODES = ("likely", "both")
+AGENT_TYPES = (AgentType.GENERAL.value, AgentType.INTERNET_SEARCH.value)
+
+# Threads running speculative branches of sync turns
+MAX_BRANCH_THREADS = int(os.getenv("SPECULATION_MAX_THREADS", "64"))
+
+
+@dataclass(frozen=True)
+class SpeculationPolicy:
+    """Which agents to start while the LLM router is still deciding.
+
+    ``likely`` starts the agent the keyword rules lean towards, or
+    ``default_agent`` when they have no signal either way; ``both`` starts
+    both agents. Questions the keyword rules route on their own are never
+    speculated, since there is no routing latency to hide. Speculation pauses
+    while discarded branches account for more than ``max_waste_ratio`` of the
+    tokens the agents streamed.
+    """
+    mode: str = "likely"
+    default_agent: str = AgentType.INTERNET_SEARCH.value
+    max_waste_ratio: float = 0.25
+
+    def __post_init__(self):
+        if self.mode not in SPECULATION_MODES:
+            raise ValueError(f"Unknown speculation mode: {self.mode}")
+        if self.default_agent not in AGENT_TYPES:
+            raise ValueError(f"Unknown agent type: {self.default_agent}")
+
+    @classmethod
+    def from_env(cls) -> Optional["SpeculationPolicy"]:
+        """Policy configured by SPECULATION (likely, both or unset) and SPECULATION_MAX_WASTE."""
+        mode = os.getenv("SPECULATION", "").strip().lower()
+        if mode in ("", "none", "off"):
+            return None
+        return cls(mode, max_waste_ratio=float(os.getenv("SPECULATION_MAX_WASTE", "0.25")))
+
+
+# Policy used when a LangGraphWorkflow is not given one explicitly
+DEFAULT_SPECULATION = SpeculationPolicy.from_env()
+
+
+class Branch:
+    """One agent started before routing finished; its tokens are held by ``gate``."""
+
+    __slots__ = ("agent_type", "gate", "started", "finished", "future")
+
+    def __init__(self, agent_type: str, gate: TokenGate):
+        self.agent_type = agent_type
+        self.gate = gate
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        # concurrent.futures.Future for sync turns, asyncio.Task for async ones
+        self.future: Any = None
+
+    def overlap(self, decided: float) -> float:
+        """Seconds this branch ran while routing was still deciding."""
+        return min(decided, self.finished or decided) - self.started
+
+
+class Speculator:
+    """Runs turns under a SpeculationPolicy and keeps the process-wide outcome counters.
+
+    Counters:
+        turns / speculated: turns answered, and those that started a branch early
+        hits / misses:      speculated turns whose routed agent was / was not running
+        saved_seconds:      answer time overlapped with routing on hits
+        wasted_seconds:     run time of discarded branches before routing decided
+        wasted_tokens:      tokens streamed by discarded branches
+        tokens:             tokens streamed by every agent, committed or not
+    """
+
+    def __init__(self, policy: SpeculationPolicy):
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.counters: Dict[str, float] = dict.fromkeys(
+            ("turns", "speculated", "hits", "misses", "saved_seconds", "wasted_seconds", "wasted_tokens", "tokens"), 0
+        )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["waste_ratio"] = stats["wasted_tokens"] / stats["tokens"] if stats["tokens"] else 0.0
+        return stats
+
+    def branches(self, router: Any, question: str) -> List[str]:
+        """Agents to start before routing; empty when routing is local or waste is over the cap."""
+        guess = getattr(router, "guess", None)
+        lean = guess(question) if guess is not None and question else None
+        if lean is None:
+            return []
+        with self._lock:
+            tokens = self.counters["tokens"]
+            if tokens and self.counters["wasted_tokens"] / tokens > self.policy.max_waste_ratio:
+                return []
+        likely = lean.agent_type if lean.confidence > 0 else self.policy.default_agent
+        if self.policy.mode == "both":
+            return [likely] + [agent for agent in AGENT_TYPES if agent != likely]
+        return [likely]
+
+    def _record(self, branches: List[Branch], chosen: Optional[Branch], decided: float, tokens: int) -> None:
+        saved = chosen.overlap(decided) if chosen is not None else 0.0
+        discarded = [branch for branch in branches if branch is not chosen]
+        wasted_seconds = sum(branch.overlap(decided) for branch in discarded)
+        wasted_tokens = sum(branch.gate.tokens for branch in discarded)
+        with self._lock:
+            self.counters["turns"] += 1
+            self.counters["tokens"] += tokens + wasted_tokens
+            if branches:
+                self.counters["speculated"] += 1
+                self.counters["hits" if chosen is not None else "misses"] += 1
+                self.counters["saved_seconds"] += saved
+                self.counters["wasted_seconds"] += wasted_seconds
+                self.counters["wasted_tokens"] += wasted_tokens
+        if branches:
+            tracing.add("speculation_hits" if chosen is not None else "speculation_misses")
+            tracing.add("speculation_saved_seconds", saved)
+            tracing.add("speculation_wasted_seconds", wasted_seconds)
+            tracing.add("speculation_wasted_tokens", wasted_tokens)
+
+    @staticmethod
+    def _settle(branches: List[Branch], agent_type: str, cache_hit: Any) -> Optional[Branch]:
+        """The branch to keep, if any; every other one is discarded."""
+        chosen = None
+        if cache_hit is None:
+            chosen = next((branch for branch in branches if branch.agent_type == agent_type), None)
+        for branch in branches:
+            if branch is not chosen:
+                branch.gate.discard()
+        return chosen
+
+    # Sync turns: branches run on a shared thread pool
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(MAX_BRANCH_THREADS, thread_name_prefix="speculation")
+        return self._executor
+
+    @staticmethod
+    def _run_branch(workflow: "LangGraphWorkflow", branch: Branch, state_dict: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with redirect_tokens(branch.gate):
+                return workflow._run_agent(branch.agent_type, state_dict)
+        finally:
+            branch.finished = time.perf_counter()
+
+    def _start(self, workflow: "LangGraphWorkflow", agent_type: str, state_dict: Dict[str, Any],
+               writer: Any) -> Branch:
+        branch = Branch(agent_type, TokenGate(writer))
+        # The copied context carries the graph config and the current trace span into the thread
+        context = contextvars.copy_context()
+        branch.future = self._pool().submit(context.run, self._run_branch, workflow, branch, state_dict)
+        return branch
+
+    def answer(self, workflow: "LangGraphWorkflow", state: Dict[str, Any],
+               question: str) -> Tuple[str, Any, Dict[str, Any]]:
+        """Route and answer one turn like LangGraphWorkflow._route_and_answer, speculating where the policy allows."""
+        writer = token_writer()
+        agents = self.branches(workflow.router, question)
+        if not agents:
+            gate = TokenGate(writer, committed=True)
+            with redirect_tokens(gate):
+                result = workflow._route_and_answer(state, question)
+            self._record([], None, 0.0, gate.tokens)
+            return result
+
+        state_dict = dict(state)
+        branches = [self._start(workflow, agent, state_dict, writer) for agent in agents]
+        try:
+            agent_type = workflow.decide_agent(state)
+        except BaseException:
+            for branch in branches:
+                branch.gate.discard()
+            raise
+        decided = time.perf_counter()
+        cache_hit = workflow._cache_lookup(question, agent_type)
+        chosen = self._settle(branches, agent_type, cache_hit)
+
+        tokens = 0
+        if cache_hit is not None:
+            writer({"token": cache_hit.response})
+            result_dict = workflow._cached_result(state_dict, cache_hit.response)
+        elif chosen is not None:
+            chosen.gate.commit()
+            result_dict = chosen.future.result()
+            tokens = chosen.gate.tokens
+        else:
+            gate = TokenGate(writer, committed=True)
+            with redirect_tokens(gate):
+                result_dict = workflow._run_agent(agent_type, state_dict)
+            tokens = gate.tokens
+        self._record(branches, chosen, decided, tokens)
+        return agent_type, cache_hit, result_dict
+
+    # Async turns: branches are tasks on the running loop and are cancelled when discarded
+
+    @staticmethod
+    async def _arun_branch(workflow: "LangGraphWorkflow", branch: Branch,
+                           state_dict: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with redirect_tokens(branch.gate):
+                return await workflow._arun_agent(branch.agent_type, state_dict)
+        finally:
+            branch.finished = time.perf_counter()
+
+    def _astart(self, workflow: "LangGraphWorkflow", agent_type: str, state_dict: Dict[str, Any],
+                writer: Any) -> Branch:
+        branch = Branch(agent_type, TokenGate(writer))
+        branch.future = asyncio.create_task(self._arun_branch(workflow, branch, state_dict))
+        # A discarded branch's failure is never awaited; retrieve it so asyncio does not log it
+        branch.future.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return branch
+
+    async def aanswer(self, workflow: "LangGraphWorkflow", state: Dict[str, Any],
+                      question: str) -> Tuple[str, Any, Dict[str, Any]]:
+        """Async counterpart of answer()."""
+        writer = token_writer()
+        agents = self.branches(workflow.router, question)
+        if not agents:
+            gate = TokenGate(writer, committed=True)
+            with redirect_tokens(gate):
+                result = await workflow._aroute_and_answer(state, question)
+            self._record([], None, 0.0, gate.tokens)
+            return result
+
+        state_dict = dict(state)
+        branches = [self._astart(workflow, agent, state_dict, writer) for agent in agents]
+        try:
+            agent_type = await workflow.adecide_agent(state)
+        except BaseException:
+            for branch in branches:
+                branch.gate.discard()
+                branch.future.cancel()
+            raise
+        decided = time.perf_counter()
+        cache_hit = workflow._cache_lookup(question, agent_type)
+        chosen = self._settle(branches, agent_type, cache_hit)
+        for branch in branches:
+            if branch is not chosen:
+                branch.future.cancel()
+
+        tokens = 0
+        if cache_hit is not None:
+            writer({"token": cache_hit.response})
+            result_dict = workflow._cached_result(state_dict, cache_hit.response)
+        elif chosen is not None:
+            chosen.gate.commit()
+            result_dict = await chosen.future
+            tokens = chosen.gate.tokens
+        else:
+            gate = TokenGate(writer, committed=True)
+            with redirect_tokens(gate):
+                result_dict = await workflow._arun_agent(agent_type, state_dict)
+            tokens = gate.tokens
+        self._record(branches, chosen, decided, tokens)
+        return agent_type, cache_hit, result_dict
+
+
+_speculators: Dict[SpeculationPolicy, Speculator] = {}
+_speculators_lock = threading.Lock()
+
+
+def get_speculator(policy: SpeculationPolicy) -> Speculator:
+    """Process-wide Speculator for ``policy``, so its waste cap and counters span every session."""
+    speculator = _speculators.get(policy)
+    if speculator is not None:
+        return speculator
+
+    with _speculators_lock:
+        speculator = _speculators.get(policy)
+        if speculator is None:
+            speculator = Speculator(policy)
+            _speculators[policy] = speculator
+        return speculator
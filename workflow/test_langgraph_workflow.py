@@ -0,0 +1,61 @@
+from memories.memories import MemoryManager
+from node import general_agent_node
+from utils.semantic_cache import SemanticCache
+from utils.json_types import AgentType
+from workflow.agent_router import RoutingDecision
+from workflow.langgraph_workflow import LangGraphWorkflow
+
+
+class RecordingRouter:
+    """Routes everything to the general agent and keeps the history text it was shown."""
+
+    def __init__(self):
+        self.histories = []
+
+    def route(self, question, history=None):
+        self.histories.append(history() if callable(history) else history)
+        return RoutingDecision(AgentType.GENERAL.value, 1.0, "llm")
+
+
+def test_stored_summary_reaches_router_and_agent_prompts(mongo_uri, monkeypatch):
+    memory = MemoryManager(mongo_uri, write_behind=False)
+    for n in range(4):
+        memory.save_message("u", "t", "user" if n % 2 == 0 else "assistant", f"old message {n}")
+    memory.update_summary("u", "t", "The user is planning a trip to Lisbon in May.", 2)
+
+    prompts = []
+
+    def fake_agent(question, history):
+        prompts.append(history)
+        yield "Sure."
+
+    monkeypatch.setattr(general_agent_node, "stream_general_agent", fake_agent)
+    router = RecordingRouter()
+    # No checkpointer: the turn starts from an empty state, as in main.py and the chat server
+    workflow = LangGraphWorkflow("u", "t", memory_manager=memory, router=router, speculation=None)
+
+    result = workflow.run({"user_question": "What should I pack?"})
+
+    assert result["response"] == "Sure."
+    assert "trip to Lisbon" in router.histories[0]
+    assert "trip to Lisbon" in prompts[0]
+    # The unsummarized tail is still shown verbatim
+    assert "old message 3" in prompts[0]
+
+
+def test_semantic_cache_never_shares_general_answers_across_users(mongo_uri, monkeypatch):
+    memory = MemoryManager(mongo_uri, write_behind=False)
+    cache = SemanticCache()
+    monkeypatch.setattr(general_agent_node, "stream_general_agent",
+                        lambda question, history: iter([f"Answer for {history or 'nobody'}"]))
+    question = "Plan a 3 day trip to Lisbon"
+
+    memory.save_message("alice", "t", "user", "I use a wheelchair")
+    alice = LangGraphWorkflow("alice", "t", memory_manager=memory, router=RecordingRouter(),
+                              semantic_cache=cache, speculation=None)
+    bob = LangGraphWorkflow("bob", "t", memory_manager=memory, router=RecordingRouter(),
+                            semantic_cache=cache, speculation=None)
+
+    assert "wheelchair" in alice.run({"user_question": question})["response"]
+    assert "wheelchair" not in bob.run({"user_question": question})["response"]
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+from utils.json_types import AgentType
+from utils.streaming import BranchDiscarded, redirect_tokens, token_writer
+from workflow.agent_router import RoutingDecision
+from workflow.speculation import SpeculationPolicy, Speculator
+
+GENERAL = AgentType.GENERAL.value
+SEARCH = AgentType.INTERNET_SEARCH.value
+
+
+class FakeWorkflow:
+    """The parts of LangGraphWorkflow the Speculator calls, with agents that stream until routing decides."""
+
+    def __init__(self, routed: str, lean: str = GENERAL, cached: Optional[str] = None):
+        self.routed = routed
+        self.cached = cached
+        self.router = SimpleNamespace(guess=lambda question: RoutingDecision(lean, 0.5, "rules"))
+        self.decided = threading.Event()
+        # Branches routing waits for, so each has streamed a token before the decision
+        self.expected_branches = 0
+        self.started = []
+        self.stopped = []
+
+    def wait_stopped(self, count: int) -> list:
+        """Discarded branches stop on their own after the turn returns; wait for ``count`` of them."""
+        for _ in range(5000):
+            if len(self.stopped) >= count:
+                break
+            threading.Event().wait(0.001)
+        return self.stopped
+
+    def decide_agent(self, state):
+        while len(self.started) < self.expected_branches:
+            threading.Event().wait(0.001)
+        self.decided.set()
+        return self.routed
+
+    def _cache_lookup(self, question, agent_type):
+        return SimpleNamespace(response=self.cached) if self.cached else None
+
+    def _cached_result(self, state_dict, response):
+        return {**state_dict, "response": response}
+
+    def _run_agent(self, agent_type, state_dict):
+        write = token_writer()
+        write({"token": f"{agent_type}:"})
+        self.started.append(agent_type)
+        self.decided.wait(5)
+        try:
+            write({"token": "answer"})
+        except BranchDiscarded:
+            self.stopped.append(agent_type)
+            raise
+        return {**state_dict, "response": f"{agent_type} answer"}
+
+    def _route_and_answer(self, state, question):
+        agent_type = self.decide_agent(state)
+        return agent_type, None, self._run_agent(agent_type, dict(state))
+
+
+def _answer(speculator: Speculator, workflow: FakeWorkflow, branches: int):
+    workflow.expected_branches = branches
+    streamed = []
+    with redirect_tokens(streamed.append):
+        result = speculator.answer(workflow, {"user_question": "q"}, "q")
+    return result, [chunk["token"] for chunk in streamed]
+
+
+def test_hit_streams_only_the_routed_branch():
+    speculator = Speculator(SpeculationPolicy("both"))
+    workflow = FakeWorkflow(routed=SEARCH)
+
+    (agent_type, cache_hit, result), streamed = _answer(speculator, workflow, branches=2)
+
+    assert (agent_type, cache_hit, result["response"]) == (SEARCH, None, f"{SEARCH} answer")
+    assert streamed == [f"{SEARCH}:", "answer"]
+    assert workflow.wait_stopped(1) == [GENERAL]
+    stats = speculator.stats()
+    assert (stats["hits"], stats["misses"], stats["wasted_tokens"], stats["tokens"]) == (1, 0, 1, 3)
+
+
+def test_miss_discards_the_branch_and_runs_the_routed_agent():
+    speculator = Speculator(SpeculationPolicy("likely"))
+    workflow = FakeWorkflow(routed=SEARCH, lean=GENERAL)
+
+    (agent_type, _, result), streamed = _answer(speculator, workflow, branches=1)
+
+    assert result["response"] == f"{SEARCH} answer"
+    assert streamed == [f"{SEARCH}:", "answer"]
+    assert workflow.wait_stopped(1) == [GENERAL]
+    assert speculator.stats()["misses"] == 1
+
+
+def test_cache_hit_discards_every_branch():
+    speculator = Speculator(SpeculationPolicy("likely"))
+    workflow = FakeWorkflow(routed=GENERAL, cached="From the cache")
+
+    (_, cache_hit, result), streamed = _answer(speculator, workflow, branches=1)
+
+    assert cache_hit.response == result["response"] == "From the cache"
+    assert streamed == ["From the cache"]
+    assert workflow.wait_stopped(1) == [GENERAL]
+
+
+def test_speculation_pauses_over_the_waste_cap():
+    speculator = Speculator(SpeculationPolicy("both", max_waste_ratio=0.25))
+    router = FakeWorkflow(routed=GENERAL).router
+    speculator.counters.update(tokens=10, wasted_tokens=3)
+    assert speculator.branches(router, "q") == []
+
+    speculator.counters.update(tokens=20)
+    assert speculator.branches(router, "q") == [GENERAL, SEARCH]
+    assert speculator.branches(SimpleNamespace(guess=lambda question: None), "q") == []
+
+
+class AsyncFakeWorkflow(FakeWorkflow):
+    async def adecide_agent(self, state):
+        while len(self.started) < self.expected_branches:
+            await asyncio.sleep(0.001)
+        return self.routed
+
+    async def _arun_agent(self, agent_type, state_dict):
+        write = token_writer()
+        write({"token": f"{agent_type}:"})
+        self.started.append(agent_type)
+        try:
+            await asyncio.sleep(0.01)
+            write({"token": "answer"})
+        except (BranchDiscarded, asyncio.CancelledError):
+            self.stopped.append(agent_type)
+            raise
+        return {**state_dict, "response": f"{agent_type} answer"}
+
+
+def test_async_turn_cancels_the_discarded_branch():
+    speculator = Speculator(SpeculationPolicy("both"))
+    workflow = AsyncFakeWorkflow(routed=GENERAL)
+    workflow.expected_branches = 2
+    streamed = []
+
+    async def turn():
+        with redirect_tokens(streamed.append):
+            return await speculator.aanswer(workflow, {"user_question": "q"}, "q")
+
+    agent_type, _, result = asyncio.run(turn())
+
+    assert result["response"] == f"{GENERAL} answer"
+    assert [chunk["token"] for chunk in streamed] == [f"{GENERAL}:", "answer"]
+    assert workflow.stopped == [SEARCH]